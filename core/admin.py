@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import (User, Author, Book, Category, SubCategory, Borrow)
+from .models import (User, Author, Book, Category, SubCategory, Borrow, AvailabilityReconciliation,
+                     DailyBookStats, Hold)
 
 
 admin.site.register(User)
@@ -8,3 +9,6 @@ admin.site.register(Book)
 admin.site.register(Category)
 admin.site.register(SubCategory)
 admin.site.register(Borrow)
+admin.site.register(AvailabilityReconciliation)
+admin.site.register(DailyBookStats)
+admin.site.register(Hold)
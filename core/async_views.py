@@ -0,0 +1,86 @@
+"""
+Async dispatch for DRF views.
+
+DRF's ``APIView`` only dispatches synchronously, so under ASGI Django runs
+it in a worker thread through ``sync_to_async``. ``AsyncAPIView`` runs the
+whole request on the event loop instead: authenticators that define
+``aauthenticate`` (``core.authentication.AsyncJWTAuthentication``) load the
+user with the async ORM, and ``async def`` handlers query with ``aget``,
+``async for`` and friends. Authenticators without an async path, and any
+sync database helper a handler needs, run through ``sync_to_async`` with
+the default ``thread_sensitive=True`` so they share the thread (and the
+connection) that sync views use. Write endpoints stay sync views for the
+same reason: their ``transaction.atomic`` blocks must not span threads.
+"""
+from asgiref.sync import sync_to_async
+
+from rest_framework import exceptions
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .authentication import AsyncJWTAuthentication
+
+
+class AsyncAPIView(APIView):
+    view_is_async = True
+
+    def get_authenticators(self):
+        # Swap the stock JWT class for its async subclass so settings keep working.
+        return [AsyncJWTAuthentication() if type(auth) is JWTAuthentication else auth
+                for auth in super().get_authenticators()]
+
+    async def perform_authentication_async(self, request):
+        for authenticator in request.authenticators:
+            try:
+                if hasattr(authenticator, 'aauthenticate'):
+                    user_auth_tuple = await authenticator.aauthenticate(request)
+                else:
+                    user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+
+        request._not_authenticated()
+
+    async def initial_async(self, request, *args, **kwargs):
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+
+        neg = self.perform_content_negotiation(request)
+        request.accepted_renderer, request.accepted_media_type = neg
+
+        version, scheme = self.determine_version(request, *args, **kwargs)
+        request.version, request.versioning_scheme = version, scheme
+
+        await self.perform_authentication_async(request)
+        self.check_permissions(request)
+        self.check_throttles(request)
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.initial_async(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if hasattr(response, '__await__'):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
@@ -0,0 +1,163 @@
+"""
+JWT authentication for the API.
+
+Access tokens carry the user's ``role`` and ``token_version`` next to the
+user id (``UserRefreshToken``). ``CachedJWTAuthentication`` keeps recently
+seen users in a small in-process TTL cache and accepts a token straight
+from it while the claims still match, so most requests skip the user
+lookup. Unsafe requests always load the row, since a view may save the
+user it is handed and a cached copy could undo another worker's change. A
+cache miss, or claims that disagree with the cached user, loads the row; if the claims disagree with the database too, the token has been
+revoked (password change) or the user's role changed, and it is rejected.
+Tokens issued without the claims are always checked against the database.
+"""
+import copy
+import time
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import LRUCache
+
+ROLE_CLAIM = 'role'
+VERSION_CLAIM = 'tv'
+
+DEFAULTS = {
+    'TTL': 60,
+    'MAX_SIZE': 10_000,
+}
+
+
+class UserRefreshToken(RefreshToken):
+    """
+    Refresh token whose access tokens embed the user's role and token version.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[ROLE_CLAIM] = user.role
+        token[VERSION_CLAIM] = user.token_version
+        return token
+
+
+class UserCache:
+
+    def __init__(self):
+        self.lru = LRUCache(self.config['MAX_SIZE'])
+
+    @property
+    def config(self):
+        return {**DEFAULTS, **getattr(settings, 'JWT_USER_CACHE', {})}
+
+    def get(self, user_id):
+        entry = self.lru.get(str(user_id))
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        # Each request gets its own instance, so a view saving request.user
+        # cannot leak changes into another request.
+        return copy.copy(entry[1])
+
+    def set(self, user):
+        self.lru.set(str(user.pk), (time.monotonic() + self.config['TTL'], copy.copy(user)))
+
+    def discard(self, user_id):
+        self.lru.delete(str(user_id))
+
+    def clear(self):
+        self.lru.clear()
+
+
+user_cache = UserCache()
+
+
+def claims_match(user, validated_token):
+    return (validated_token.get(ROLE_CLAIM) == user.role and
+            validated_token.get(VERSION_CLAIM) == user.token_version)
+
+
+class AsyncJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` that can also load the user with the async ORM, so
+    async views authenticate without a thread hop.
+    """
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+class CachedJWTAuthentication(AsyncJWTAuthentication):
+    # DRF builds the authenticators of each request anew.
+    use_cache = True
+
+    def authenticate(self, request):
+        self.use_cache = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    async def aauthenticate(self, request):
+        self.use_cache = request.method in SAFE_METHODS
+        return await super().aauthenticate(request)
+
+    def get_cached_user(self, validated_token):
+        if not self.use_cache or VERSION_CLAIM not in validated_token:
+            return None
+        user = user_cache.get(validated_token.get(api_settings.USER_ID_CLAIM))
+        if user is None or not claims_match(user, validated_token):
+            return None
+        return user
+
+    def check_claims(self, user, validated_token):
+        if VERSION_CLAIM not in validated_token:
+            return user
+        if not claims_match(user, validated_token):
+            raise AuthenticationFailed(_("Token has been revoked."), code="token_revoked")
+        user_cache.set(user)
+        return user
+
+    def get_user(self, validated_token):
+        user = self.get_cached_user(validated_token)
+        if user is None:
+            user = self.check_claims(super().get_user(validated_token), validated_token)
+        return user
+
+    async def aget_user(self, validated_token):
+        user = self.get_cached_user(validated_token)
+        if user is None:
+            user = self.check_claims(await super().aget_user(validated_token), validated_token)
+        return user
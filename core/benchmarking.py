@@ -0,0 +1,656 @@
+import asyncio
+import math
+import os
+import shlex
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from rest_framework.test import APIClient
+
+from .authentication import UserRefreshToken
+from .cache import (AUTHORS, AVAILABILITY, BOOKS, CATEGORIES, SUBCATEGORIES, catalog_cache)
+from .models import (User, Author, Book, Borrow, Category, Hold, SubCategory)
+from .throttling import login_throttle
+from .services import InventoryError, borrow_book, place_hold, return_book
+
+BENCH_PASSWORD = 'bench-Passw0rd!'
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(label, route, method, timings, queries, statuses, elapsed):
+    """
+    Latency percentiles (ms), queries per request and throughput for one route.
+
+    ``queries`` may be empty when the requests ran in another process.
+    """
+    ordered = sorted(timings)
+    return {
+        'label': label,
+        'route': route,
+        'method': method,
+        'requests': len(timings),
+        'p50_ms': round(percentile(ordered, 50), 3),
+        'p95_ms': round(percentile(ordered, 95), 3),
+        'p99_ms': round(percentile(ordered, 99), 3),
+        'mean_ms': round(statistics.fmean(ordered), 3),
+        'max_ms': round(ordered[-1], 3),
+        'queries_per_request': round(statistics.fmean(queries), 2) if queries else None,
+        'throughput_rps': round(len(timings) / elapsed, 1) if elapsed else None,
+        'statuses': {str(code): count for code, count in sorted(Counter(statuses).items())},
+    }
+
+
+def api_routes(prefix='api/'):
+    """
+    Every route mounted from ``core.urls``, as ``api/...`` pattern strings.
+    """
+    routes = []
+    for entry in get_resolver().url_patterns:
+        if isinstance(entry, URLResolver) and str(entry.pattern) == prefix:
+            for pattern in entry.url_patterns:
+                if isinstance(pattern, URLPattern):
+                    routes.append(prefix + str(pattern.pattern))
+    return routes
+
+
+class Route:
+    """
+    One benchmarked request shape.
+
+    ``build(ctx, i)`` runs before the timer starts and returns the path and
+    payload for iteration ``i``; it may create the rows the request needs.
+    """
+
+    def __init__(self, route, method, role, build, label=None, format='json'):
+        self.route = route
+        self.method = method
+        self.role = role
+        self.build = build
+        self.label = label or f'{method} /{route}'
+        self.format = format
+
+
+def _book(ctx, i, **kwargs):
+    kwargs.setdefault('total_copies', 1)
+    kwargs.setdefault('available_copies', kwargs['total_copies'])
+    return Book.objects.create(title=f'Bench book {i}', isbn=f'B{ctx["run"]:05d}{i:07d}',
+                               publication_date=date(2000, 1, 1), author=ctx['author'],
+                               category=ctx['category'], subcategory=ctx['subcategory'], **kwargs)
+
+
+def _unavailable_book(ctx, i):
+    # A book to queue for; earlier holds are dropped so the member stays under HOLD_MAX_PER_MEMBER.
+    Hold.objects.filter(member=ctx['member']).update(status=Hold.Status.CANCELLED)
+    return _book(ctx, 2_000_000 + i, available_copies=0)
+
+
+def default_routes():
+    return [
+        Route('api/member/signup/', 'POST', None, lambda ctx, i: (
+            '/api/member/signup/', {'username': f'bench-signup-m{ctx["run"]}-{i}', 'password': BENCH_PASSWORD,
+                                    'email': 'bench@example.com'})),
+        Route('api/admin/signup/', 'POST', None, lambda ctx, i: (
+            '/api/admin/signup/', {'username': f'bench-signup-w{ctx["run"]}-{i}', 'password': BENCH_PASSWORD,
+                                   'email': 'bench@example.com'})),
+        Route('api/member/signin/', 'POST', None, lambda ctx, i: (
+            '/api/member/signin/', {'username': ctx['member'].username, 'password': BENCH_PASSWORD})),
+        Route('api/admin/signin/', 'POST', None, lambda ctx, i: (
+            '/api/admin/signin/', {'username': ctx['worker'].username, 'password': BENCH_PASSWORD})),
+
+        Route('api/profile/', 'GET', 'member', lambda ctx, i: ('/api/profile/', None)),
+        Route('api/profile/update/', 'PUT', 'member', lambda ctx, i: (
+            '/api/profile/update/', {'first_name': f'Bench{i}'}), format='multipart'),
+
+        Route('api/authors/create/', 'POST', 'worker', lambda ctx, i: (
+            '/api/authors/create/', {'first_name': 'Bench', 'last_name': f'Author {i}'})),
+        Route('api/authors/<int:pk>/update/', 'PUT', 'worker', lambda ctx, i: (
+            f'/api/authors/{ctx["author"].pk}/update/', {'biography': f'Revision {i}'})),
+        Route('api/authors/<int:pk>/delete/', 'DELETE', 'worker', lambda ctx, i: (
+            f'/api/authors/{Author.objects.create(first_name="Bench", last_name="Doomed").pk}/delete/', None)),
+        Route('api/authors/', 'GET', 'worker', lambda ctx, i: ('/api/authors/', None)),
+
+        Route('api/category/create/', 'POST', 'worker', lambda ctx, i: (
+            '/api/category/create/', {'name': f'Bench category {i}'})),
+        Route('api/category/<int:pk>/update/', 'PUT', 'worker', lambda ctx, i: (
+            f'/api/category/{ctx["category"].pk}/update/', {'name': f'Bench category r{i}'})),
+        Route('api/category/<int:pk>/delete/', 'DELETE', 'worker', lambda ctx, i: (
+            f'/api/category/{Category.objects.create(name="Doomed").pk}/delete/', None)),
+        Route('api/categories', 'GET', 'worker', lambda ctx, i: ('/api/categories', None)),
+
+        Route('api/subcategory/create/', 'POST', 'worker', lambda ctx, i: (
+            '/api/subcategory/create/', {'name': f'Bench subcategory {i}', 'category': ctx['category'].pk})),
+        Route('api/subcategory/<int:pk>/update/', 'PUT', 'worker', lambda ctx, i: (
+            f'/api/subcategory/{ctx["subcategory"].pk}/update/', {'name': f'Bench subcategory r{i}'})),
+        Route('api/subcategory/<int:pk>/delete/', 'DELETE', 'worker', lambda ctx, i: (
+            f'/api/subcategory/{SubCategory.objects.create(name="Doomed", category=ctx["category"]).pk}/delete/',
+            None)),
+        Route('api/subcategories', 'GET', 'worker', lambda ctx, i: ('/api/subcategories', None)),
+
+        Route('api/book/create/', 'POST', 'worker', lambda ctx, i: (
+            '/api/book/create/', {'title': f'Bench created {i}', 'isbn': f'C{ctx["run"]:05d}{i:07d}',
+                                  'publication_date': '2000-01-01', 'author': ctx['author'].pk,
+                                  'category': ctx['category'].pk, 'subcategory': ctx['subcategory'].pk})),
+        Route('api/book/<int:pk>/update/', 'PUT', 'worker', lambda ctx, i: (
+            f'/api/book/{ctx["book"].pk}/update/', {'description': f'Revision {i}'})),
+        Route('api/book/<int:pk>/delete/', 'DELETE', 'worker', lambda ctx, i: (
+            f'/api/book/{_book(ctx, 1_000_000 + i).pk}/delete/', None)),
+
+        Route('api/books/', 'GET', 'member', lambda ctx, i: ('/api/books/', {'page_size': 50}),
+              label='GET /api/books/ (page_size=50)'),
+        Route('api/books/', 'GET', 'member', lambda ctx, i: ('/api/books/', {'page_size': 50, 'available': 'true',
+                                                                             'ordering': 'title'}),
+              label='GET /api/books/ (available, by title, page_size=50)'),
+        Route('api/books/', 'GET', 'member', lambda ctx, i: ('/api/books/', {'search': 'book of', 'page_size': 20}),
+              label='GET /api/books/ (search, page_size=20)'),
+        Route('api/books/', 'GET', 'member', lambda ctx, i: ('/api/books/', {'page_size': 50, 'view': 'compact'}),
+              label='GET /api/books/ (compact, page_size=50)'),
+        Route('api/books/', 'GET', 'member', lambda ctx, i: (
+            '/api/books/', {'ids': ','.join(str(book.pk) for book in [ctx['book'], *ctx['shelf']])}),
+              label='GET /api/books/ (ids=11 books)'),
+        Route('api/books/<int:pk>/', 'GET', 'member', lambda ctx, i: (f'/api/books/{ctx["book"].pk}/', None)),
+
+        Route('api/books/availability/events/', 'GET', 'member', lambda ctx, i: (
+            '/api/books/availability/events/', {'books': ','.join(str(book.pk) for book in ctx['shelf'])}),
+              label='GET /api/books/availability/events/ (snapshot)'),
+
+        Route('api/borrow/', 'POST', 'member', lambda ctx, i: ('/api/borrow/', {'book': ctx['book'].pk})),
+        Route('api/return/<int:pk>/', 'POST', 'member', lambda ctx, i: (
+            f'/api/return/{borrow_book(ctx["member"], ctx["book"].pk).pk}/', None)),
+        Route('api/borrow/bulk/', 'POST', 'member', lambda ctx, i: (
+            '/api/borrow/bulk/', {'books': [book.pk for book in ctx['shelf']]})),
+        Route('api/return/bulk/', 'POST', 'member', lambda ctx, i: (
+            '/api/return/bulk/', {'borrows': [borrow_book(ctx['member'], book.pk).pk for book in ctx['shelf']]})),
+        Route('api/holds/', 'POST', 'member', lambda ctx, i: ('/api/holds/', {'book': _unavailable_book(ctx, i).pk})),
+        Route('api/holds/', 'GET', 'member', lambda ctx, i: ('/api/holds/', None)),
+        Route('api/holds/<int:pk>/cancel/', 'POST', 'member', lambda ctx, i: (
+            f'/api/holds/{place_hold(ctx["member"], _unavailable_book(ctx, 1_000 + i).pk).pk}/cancel/', None)),
+        Route('api/my-borrows/', 'GET', 'reader', lambda ctx, i: ('/api/my-borrows/', None)),
+        Route('api/all-borrows/', 'GET', 'worker', lambda ctx, i: (
+            '/api/all-borrows/', {'member': ctx['reader'].username}), label='GET /api/all-borrows/ (member=...)'),
+        Route('api/all-borrows/', 'GET', 'worker', lambda ctx, i: (
+            '/api/all-borrows/', {'overdue': 'true', 'member': ctx['reader'].username}),
+              label='GET /api/all-borrows/ (overdue, member=...)'),
+        Route('api/all-borrows/export/', 'GET', 'worker', lambda ctx, i: (
+            '/api/all-borrows/export/', {'output': 'csv'}), label='GET /api/all-borrows/export/ (csv)'),
+        Route('api/all-borrows/export/', 'GET', 'worker', lambda ctx, i: (
+            '/api/all-borrows/export/', {'output': 'ndjson'}), label='GET /api/all-borrows/export/ (ndjson)'),
+        Route('api/all-borrows/overdue/', 'GET', 'worker', lambda ctx, i: ('/api/all-borrows/overdue/', None)),
+        Route('api/stats/books/top/', 'GET', 'worker', lambda ctx, i: ('/api/stats/books/top/', None)),
+        Route('api/stats/categories/top/', 'GET', 'worker', lambda ctx, i: ('/api/stats/categories/top/', None)),
+        Route('api/stats/borrows/', 'GET', 'worker', lambda ctx, i: (
+            '/api/stats/borrows/', {'days': 365, 'bucket': 'month'}), label='GET /api/stats/borrows/ (365 days, month)'),
+        Route('api/stats/subcategories/availability/', 'GET', 'worker', lambda ctx, i: (
+            '/api/stats/subcategories/availability/', None)),
+        Route('api/metrics/', 'GET', 'worker', lambda ctx, i: ('/api/metrics/', None)),
+    ]
+
+
+class APIBenchmark:
+    """
+    Drive every ``core.urls`` route through the Django test client.
+
+    Each request carries a real JWT, so authentication is part of the cost.
+    All writes happen inside one transaction that is rolled back at the end,
+    which leaves the benchmarked database exactly as it was.
+    """
+
+    def __init__(self, requests=50, warmup=2, routes=None, only=None, log=None):
+        self.requests = requests
+        self.warmup = warmup
+        self.routes = routes if routes is not None else default_routes()
+        if only:
+            self.routes = [route for route in self.routes if only in route.label]
+        self.log = log or (lambda message: None)
+
+    def missing_routes(self):
+        covered = {route.route for route in self.routes}
+        return [route for route in api_routes() if route not in covered]
+
+    def setup(self):
+        run = int(time.time()) % 10 ** 5
+        member = User.objects.create_user(username=f'bench-member-{run}', password=BENCH_PASSWORD,
+                                          role=User.Role.MEMBER)
+        worker = User.objects.create_user(username=f'bench-worker-{run}', password=BENCH_PASSWORD,
+                                          role=User.Role.WORKER)
+        # Read the history of an existing member when there is seeded data.
+        reader_id = Borrow.objects.values_list('member_id', flat=True).first()
+        reader = User.objects.get(pk=reader_id) if reader_id else member
+        author = Author.objects.create(first_name='Bench', last_name='Author')
+        category = Category.objects.create(name='Bench category')
+        subcategory = SubCategory.objects.create(name='Bench subcategory', category=category)
+        ctx = {'run': run, 'member': member, 'worker': worker, 'reader': reader,
+               'author': author, 'category': category, 'subcategory': subcategory}
+        copies = 10 * (self.requests + self.warmup) * len(self.routes)
+        ctx['book'] = _book(ctx, 0, total_copies=copies)
+        ctx['shelf'] = [_book(ctx, n, total_copies=copies) for n in range(1, 11)]
+        ctx['tokens'] = {
+            name: str(UserRefreshToken.for_user(user).access_token)
+            for name, user in (('member', member), ('worker', worker), ('reader', reader))
+        }
+        return ctx
+
+    def run_route(self, route, ctx):
+        client = APIClient()
+        if route.role:
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {ctx["tokens"][route.role]}')
+        call = getattr(client, route.method.lower())
+
+        timings, queries, statuses = [], [], []
+        elapsed = 0.0
+        for i in range(self.warmup + self.requests):
+            path, data = route.build(ctx, i)
+            kwargs = {} if route.method == 'GET' else {'format': route.format}
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = call(path, data, **kwargs)
+                if response.streaming:
+                    # Streamed bodies are produced while they are read.
+                    b''.join(response.streaming_content)
+                duration = time.perf_counter() - start
+            if i < self.warmup:
+                continue
+            elapsed += duration
+            timings.append(duration * 1000)
+            queries.append(len(captured.captured_queries))
+            statuses.append(response.status_code)
+        return summarize(route.label, route.route, route.method, timings, queries, statuses, elapsed)
+
+    def run(self):
+        results = []
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            with transaction.atomic():
+                ctx = self.setup()
+                for route in self.routes:
+                    self.log(f'{route.label} ...')
+                    results.append(self.run_route(route, ctx))
+                transaction.set_rollback(True)
+        # Catalog entries cached from the rolled back rows must not outlive them.
+        catalog_cache.bump([BOOKS, AUTHORS, CATEGORIES, SUBCATEGORIES, AVAILABILITY])
+        return results
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = dict((name.strip().lower(), value.strip())
+                   for name, value in (line.split(':', 1) for line in lines[1:] if ':' in line))
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def http_load(host, port, paths, concurrency, headers=None):
+    """
+    Send a GET for each of ``paths`` over ``concurrency`` keep-alive
+    connections. Returns per-request timings (ms), statuses and wall time.
+    """
+    header_lines = ''.join(f'{name}: {value}\r\n' for name, value in (headers or {}).items())
+    pending = iter(paths)
+    timings, statuses = [], []
+
+    async def client():
+        reader = writer = None
+        for path in pending:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            start = time.perf_counter()
+            writer.write(f'GET {path} HTTP/1.1\r\n{header_lines}\r\n'.encode('latin-1'))
+            await writer.drain()
+            status, keep_alive = await _read_response(reader)
+            timings.append((time.perf_counter() - start) * 1000)
+            statuses.append(status)
+            if not keep_alive:
+                writer.close()
+                writer = None
+        if writer is not None:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return timings, statuses, time.perf_counter() - start
+
+
+class ServerProcess:
+    """
+    Run ``command`` (with ``{port}`` filled in) until the block exits.
+    """
+
+    def __init__(self, command, host, port, timeout=30):
+        self.args = shlex.split(command.format(host=host, port=port))
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.process = None
+
+    def __enter__(self):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE',
+                                                                      'library_project.settings')}
+        try:
+            self.process = subprocess.Popen(self.args, env=env)
+        except FileNotFoundError:
+            raise RuntimeError(f'{self.args[0]} is not installed.')
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'{self.args[0]} exited with status {self.process.returncode}.')
+            try:
+                socket.create_connection((self.host, self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.1)
+        self.__exit__(None, None, None)
+        raise RuntimeError(f'{self.args[0]} did not start listening on port {self.port}.')
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+DEFAULT_SERVERS = {
+    'wsgi': 'gunicorn library_project.wsgi:application --bind {host}:{port} --workers 1 --threads 8 '
+            '--log-level warning',
+    'asgi': 'uvicorn library_project.asgi:application --host {host} --port {port} --workers 1 '
+            '--log-level warning',
+}
+
+
+class ServerBenchmark:
+    """
+    Compare the async read views across real servers at several levels of
+    concurrent connections.
+
+    Each server command is started in turn against the configured database
+    and driven over HTTP/1.1 keep-alive. Nothing is written, so the database
+    needs seeded books and borrows (``manage.py seed_library``).
+    """
+
+    def __init__(self, servers=None, concurrency=(1, 16, 64), requests=500, warmup=50,
+                 host='127.0.0.1', port=8765, host_header='localhost', log=None):
+        self.servers = servers or DEFAULT_SERVERS
+        self.concurrency = concurrency
+        self.requests = requests
+        self.warmup = warmup
+        self.host = host
+        self.port = port
+        self.host_header = host_header
+        self.log = log or (lambda message: None)
+
+    def routes(self):
+        reader_id = Borrow.objects.values_list('member_id', flat=True).first()
+        book_id = Book.objects.values_list('id', flat=True).first()
+        if reader_id is None or book_id is None:
+            raise RuntimeError('No books or borrows to read; run seed_library first.')
+        token = str(UserRefreshToken.for_user(User.objects.get(pk=reader_id)).access_token)
+        headers = {'Host': self.host_header, 'Authorization': f'Bearer {token}'}
+        return headers, [
+            ('GET /api/books/ (page_size=50)', 'api/books/', '/api/books/?page_size=50'),
+            ('GET /api/books/<int:pk>/', 'api/books/<int:pk>/', f'/api/books/{book_id}/'),
+            ('GET /api/my-borrows/', 'api/my-borrows/', '/api/my-borrows/'),
+        ]
+
+    def run(self):
+        headers, routes = self.routes()
+        results = []
+        for server, command in self.servers.items():
+            with ServerProcess(command, self.host, self.port):
+                for label, route, path in routes:
+                    asyncio.run(http_load(self.host, self.port, [path] * self.warmup, 1, headers))
+                    for concurrency in self.concurrency:
+                        self.log(f'{server} {label} x{concurrency} ...')
+                        timings, statuses, elapsed = asyncio.run(
+                            http_load(self.host, self.port, [path] * self.requests, concurrency, headers))
+                        row = summarize(label, route, 'GET', timings, [], statuses, elapsed)
+                        results.append({'server': server, 'concurrency': concurrency, **row})
+        return results
+
+
+class SigninBenchmark:
+    """
+    Sign-ins per second per core for each configured password hasher.
+
+    Requests go through ``/api/admin/signin/`` with the test client in a
+    single thread, so wall-clock throughput is per core; ``cpu_ms`` also
+    counts hasher threads (Argon2 runs ``parallelism`` lanes). Besides a
+    plain sign-in per hasher it measures the first sign-in of an account
+    still on the ``legacy`` hash (verify, rehash with the preferred hasher
+    and save) and a sign-in
+    refused by the failed-login throttle. Everything is rolled back.
+    """
+
+    def __init__(self, requests=20, hashers=None, legacy='django.contrib.auth.hashers.PBKDF2PasswordHasher',
+                 log=None):
+        self.requests = requests
+        self.hashers = hashers or settings.PASSWORD_HASHERS
+        self.legacy = legacy
+        self.log = log or (lambda message: None)
+
+    def available_hashers(self):
+        available = []
+        for path in self.hashers:
+            with override_settings(PASSWORD_HASHERS=[path]):
+                try:
+                    make_password(BENCH_PASSWORD)
+                except ValueError:  # the hasher's library is not installed
+                    self.log(f'skipping {path}')
+                    continue
+            available.append(path)
+        return available
+
+    def measure(self, label, client, user, password, reset=None):
+        timings, statuses = [], []
+        wall = cpu = 0.0
+        for _ in range(self.requests):
+            if reset:
+                reset()
+            start, cpu_start = time.perf_counter(), time.process_time()
+            response = client.post('/api/admin/signin/', {'username': user.username, 'password': password},
+                                   format='json')
+            wall += time.perf_counter() - start
+            cpu += time.process_time() - cpu_start
+            timings.append((time.perf_counter() - start) * 1000)
+            statuses.append(response.status_code)
+        row = summarize(label, 'api/admin/signin/', 'POST', timings, [], statuses, wall)
+        row['cpu_ms'] = round(cpu / self.requests * 1000, 3)
+        row['signins_per_core_s'] = round(self.requests / cpu, 1) if cpu else None
+        return row
+
+    def run(self):
+        results = []
+        client = APIClient()
+        run = int(time.time()) % 10 ** 5
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            with transaction.atomic():
+                for n, path in enumerate(self.available_hashers()):
+                    algorithm = get_hasher_algorithm(path)
+                    self.log(f'{algorithm} ...')
+                    with override_settings(PASSWORD_HASHERS=[path, self.legacy]):
+                        user = User.objects.create_user(username=f'bench-signin-{run}-{n}', password=BENCH_PASSWORD,
+                                                        role=User.Role.WORKER)
+                        results.append(self.measure(f'sign-in ({algorithm})', client, user, BENCH_PASSWORD))
+
+                        # Accounts are migrated to the preferred (first) hasher only.
+                        if n == 0 and self.legacy and self.legacy != path:
+                            legacy_hash = make_password(BENCH_PASSWORD, hasher=get_hasher_algorithm(self.legacy))
+                            results.append(self.measure(
+                                f'sign-in ({get_hasher_algorithm(self.legacy)} -> {algorithm} rehash)',
+                                client, user, BENCH_PASSWORD,
+                                reset=lambda: User.objects.filter(pk=user.pk).update(password=legacy_hash)))
+
+                user = User.objects.create_user(username=f'bench-throttled-{run}', role=User.Role.WORKER)
+                for _ in range(login_throttle.config['MAX_FAILURES']):
+                    login_throttle.record_failure(user.username, '127.0.0.1')
+                results.append(self.measure('sign-in refused by throttle', client, user, 'wrong-password'))
+                login_throttle.reset(user.username)
+                transaction.set_rollback(True)
+        return results
+
+
+def get_hasher_algorithm(path):
+    with override_settings(PASSWORD_HASHERS=[path]):
+        return get_hasher().algorithm
+
+
+class BorrowConcurrencyBenchmark:
+    """
+    Borrow/return throughput with ``threads`` members borrowing at once.
+
+    Each thread borrows one of a few shared books and returns it, in a loop,
+    for ``seconds``. Connections are closed between cycles as they would be
+    between requests, honouring ``CONN_MAX_AGE``. Cycles that fail with
+    "database is locked" (or another ``OperationalError``) are counted
+    separately. Commits are real, so the benchmark creates its own members
+    and books and deletes them afterwards.
+    """
+
+    def __init__(self, threads=(1, 4, 16), seconds=5.0, books=5, log=None):
+        self.threads = threads
+        self.seconds = seconds
+        self.books = books
+        self.log = log or (lambda message: None)
+
+    def setup(self, run):
+        members = User.objects.bulk_create(
+            User(username=f'bench-concurrency-{run}-{i}', role=User.Role.MEMBER) for i in range(max(self.threads)))
+        author = Author.objects.create(first_name='Bench', last_name=f'Concurrency {run}')
+        books = [Book.objects.create(title=f'Concurrency {run} #{i}', isbn=f'9{run:05d}{i:07d}', author=author,
+                                     publication_date=date(2000, 1, 1), total_copies=10_000, available_copies=10_000)
+                 for i in range(self.books)]
+        return members, books
+
+    def teardown(self, members, books):
+        Borrow.objects.filter(book__in=books).delete()
+        for book in books:
+            book.delete()
+        Author.objects.filter(pk=books[0].author_id).delete()
+        User.objects.filter(pk__in=[member.pk for member in members]).delete()
+
+    def worker(self, member, book_ids, start, timings, failures):
+        start.wait()
+        deadline = time.perf_counter() + self.seconds
+        cycle = 0
+        try:
+            while time.perf_counter() < deadline:
+                book_id = book_ids[cycle % len(book_ids)]
+                cycle += 1
+                began = time.perf_counter()
+                try:
+                    borrow = borrow_book(member, book_id)
+                    return_book(member, borrow.id)
+                except (OperationalError, InventoryError) as e:
+                    failures.append(type(e).__name__ if isinstance(e, InventoryError) else str(e))
+                else:
+                    timings.append((time.perf_counter() - began) * 1000)
+                finally:
+                    close_old_connections()
+        finally:
+            connection.close()
+
+    def measure(self, threads, members, book_ids):
+        timings, failures = [], []
+        start = threading.Barrier(threads + 1)
+        workers = [threading.Thread(target=self.worker, args=(members[i], book_ids, start, timings, failures))
+                   for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - began
+
+        ordered = sorted(timings)
+        return {
+            'threads': threads,
+            'cycles': len(timings),
+            'failed': len(failures),
+            'errors': dict(Counter(failures).most_common(3)),
+            'cycles_per_second': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(ordered, 50), 3) if ordered else None,
+            'p99_ms': round(percentile(ordered, 99), 3) if ordered else None,
+        }
+
+    def run(self):
+        run = int(time.time()) % 10 ** 5
+        members, books = self.setup(run)
+        # Let the worker threads open their own connections.
+        connection.close()
+        try:
+            results = []
+            for threads in self.threads:
+                self.log(f'{threads} threads ...')
+                results.append(self.measure(threads, members, [book.pk for book in books]))
+            return results
+        finally:
+            self.teardown(members, books)
+
+
+def database_profile():
+    """
+    The settings of the default database that matter for concurrent writes.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        else:
+            journal_mode = None
+    options = connection.settings_dict['OPTIONS']
+    return {
+        'vendor': connection.vendor,
+        'journal_mode': journal_mode,
+        'transaction_mode': options.get('transaction_mode'),
+        'timeout': options.get('timeout'),
+        'pool': bool(options.get('pool')),
+        'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+    }
+
+
+# Environment overrides for ``benchmark_concurrency --compare`` (see library_project/database.py).
+CONCURRENCY_PROFILES = {
+    'untuned': {'DATABASE_SQLITE_TUNED': '0', 'DATABASE_CONN_MAX_AGE': '0', 'DATABASE_POOL': '0'},
+    'tuned': {},
+}
+
+
+def run_profile(name, args):
+    """
+    Run ``manage.py benchmark_concurrency --json`` with ``args`` under profile ``name``.
+    """
+    env = {**os.environ, **CONCURRENCY_PROFILES[name]}
+    manage = os.path.join(settings.BASE_DIR, 'manage.py')
+    completed = subprocess.run([sys.executable, manage, 'benchmark_concurrency', '--json', *args],
+                               env=env, capture_output=True, text=True)
+    if completed.returncode:
+        raise RuntimeError(f'{name} run failed:\n{completed.stderr}')
+    return completed.stdout
@@ -0,0 +1,251 @@
+"""
+Read-through cache for serialized catalog payloads.
+
+Every entry records the versions of the things it was built from, e.g. a
+book payload depends on ``book:<id>``, ``author:<id>``, ``category:<id>`` and
+``subcategory:<id>``, and a list page depends on table-wide versions such as
+``books``. A read is a hit only while all of those versions are unchanged,
+so invalidating is just bumping a version (``core.signals`` does it on
+model saves and deletes, ``core.services`` when borrows move a book's
+``available_copies``). Versions and entries live in the Django cache
+configured by ``CATALOG_CACHE['ALIAS']``; an in-process LRU in front of it
+saves the fetch and unpickle of hot payloads but is validated the same way.
+
+Entries are built from the primary database, never from a read replica
+(``filling``): the versions are read first, so data from a lagging replica
+would be stored as current.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .replicas import primary_reads
+
+DEFAULTS = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    'LRU_SIZE': 1024,
+}
+
+# Table-wide versions that list pages depend on.
+BOOKS = 'books'
+AUTHORS = 'authors'
+CATEGORIES = 'categories'
+SUBCATEGORIES = 'subcategories'
+AVAILABILITY = 'availability'
+# Every change to a book or a row it shows bumps one of these.
+CATALOG = [BOOKS, AUTHORS, CATEGORIES, SUBCATEGORIES, AVAILABILITY]
+
+
+class LRUCache:
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class CatalogCache:
+    prefix = 'catalog'
+
+    def __init__(self):
+        self.lru = LRUCache(self.config['LRU_SIZE'])
+
+    @property
+    def config(self):
+        return {**DEFAULTS, **getattr(settings, 'CATALOG_CACHE', {})}
+
+    @property
+    def enabled(self):
+        return self.config['ENABLED']
+
+    @property
+    def backend(self):
+        return caches[self.config['ALIAS']]
+
+    def _key(self, name):
+        return f'{self.prefix}:{name}'
+
+    def _version_key(self, dep):
+        return f'{self.prefix}:v:{dep}'
+
+    def get_versions(self, deps):
+        keys = {self._version_key(dep): dep for dep in set(deps)}
+        found = self.backend.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            # A fresh, never reused starting value, so an evicted version can't
+            # come back equal to one recorded in an old entry.
+            for key in missing:
+                self.backend.add(key, time.time_ns(), timeout=None)
+            found.update(self.backend.get_many(missing))
+        return {dep: found.get(key) for key, dep in keys.items()}
+
+    def bump(self, deps):
+        """
+        Invalidate everything built from ``deps``.
+
+        Bumped now and again once the surrounding transaction commits, so an
+        entry rebuilt from not yet committed data cannot outlive the commit.
+        Versions are kept even with ``ENABLED`` off, since ETags are built
+        from them.
+        """
+        if not deps:
+            return
+        keys = [self._version_key(dep) for dep in set(deps)]
+
+        def bump_versions():
+            for key in keys:
+                try:
+                    self.backend.incr(key)
+                except ValueError:
+                    self.backend.set(key, time.time_ns(), timeout=None)
+
+        bump_versions()
+        transaction.on_commit(bump_versions)
+
+    def _get_entries(self, names):
+        entries, remote = {}, []
+        for name in names:
+            entry = self.lru.get(self._key(name))
+            if entry is None:
+                remote.append(self._key(name))
+            else:
+                entries[name] = entry
+        if remote:
+            for key, entry in self.backend.get_many(remote).items():
+                self.lru.set(key, entry)
+                entries[key[len(self.prefix) + 1:]] = entry
+        return entries
+
+    def get_many(self, names):
+        """
+        Cached data for each of ``names`` whose dependencies are unchanged.
+        """
+        if not self.enabled or not names:
+            return {}
+        entries = self._get_entries(names)
+        versions = self.get_versions(dep for entry in entries.values() for dep in entry['deps'])
+        return {
+            name: entry['data'] for name, entry in entries.items()
+            if all(versions[dep] == version for dep, version in entry['deps'].items())
+        }
+
+    def get(self, name):
+        return self.get_many([name]).get(name)
+
+    def set_many(self, items, versions=None):
+        """
+        Store ``{name: (data, deps)}``.
+
+        Pass ``versions`` read *before* querying the data when the deps are
+        known up front; otherwise they are read now.
+        """
+        if not self.enabled or not items:
+            return
+        if versions is None:
+            versions = self.get_versions(dep for _, deps in items.values() for dep in deps)
+        entries = {
+            self._key(name): {'deps': {dep: versions[dep] for dep in deps}, 'data': data}
+            for name, (data, deps) in items.items()
+        }
+        self.backend.set_many(entries, self.config['TIMEOUT'])
+        for key, entry in entries.items():
+            self.lru.set(key, entry)
+
+    def set(self, name, data, deps, versions=None):
+        self.set_many({name: (data, deps)}, versions)
+
+    def filling(self):
+        """
+        Context for the queries whose results are stored: on the primary.
+        """
+        return primary_reads() if self.enabled else nullcontext()
+
+    def get_or_set(self, name, deps, build):
+        """
+        Cached data for ``name``, or ``build()`` stored under ``deps``.
+        """
+        data = self.get(name)
+        if data is None:
+            versions = self.get_versions(deps)
+            with self.filling():
+                data = build()
+            self.set(name, data, deps, versions)
+        return data
+
+    def clear(self):
+        self.lru.clear()
+        self.backend.clear()
+
+    # Catalog helpers
+
+    def list_name(self, view, query_params):
+        params = sorted((key, value) for key in query_params for value in query_params.getlist(key))
+        digest = hashlib.md5(repr(params).encode()).hexdigest()
+        return f'{view}:{digest}'
+
+    def book_deps(self, book):
+        deps = [f'book:{book.pk}', f'author:{book.author_id}']
+        if book.category_id:
+            deps.append(f'category:{book.category_id}')
+        if book.subcategory_id:
+            # SubCategory.__str__ includes its category's name.
+            deps += [f'subcategory:{book.subcategory_id}', f'category:{book.subcategory.category_id}']
+        return deps
+
+    def get_books(self, ids):
+        cached = self.get_many([f'book:{pk}' for pk in ids])
+        return {int(name.split(':')[1]): data for name, data in cached.items()}
+
+    def set_books(self, books, entries, guard):
+        """
+        Store the payloads built from ``books``.
+
+        A book's deps are only known once it is loaded, so its versions are
+        read after the query. ``guard`` holds the ``CATALOG`` versions read
+        before it: if any has moved since, a change may have landed in
+        between and nothing is stored.
+        """
+        if not self.enabled:
+            return
+        items = {f'book:{book.pk}': (data, self.book_deps(book)) for book, data in zip(books, entries)}
+        versions = self.get_versions(dep for _, deps in items.values() for dep in deps)
+        if self.get_versions(guard) != guard:
+            return
+        self.set_many(items, versions)
+
+    def availability_changed(self, book_ids):
+        self.bump([f'book:{pk}' for pk in book_ids] + [AVAILABILITY])
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,38 @@
+"""
+System checks for settings that need a cache shared by every worker.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+
+from .cache import catalog_cache
+from .replicas import get_config as get_replica_config
+
+PROCESS_LOCAL = (LocMemCache, DummyCache)
+
+
+@register(Tags.caches)
+def check_shared_caches(app_configs, **kwargs):
+    """
+    Warn when the catalog versions or replica stickiness live in a
+    process-local cache. Each worker would then have its own versions, so
+    a write made through one worker would not invalidate the cached
+    entries or list ETags of the others. Skipped with ``DEBUG``, where a
+    single development server process is assumed.
+    """
+    if settings.DEBUG:
+        return []
+    uses = [("CATALOG_CACHE['ALIAS']", catalog_cache.config['ALIAS'],
+             'catalog versions, and the ETags built from them, differ between workers')]
+    replicas = get_replica_config()
+    if replicas['ALIASES']:
+        uses.append(("READ_REPLICAS['CACHE_ALIAS']", replicas['CACHE_ALIAS'],
+                     'a member stays sticky to the primary only on the worker that took their write'))
+    return [
+        Warning(f'{setting} names the process-local cache {alias!r}: {consequence}.',
+                hint='Point it at a cache shared by every worker, such as Redis or Memcached.',
+                id='core.W001')
+        for setting, alias, consequence in uses if isinstance(caches[alias], PROCESS_LOCAL)
+    ]
@@ -0,0 +1,48 @@
+"""
+Validators for HTTP conditional requests (``If-None-Match``/``If-Modified-Since``).
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+
+def _etag(*parts):
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def book_validators(book):
+    """
+    ETag and Last-Modified of a book's payload.
+
+    Built from the ``updated_at`` of the book and of every related row its
+    payload shows, plus the relation ids so that a relation set to NULL
+    (e.g. its subcategory deleted) changes the ETag too.
+    """
+    related = [book.author, book.category, book.subcategory]
+    if book.subcategory is not None:
+        related.append(book.subcategory.category)
+    stamps = [book.updated_at] + [obj.updated_at for obj in related if obj is not None]
+    etag = _etag(book.pk, book.author_id, book.category_id, book.subcategory_id, stamps)
+    return etag, int(max(stamps).timestamp())
+
+
+def versions_etag(name, versions):
+    """
+    ETag of a cached view from the catalog versions it depends on.
+    """
+    return _etag(name, sorted(versions.items()))
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    A ``304 Not Modified`` response when the client's copy is current, else None.
+    """
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
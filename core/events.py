@@ -0,0 +1,146 @@
+"""
+Availability change events.
+
+Every borrow, return, hold pickup deadline and reconciliation that moves a
+book's ``available_copies`` calls ``publish_availability``. Once the
+transaction commits, it reads the new counters and publishes one event per
+book, ``{"id": <sequence>, "book": <id>, "available_copies": <n>}``, to the
+backend named by ``AVAILABILITY_EVENTS['BACKEND']``.
+``/api/books/availability/events/`` hands them to subscribers, as a
+server-sent event stream under ASGI or as long-poll responses under WSGI.
+
+A backend keeps the most recent events in order and lets readers wait for
+ones newer than a sequence number:
+
+- ``publish(changes)`` takes ``[(book_id, available_copies)]``.
+- ``last_id()`` is the newest sequence number.
+- ``since(last_id, book_ids)`` returns the newer events for ``book_ids``, or
+  ``None`` when ``last_id`` is not from this backend or has dropped out of
+  its buffer, so the reader has to start over from a snapshot.
+- ``await wait(last_id, book_ids, timeout)`` is like ``since`` but waits up
+  to ``timeout`` seconds for an event, returning ``[]`` if none comes.
+
+``InProcessBackend`` keeps them in memory and only sees the events of its own
+process. That is enough for a single worker or for local development; with
+several workers, subscribers should go through a backend shared by all of
+them (e.g. Redis pub/sub) with the same interface.
+"""
+import asyncio
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import Book
+
+DEFAULTS = {
+    'BACKEND': 'core.events.InProcessBackend',
+    # Events kept for readers that reconnect with their last event id.
+    'BUFFER_SIZE': 10_000,
+    'MAX_BOOKS': 100,
+    # Seconds a long-poll request waits for an event.
+    'LONG_POLL_TIMEOUT': 25,
+    # An SSE stream sends a comment after HEARTBEAT idle seconds and ends
+    # after STREAM_SECONDS, when the client reconnects with Last-Event-ID.
+    'HEARTBEAT': 15,
+    'STREAM_SECONDS': 300,
+    'RETRY_MS': 1000,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'AVAILABILITY_EVENTS', {})}
+
+
+class InProcessBackend:
+
+    def __init__(self, buffer_size):
+        self._events = deque(maxlen=buffer_size)
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._waiters = set()
+
+    def publish(self, changes):
+        changes = list(changes)
+        with self._lock:
+            for book_id, available_copies in changes:
+                self._last_id += 1
+                self._events.append({'id': self._last_id, 'book': book_id, 'available_copies': available_copies})
+            waiters = list(self._waiters)
+        # Waiters sleep on their own event loops; publishers run in request threads.
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def last_id(self):
+        return self._last_id
+
+    def since(self, last_id, book_ids):
+        with self._lock:
+            oldest = self._events[0]['id'] if self._events else self._last_id + 1
+            if not oldest - 1 <= last_id <= self._last_id:
+                return None
+            # Newest events are at the end; stop at the first one already seen.
+            events = []
+            for event in reversed(self._events):
+                if event['id'] <= last_id:
+                    break
+                if event['book'] in book_ids:
+                    events.append(event)
+            return events[::-1]
+
+    async def wait(self, last_id, book_ids, timeout):
+        loop = asyncio.get_running_loop()
+        waiter = (loop, asyncio.Event())
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            deadline = loop.time() + timeout
+            while True:
+                events = self.since(last_id, book_ids)
+                if events is None or events:
+                    return events
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return []
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), remaining)
+                except asyncio.TimeoutError:
+                    return []
+                waiter[1].clear()
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+_backends = {}
+
+
+def get_backend():
+    config = get_config()
+    backend = _backends.get(config['BACKEND'])
+    if backend is None:
+        backend = _backends[config['BACKEND']] = import_string(config['BACKEND'])(config['BUFFER_SIZE'])
+    return backend
+
+
+def publish_availability(book_ids):
+    """
+    Publish the ``available_copies`` of ``book_ids`` once the transaction commits.
+    """
+    book_ids = list(book_ids)
+    if not book_ids:
+        return
+
+    def publish():
+        get_backend().publish(Book.objects.filter(id__in=book_ids).order_by('id')
+                              .values_list('id', 'available_copies'))
+
+    transaction.on_commit(publish)
+
+
+def snapshot(book_ids):
+    return [{'book': book_id, 'available_copies': available_copies}
+            for book_id, available_copies in Book.objects.filter(id__in=book_ids).order_by('id')
+            .values_list('id', 'available_copies')]
@@ -0,0 +1,74 @@
+"""
+Streaming exports of the borrow log.
+
+Rows are read with a ``values()`` projection through ``.iterator()`` and
+written out as they arrive, so an export of any size holds only one chunk
+of rows in memory.
+"""
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from .querysets import with_overdue
+
+BORROW_EXPORT_FIELDS = {
+    'id': 'id',
+    'member': 'member__username',
+    'book_id': 'book_id',
+    'book': 'book__title',
+    'borrow_date': 'borrow_date',
+    'due_date': 'due_date',
+    'return_date': 'return_date',
+    'returned': 'returned',
+}
+
+
+class Echo:
+    """
+    A file-like object whose ``write`` hands back what it was given, so
+    ``csv.writer`` can format one row at a time.
+    """
+
+    def write(self, value):
+        return value
+
+
+def borrow_rows(borrows, chunk_size=None):
+    chunk_size = chunk_size or settings.BORROW_EXPORT_CHUNK_SIZE
+    rows = (with_overdue(borrows).order_by('id')
+            .values(*BORROW_EXPORT_FIELDS.values(), 'is_overdue').iterator(chunk_size=chunk_size))
+    for row in rows:
+        record = {name: row[field] for name, field in BORROW_EXPORT_FIELDS.items()}
+        record['is_overdue'] = row['is_overdue']
+        yield record
+
+
+def csv_lines(records):
+    writer = csv.writer(Echo())
+    yield writer.writerow([*BORROW_EXPORT_FIELDS, 'is_overdue'])
+    for record in records:
+        yield writer.writerow(record.values())
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (csv_lines, 'text/csv', 'csv'),
+    'ndjson': (ndjson_lines, 'application/x-ndjson', 'ndjson'),
+}
+
+
+def stream_borrows(borrows, output='csv'):
+    """
+    A ``StreamingHttpResponse`` with ``borrows`` as a CSV or NDJSON attachment.
+    """
+    lines, content_type, extension = EXPORT_FORMATS[output]
+    response = StreamingHttpResponse(lines(borrow_rows(borrows)), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="borrows.{extension}"'
+    return response
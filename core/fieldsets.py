@@ -0,0 +1,41 @@
+"""
+Sparse fieldsets for list and detail responses.
+
+``?fields=id,title`` returns just those fields; ``?view=compact`` returns the
+serializer's ``compact_fields``, which leave out heavy columns such as a
+book's description. Views narrow their queryset to the selected fields
+(``core.querysets``), so unused columns are never read from the database.
+"""
+VIEWS = ('full', 'compact')
+
+
+class FieldsetError(ValueError):
+    pass
+
+
+def requested_fields(serializer_class, query_params):
+    """
+    The serializer fields selected by ``query_params``, in serializer order,
+    or ``None`` for all of them.
+    """
+    available = serializer_class.Meta.fields
+    view = query_params.get('view', 'full')
+    if view not in VIEWS:
+        raise FieldsetError(f"view must be one of: {', '.join(VIEWS)}.")
+
+    names = query_params.get('fields')
+    if names is None:
+        return serializer_class.compact_fields if view == 'compact' else None
+
+    selected = {name.strip() for name in names.split(',') if name.strip()}
+    if not selected:
+        raise FieldsetError('fields must name at least one field.')
+    unknown = sorted(selected - set(available))
+    if unknown:
+        raise FieldsetError(f"Unknown fields: {', '.join(unknown)}. "
+                            f"Available: {', '.join(available)}.")
+    return [name for name in available if name in selected]
+
+
+def project(payload, fields):
+    return payload if fields is None else {name: payload[name] for name in fields}
@@ -0,0 +1,263 @@
+"""
+Bulk catalog import from CSV or JSONL.
+
+The input is read in chunks of ``batch_size`` rows. Each chunk is parsed
+and validated (optionally in a process pool), its authors, categories and
+subcategories are resolved through in-memory maps (missing ones are created
+in bulk), ISBNs already in the catalog or earlier in the input are dropped
+(or update the existing book with ``update``), and the rest is written with
+``bulk_create``, all in one transaction per chunk. Columns: ``title``, ``isbn``, ``publication_date`` (YYYY-MM-DD),
+``author`` ("First Last") or ``author_first_name``/``author_last_name``,
+and optionally ``description``, ``category``, ``subcategory``,
+``total_copies`` and ``available_copies``.
+"""
+import csv
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import CATALOG, catalog_cache
+from .models import (Author, Book, Category, SubCategory)
+from .search import index_books
+
+# updated_at too: bulk_create's upsert skips auto_now, and the book's ETag is built from it.
+UPDATE_FIELDS = ['title', 'description', 'publication_date', 'author', 'category', 'subcategory', 'updated_at']
+
+
+class RowError(ValueError):
+    pass
+
+
+def _text(raw, key, max_length=None, required=False):
+    value = raw.get(key)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f'{key} is required')
+    if max_length and len(value) > max_length:
+        raise RowError(f'{key} is longer than {max_length} characters')
+    return value
+
+
+def _copies(raw, key, default):
+    value = raw.get(key)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{key} must be an integer')
+    if value < 0:
+        raise RowError(f'{key} must not be negative')
+    return value
+
+
+def parse_row(raw):
+    """
+    Validate one input row and normalize it to the values a ``Book`` needs.
+    """
+    if not isinstance(raw, dict):
+        raise RowError('row must be an object')
+    first_name = _text(raw, 'author_first_name', 100)
+    last_name = _text(raw, 'author_last_name', 100)
+    if not (first_name or last_name):
+        first_name, _, last_name = _text(raw, 'author', required=True).rpartition(' ')
+        if len(first_name) > 100 or len(last_name) > 100:
+            raise RowError('author name is too long')
+    try:
+        publication_date = date.fromisoformat(_text(raw, 'publication_date', required=True))
+    except ValueError:
+        raise RowError('publication_date must be YYYY-MM-DD')
+
+    category = _text(raw, 'category', 100) or None
+    subcategory = _text(raw, 'subcategory', 100) or None
+    if subcategory and not category:
+        raise RowError('subcategory needs a category')
+
+    total_copies = _copies(raw, 'total_copies', 1)
+    return {
+        'title': _text(raw, 'title', 200, required=True),
+        'isbn': _text(raw, 'isbn', 13, required=True),
+        'description': _text(raw, 'description') or None,
+        'publication_date': publication_date,
+        'author': (first_name, last_name),
+        'category': category,
+        'subcategory': subcategory,
+        'total_copies': total_copies,
+        'available_copies': min(_copies(raw, 'available_copies', total_copies), total_copies),
+    }
+
+
+def parse_chunk(fmt, first_line, records):
+    """
+    ``(rows, errors)`` for one chunk; ``errors`` holds ``(line, message)``.
+
+    Runs in pool workers, so it only takes and returns picklable values.
+    """
+    rows, errors = [], []
+    for line, record in enumerate(records, first_line):
+        try:
+            if fmt == 'jsonl':
+                try:
+                    record = json.loads(record)
+                except ValueError:
+                    raise RowError('invalid JSON')
+            rows.append(parse_row(record))
+        except RowError as e:
+            errors.append((line, str(e)))
+    return rows, errors
+
+
+def read_chunks(stream, fmt, batch_size):
+    """
+    Yield ``(first_line, records)`` chunks; CSV records are dicts, JSONL records raw lines.
+    """
+    if fmt == 'csv':
+        # Line 1 is the header.
+        records, first_line = csv.DictReader(stream), 2
+    else:
+        records, first_line = (line for line in stream if line.strip()), 1
+    while True:
+        chunk = list(islice(records, batch_size))
+        if not chunk:
+            return
+        yield first_line, chunk
+        first_line += len(chunk)
+
+
+def parse_chunks(chunks, fmt, workers=0):
+    if not workers:
+        for first_line, records in chunks:
+            yield parse_chunk(fmt, first_line, records)
+        return
+
+    # Keep a bounded number of chunks in flight so the input is never read ahead in full.
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for first_line, records in chunks:
+            pending.append(pool.submit(parse_chunk, fmt, first_line, records))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class BookImporter:
+
+    def __init__(self, batch_size=5000, workers=0, update=False, log=None):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.update = update
+        self.log = log or (lambda message: None)
+        self.stats = {'rows': 0, 'created': 0, 'updated': 0, 'duplicates': 0, 'invalid': 0}
+        self.errors = []
+
+        self.authors = {(first, last): pk for pk, first, last
+                        in Author.objects.values_list('id', 'first_name', 'last_name')}
+        self.categories = {name: pk for pk, name in Category.objects.values_list('id', 'name')}
+        self.subcategories = {(category_id, name): pk for pk, category_id, name
+                              in SubCategory.objects.values_list('id', 'category_id', 'name')}
+
+    def _create_missing(self, lookup, keys, model, build):
+        missing = list(dict.fromkeys(key for key in keys if key is not None and key not in lookup))
+        created = model.objects.bulk_create([build(key) for key in missing], batch_size=self.batch_size)
+        for key, obj in zip(missing, created):
+            lookup[key] = obj.pk
+
+    def resolve(self, rows):
+        """
+        Create the authors, categories and subcategories ``rows`` name that
+        are not in the maps yet.
+        """
+        self._create_missing(self.authors, (row['author'] for row in rows), Author,
+                             lambda key: Author(first_name=key[0], last_name=key[1]))
+        self._create_missing(self.categories, (row['category'] for row in rows), Category,
+                             lambda name: Category(name=name))
+        self._create_missing(self.subcategories,
+                             ((self.categories[row['category']], row['subcategory'])
+                              for row in rows if row['subcategory']), SubCategory,
+                             lambda key: SubCategory(category_id=key[0], name=key[1]))
+
+    def build(self, row, now):
+        category_id = self.categories[row['category']] if row['category'] else None
+        return Book(
+            title=row['title'],
+            description=row['description'],
+            isbn=row['isbn'],
+            publication_date=row['publication_date'],
+            author_id=self.authors[row['author']],
+            category_id=category_id,
+            subcategory_id=self.subcategories[category_id, row['subcategory']] if row['subcategory'] else None,
+            total_copies=row['total_copies'],
+            available_copies=row['available_copies'],
+            updated_at=now,
+        )
+
+    @transaction.atomic
+    def write(self, rows):
+        # The first row for an ISBN wins, as it does across chunks; with
+        # ``update`` every later row updates it, so the last one wins.
+        unique = {}
+        for row in rows:
+            if row['isbn'] in unique:
+                self.stats['duplicates'] += 1
+                if not self.update:
+                    continue
+            unique[row['isbn']] = row
+
+        existing = set(Book.objects.filter(isbn__in=list(unique)).values_list('isbn', flat=True))
+        if not self.update:
+            self.stats['duplicates'] += len(existing)
+            for isbn in existing:
+                del unique[isbn]
+            existing = set()
+        rows = list(unique.values())
+        if not rows:
+            return
+
+        self.resolve(rows)
+        now = timezone.now()
+        books = [self.build(row, now) for row in rows]
+        if self.update:
+            Book.objects.bulk_create(books, batch_size=self.batch_size, update_conflicts=True,
+                                     unique_fields=['isbn'], update_fields=UPDATE_FIELDS)
+        else:
+            # A concurrent writer may have added an ISBN since the check above.
+            Book.objects.bulk_create(books, batch_size=self.batch_size, ignore_conflicts=True)
+        found = list(Book.objects.filter(isbn__in=list(unique)).values_list('id', 'isbn', 'updated_at'))
+        if self.update:
+            self.stats['created'] += len(rows) - len(existing)
+            self.stats['updated'] += len(existing)
+        else:
+            # Only the rows written here carry the updated_at stamped on ``books``;
+            # the rest were ignored as conflicts.
+            written = {book.isbn: book.updated_at for book in books}
+            created = sum(1 for _, isbn, updated_at in found if updated_at == written[isbn])
+            self.stats['created'] += created
+            self.stats['duplicates'] += len(rows) - created
+
+        # bulk_create skips the signals that keep search and the catalog cache current.
+        # Bumped per chunk, so the books of each committed chunk show up right away.
+        ids = [pk for pk, _, _ in found]
+        index_books(ids)
+        catalog_cache.bump([f'book:{pk}' for pk in ids] + CATALOG)
+
+    def run(self, stream, fmt):
+        started = time.perf_counter()
+        chunks = read_chunks(stream, fmt, self.batch_size)
+        for rows, errors in parse_chunks(chunks, fmt, self.workers):
+            self.stats['rows'] += len(rows) + len(errors)
+            self.stats['invalid'] += len(errors)
+            self.errors.extend(errors[:100 - len(self.errors)])
+            self.write(rows)
+            elapsed = time.perf_counter() - started
+            self.log(f"{self.stats['rows']} rows, {self.stats['rows'] / elapsed:.0f} rows/s")
+
+        elapsed = time.perf_counter() - started
+        return {**self.stats, 'seconds': round(elapsed, 2),
+                'rows_per_second': round(self.stats['rows'] / elapsed) if elapsed else None}
@@ -0,0 +1,55 @@
+import json
+import platform
+import time
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.benchmarking import APIBenchmark
+
+
+class Command(BaseCommand):
+    help = ("Benchmark every route in core/urls.py with the Django test client and report "
+            "p50/p95/p99 latency, queries per request and throughput. "
+            "All writes are rolled back when the run finishes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per route.')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per route.')
+        parser.add_argument('--only', default=None, help='Only run routes whose label contains this text.')
+        parser.add_argument('--output', default='bench_output.json', help='JSON results file.')
+
+    def handle(self, *args, **options):
+        benchmark = APIBenchmark(
+            requests=options['requests'],
+            warmup=options['warmup'],
+            only=options['only'],
+            log=(lambda message: self.stdout.write(f'  {message}')) if options['verbosity'] > 1 else None,
+        )
+        for route in benchmark.missing_routes():
+            self.stderr.write(self.style.WARNING(f'No benchmark defined for /{route}'))
+
+        started = time.time()
+        results = benchmark.run()
+
+        self.stdout.write(f"{'route':<60} {'p50':>8} {'p95':>8} {'p99':>8} {'q/req':>6} {'req/s':>8}")
+        for row in results:
+            self.stdout.write(
+                f"{row['label']:<60} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+                f"{row['queries_per_request']:>6} {row['throughput_rps']:>8}"
+            )
+
+        with open(options['output'], 'w') as f:
+            json.dump({
+                'meta': {
+                    'started': started,
+                    'duration_s': round(time.time() - started, 2),
+                    'requests_per_route': options['requests'],
+                    'database': connection.vendor,
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                },
+                'routes': results,
+            }, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}"))
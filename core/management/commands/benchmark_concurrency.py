@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarking import (CONCURRENCY_PROFILES, BorrowConcurrencyBenchmark, database_profile,
+                               run_profile)
+
+
+class Command(BaseCommand):
+    help = ("Measure borrow/return throughput with several members borrowing at once against the "
+            "configured database. --compare runs it once per database profile (SQLite defaults "
+            "without persistent connections vs. the tuned configuration) and prints both.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', default='1,4,16', help='Comma separated numbers of concurrent members.')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each measurement.')
+        parser.add_argument('--books', type=int, default=5, help='Shared books the members borrow from.')
+        parser.add_argument('--compare', action='store_true',
+                            help=f"Run each of {', '.join(CONCURRENCY_PROFILES)} in a fresh process.")
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON only.')
+        parser.add_argument('--output', help='Also write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        threads = [int(value) for value in options['threads'].split(',')]
+        if options['compare']:
+            forwarded = ['--threads', options['threads'], '--seconds', str(options['seconds']),
+                         '--books', str(options['books'])]
+            results = []
+            for name in CONCURRENCY_PROFILES:
+                self.stdout.write(f'{name} ...')
+                try:
+                    profile = json.loads(run_profile(name, forwarded))
+                except RuntimeError as e:
+                    raise CommandError(str(e))
+                results.append({**profile, 'profile': name})
+        else:
+            benchmark = BorrowConcurrencyBenchmark(
+                threads=threads, seconds=options['seconds'], books=options['books'],
+                log=(lambda message: self.stderr.write(f'  {message}')) if options['verbosity'] > 1 else None,
+            )
+            results = [{'profile': 'current', 'database': database_profile(), 'results': benchmark.run()}]
+            if options['json']:
+                self.stdout.write(json.dumps(results[0]))
+                return
+
+        for profile in results:
+            self.stdout.write(f"\n{profile['profile']}: {profile['database']}")
+            self.stdout.write(f"{'threads':>7} {'cycles/s':>9} {'cycles':>7} {'failed':>7} {'p50':>8} {'p99':>8}  errors")
+            for row in profile['results']:
+                self.stdout.write(
+                    f"{row['threads']:>7} {row['cycles_per_second']:>9} {row['cycles']:>7} {row['failed']:>7} "
+                    f"{row['p50_ms'] or 0:>8.2f} {row['p99_ms'] or 0:>8.2f}  {row['errors']}"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"\nWrote {options['output']}"))
@@ -0,0 +1,98 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from core.models import (Book, Borrow)
+from core.seeding import seed_library
+
+
+class Command(BaseCommand):
+    help = ("Seed a large dataset and compare query plans and timings of the hot filter paths "
+            "with and without the indexes declared on the core models. "
+            "Run it against a scratch database: the indexes are dropped and re-created.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--borrows', type=int, default=1_000_000,
+                            help='Seed until at least this many borrows exist (default: 1,000,000).')
+        parser.add_argument('--books', type=int, default=100_000)
+        parser.add_argument('--members', type=int, default=20_000)
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query; the median is reported.')
+        parser.add_argument('--no-seed', action='store_true', help='Benchmark the existing data as is.')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        connection = connections[alias]
+
+        existing = Borrow.objects.using(alias).count()
+        if not options['no_seed'] and existing < options['borrows']:
+            self.stdout.write(f"Seeding {options['borrows'] - existing} borrows...")
+            seed_library(books=options['books'], members=options['members'],
+                         borrows=options['borrows'] - existing,
+                         log=lambda message: self.stdout.write(f'  {message}'))
+
+        sample = Borrow.objects.using(alias).filter(returned=False).values('member_id').first()
+        if sample is None:
+            self.stderr.write('No active borrows to benchmark; seed some data first.')
+            return
+
+        scenarios = self.get_scenarios(alias, sample['member_id'], timezone.now().date())
+        indexes = [(model, index) for model in (Book, Borrow) for index in model._meta.indexes]
+
+        with connection.schema_editor() as editor:
+            for model, index in indexes:
+                editor.remove_index(model, index)
+        self.analyze(connection)
+        try:
+            before = self.measure(scenarios, options['repeat'])
+        finally:
+            with connection.schema_editor() as editor:
+                for model, index in indexes:
+                    editor.add_index(model, index)
+            self.analyze(connection)
+        after = self.measure(scenarios, options['repeat'])
+
+        for label, _ in scenarios:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{label}'))
+            self.stdout.write(f'  before: {before[label][0]:9.2f} ms  {before[label][1]} rows')
+            for line in before[label][2].splitlines():
+                self.stdout.write(f'          {line}')
+            self.stdout.write(f'  after:  {after[label][0]:9.2f} ms  {after[label][1]} rows')
+            for line in after[label][2].splitlines():
+                self.stdout.write(f'          {line}')
+            speedup = before[label][0] / after[label][0] if after[label][0] else float('inf')
+            self.stdout.write(self.style.SUCCESS(f'  speedup: {speedup:.1f}x'))
+
+    def get_scenarios(self, alias, member_id, today):
+        books = Book.objects.using(alias)
+        borrows = Borrow.objects.using(alias)
+        return [
+            ('Member active borrows (member, returned=False)',
+             borrows.filter(member_id=member_id, returned=False)),
+            ('Member borrow history (returned=True, on the member foreign key index)',
+             borrows.filter(member_id=member_id, returned=True)),
+            ('Overdue borrows ordered by due_date (returned=False, due_date < today)',
+             borrows.filter(returned=False, due_date__lt=today).order_by('due_date')[:100]),
+            ('Available books, first page (available_copies > 0 by publication_date, id)',
+             books.filter(available_copies__gt=0).order_by('publication_date', 'id')[:50]),
+            ('Books by title, first page (title, id)',
+             books.order_by('title', 'id')[:50]),
+        ]
+
+    def measure(self, scenarios, repeat):
+        results = {}
+        for label, queryset in scenarios:
+            timings = []
+            for _ in range(max(1, repeat)):
+                start = time.perf_counter()
+                rows = len(list(queryset.all()))
+                timings.append((time.perf_counter() - start) * 1000)
+            results[label] = (statistics.median(timings), rows, queryset.explain())
+        return results
+
+    def analyze(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
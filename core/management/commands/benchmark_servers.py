@@ -0,0 +1,72 @@
+import json
+import platform
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http.request import validate_host
+
+from core.benchmarking import DEFAULT_SERVERS, ServerBenchmark
+
+
+class Command(BaseCommand):
+    help = ("Compare throughput and latency of the async read views (book list, book detail, "
+            "my borrows) under an ASGI server (uvicorn) and a WSGI server (gunicorn) at several "
+            "levels of concurrent connections. Needs a seeded database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Timed requests per route and concurrency.')
+        parser.add_argument('--warmup', type=int, default=50, help='Untimed requests per route.')
+        parser.add_argument('--concurrency', default='1,16,64', help='Comma separated connection counts.')
+        parser.add_argument('--asgi', default=DEFAULT_SERVERS['asgi'],
+                            help='ASGI server command; {host} and {port} are filled in.')
+        parser.add_argument('--wsgi', default=DEFAULT_SERVERS['wsgi'],
+                            help='WSGI server command; {host} and {port} are filled in.')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--host-header', default='localhost',
+                            help='Host header sent with every request; must be in ALLOWED_HOSTS.')
+        parser.add_argument('--output', default='bench_servers.json', help='JSON results file.')
+
+    def handle(self, *args, **options):
+        if not validate_host(options['host_header'], settings.ALLOWED_HOSTS):
+            raise CommandError(f"Add {options['host_header']!r} to ALLOWED_HOSTS (or pass --host-header).")
+
+        benchmark = ServerBenchmark(
+            servers={'wsgi': options['wsgi'], 'asgi': options['asgi']},
+            concurrency=[int(value) for value in options['concurrency'].split(',')],
+            requests=options['requests'],
+            warmup=options['warmup'],
+            port=options['port'],
+            host_header=options['host_header'],
+            log=(lambda message: self.stdout.write(f'  {message}')) if options['verbosity'] > 1 else None,
+        )
+        started = time.time()
+        try:
+            results = benchmark.run()
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"{'server':<6} {'route':<34} {'conn':>5} {'p50':>8} {'p95':>8} {'p99':>8} "
+                          f"{'req/s':>8}  statuses")
+        for row in results:
+            self.stdout.write(
+                f"{row['server']:<6} {row['label']:<34} {row['concurrency']:>5} {row['p50_ms']:>8.2f} "
+                f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['throughput_rps']:>8}  {row['statuses']}"
+            )
+
+        with open(options['output'], 'w') as f:
+            json.dump({
+                'meta': {
+                    'started': started,
+                    'duration_s': round(time.time() - started, 2),
+                    'requests': options['requests'],
+                    'servers': benchmark.servers,
+                    'database': connection.vendor,
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                },
+                'results': results,
+            }, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}"))
@@ -0,0 +1,51 @@
+import json
+import os
+import platform
+import time
+
+import django
+from django.core.management.base import BaseCommand
+
+from core.benchmarking import SigninBenchmark
+
+
+class Command(BaseCommand):
+    help = ("Measure sign-ins per second per core for every hasher in PASSWORD_HASHERS, the "
+            "first sign-in that rehashes a legacy hash, and a sign-in refused by the throttle. "
+            "All writes are rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Timed sign-ins per case.')
+        parser.add_argument('--legacy', default='django.contrib.auth.hashers.PBKDF2PasswordHasher',
+                            help='Hasher of the accounts migrated by rehash-on-login.')
+        parser.add_argument('--output', default='bench_signin.json', help='JSON results file.')
+
+    def handle(self, *args, **options):
+        benchmark = SigninBenchmark(
+            requests=options['requests'],
+            legacy=options['legacy'],
+            log=(lambda message: self.stdout.write(f'  {message}')) if options['verbosity'] > 1 else None,
+        )
+        started = time.time()
+        results = benchmark.run()
+
+        self.stdout.write(f"{'case':<44} {'p50':>9} {'p95':>9} {'cpu ms':>9} {'/s/core':>8}  statuses")
+        for row in results:
+            self.stdout.write(
+                f"{row['label']:<44} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['cpu_ms']:>9.2f} "
+                f"{row['signins_per_core_s']:>8}  {row['statuses']}"
+            )
+
+        with open(options['output'], 'w') as f:
+            json.dump({
+                'meta': {
+                    'started': started,
+                    'duration_s': round(time.time() - started, 2),
+                    'requests': options['requests'],
+                    'cpu_count': os.cpu_count(),
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                },
+                'results': results,
+            }, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from core.services import expire_holds
+
+
+class Command(BaseCommand):
+    help = ("Expire holds whose copy was not picked up within HOLD_PICKUP_DAYS and pass each copy "
+            "to the next member in line (e.g. hourly from cron).")
+
+    def handle(self, *args, **options):
+        expired = expire_holds()
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} holds.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Book
+from core.search import get_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the book full-text search index from scratch. "
+            "Run it after bulk writes that bypass model signals (bulk_create, update()).")
+
+    def handle(self, *args, **options):
+        if get_backend() is None:
+            self.stdout.write('This database has no full-text index; search falls back to icontains.')
+            return
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {Book.objects.count()} books.'))
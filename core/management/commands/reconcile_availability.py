@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from core.reconciliation import reconcile_availability
+
+
+class Command(BaseCommand):
+    help = ("Recompute Book.available_copies as total_copies minus active borrows, "
+            "report every book that drifted and fix them in bulk.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only re-check books touched since the last applied run.')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it.')
+        parser.add_argument('--batch-size', type=int, default=1_000)
+
+    def handle(self, *args, **options):
+        run, drift = reconcile_availability(incremental=options['incremental'],
+                                            apply=not options['dry_run'],
+                                            batch_size=options['batch_size'])
+        for book_id, title, available, expected in drift:
+            self.stdout.write(f'  #{book_id} {title}: available_copies {available} -> {expected}')
+
+        scope = 'touched since the last run' if run.incremental else 'all books'
+        if not drift:
+            self.stdout.write(self.style.SUCCESS(f'No drift ({scope}).'))
+        elif run.applied:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {len(drift)} drifted books ({scope}).'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{len(drift)} drifted books ({scope}); dry run, nothing changed.'))
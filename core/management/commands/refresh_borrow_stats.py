@@ -0,0 +1,33 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.stats import refresh_stats
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the per book and day borrow/return rollups behind /api/stats/ from the "
+            "borrow log, for every day or only recent ones.")
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument('--days', type=int, help='Only rebuild the last DAYS days (e.g. nightly from cron).')
+        group.add_argument('--since', help='Only rebuild from this date on (YYYY-MM-DD).')
+        parser.add_argument('--batch-size', type=int, default=1_000)
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days'] is not None:
+            if options['days'] < 1:
+                raise CommandError('--days must be positive.')
+            since = timezone.now().date() - timedelta(days=options['days'] - 1)
+        elif options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since must be YYYY-MM-DD.')
+
+        rows = refresh_stats(since, batch_size=options['batch_size'])
+        scope = f'since {since}' if since else 'for every day'
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} daily book statistics {scope}.'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from core.seeding import seed_library
+
+
+class Command(BaseCommand):
+    help = ("Seed a synthetic library: authors, categories, subcategories, books, "
+            "members and historical borrows.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=10_000)
+        parser.add_argument('--members', type=int, default=2_000)
+        parser.add_argument('--borrows', type=int, default=100_000)
+        parser.add_argument('--authors', type=int, default=None, help='Defaults to one author per ten books.')
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--subcategories', type=int, default=5, help='Subcategories per category.')
+        parser.add_argument('--active-ratio', type=float, default=0.03,
+                            help='Share of borrows that are still open (default: 0.03).')
+        parser.add_argument('--batch-size', type=int, default=5_000)
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for a reproducible dataset.')
+
+    def handle(self, *args, **options):
+        log = (lambda message: self.stdout.write(f'  {message}')) if options['verbosity'] > 1 else None
+        created = seed_library(
+            books=options['books'],
+            members=options['members'],
+            borrows=options['borrows'],
+            authors=options['authors'],
+            categories=options['categories'],
+            subcategories_per_category=options['subcategories'],
+            active_ratio=options['active_ratio'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            log=log,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'Created ' + ', '.join(f'{count} {name}' for name, count in created.items())
+        ))
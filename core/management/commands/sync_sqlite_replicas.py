@@ -0,0 +1,30 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.replicas import get_config
+
+
+class Command(BaseCommand):
+    help = ("Copy the default SQLite database into each replica file from DATABASE_REPLICAS, as a "
+            "local stand-in for replication. Run it again to let the replicas catch up.")
+
+    def handle(self, *args, **options):
+        aliases = get_config()['ALIASES']
+        if not aliases:
+            raise CommandError('No replicas configured; set DATABASE_REPLICAS to SQLite file paths.')
+        primary = connections[DEFAULT_DB_ALIAS]
+        if any(connections[alias].vendor != 'sqlite' for alias in (DEFAULT_DB_ALIAS, *aliases)):
+            raise CommandError('Only SQLite replicas can be copied; use the database\'s own replication.')
+
+        primary.ensure_connection()
+        for alias in aliases:
+            connections[alias].close()
+            target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+            try:
+                # The backup API copies a consistent snapshot while writers carry on.
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(self.style.SUCCESS(f'Copied {DEFAULT_DB_ALIAS} to {alias}.'))
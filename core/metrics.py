@@ -0,0 +1,275 @@
+"""
+Per-request timing and SQL instrumentation.
+
+``RequestMetricsMiddleware`` measures each request: the number and total
+duration of its SQL queries, the time until the view returned (``view``),
+the time spent rendering the response body (``render``, i.e. serializing
+DRF's data to JSON) and the total. The numbers go out as a
+``Server-Timing`` header and a ``key=value`` log line on the ``core.metrics``
+logger, and are added to rolling per-route histograms served by
+``/api/metrics/``.
+
+Queries are counted by a database execute wrapper installed on every
+connection (``core.signals``). It finds the current request through a
+context variable, which asgiref carries into the threads async views run
+their queries in. Histograms are per process.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SERVER_TIMING': True,
+    'LOG': True,
+    # Histograms cover the last WINDOW seconds, kept as SLOTS rotating slices.
+    'WINDOW': 300,
+    'SLOTS': 5,
+    # Upper bounds in milliseconds; a final +Inf bucket catches the rest.
+    'BUCKETS': (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+}
+
+TIMINGS = ('total', 'view', 'render', 'db')
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_METRICS', {})}
+
+
+class RequestRecord:
+    __slots__ = ('started', 'view_done', 'render_started', 'render_done', 'queries', 'db')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_done = self.render_started = self.render_done = None
+        self.queries = 0
+        self.db = 0.0
+
+    def timings(self, finished):
+        view_done = self.view_done or finished
+        render = (self.render_done - self.render_started) if self.render_done else 0.0
+        return {
+            'total': (finished - self.started) * 1000,
+            'view': (view_done - self.started) * 1000,
+            'render': render * 1000,
+            'db': self.db * 1000,
+        }
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper adding each query's duration to the current request.
+    """
+    record = _current.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record.db += time.perf_counter() - started
+        record.queries += 1
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class RollingHistogram:
+    """
+    Bucket counts of the values seen in the last ``window`` seconds.
+    """
+
+    def __init__(self, buckets, window, slots):
+        self.buckets = tuple(buckets)
+        self.slot_seconds = window / slots
+        self.slots = [[None, [0] * (len(self.buckets) + 1), 0.0] for _ in range(slots)]
+
+    def _slot(self, now):
+        index = int(now // self.slot_seconds)
+        slot = self.slots[index % len(self.slots)]
+        if slot[0] != index:
+            slot[0], slot[1], slot[2] = index, [0] * (len(self.buckets) + 1), 0.0
+        return slot
+
+    def add(self, value, now):
+        slot = self._slot(now)
+        slot[1][bisect_left(self.buckets, value)] += 1
+        slot[2] += value
+
+    def snapshot(self, now):
+        oldest = int(now // self.slot_seconds) - len(self.slots) + 1
+        counts, total = [0] * (len(self.buckets) + 1), 0.0
+        for index, slot_counts, slot_sum in self.slots:
+            if index is not None and index >= oldest:
+                counts = [a + b for a, b in zip(counts, slot_counts)]
+                total += slot_sum
+        count = sum(counts)
+        return {
+            'count': count,
+            'sum': round(total, 3),
+            'buckets': dict(zip([*map(str, self.buckets), '+Inf'], counts)),
+            'p50': self.quantile(counts, count, 0.50),
+            'p95': self.quantile(counts, count, 0.95),
+            'p99': self.quantile(counts, count, 0.99),
+        }
+
+    def quantile(self, counts, count, q):
+        """
+        Upper bound of the bucket holding the ``q`` quantile (``None`` past the last bound).
+        """
+        if not count:
+            return None
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            seen += bucket_count
+            if seen >= q * count:
+                return bound
+        return None
+
+
+class RouteMetrics:
+
+    def __init__(self, config):
+        histogram = lambda: RollingHistogram(config['BUCKETS'], config['WINDOW'], config['SLOTS'])
+        self.timings = {name: histogram() for name in TIMINGS}
+        self.queries = histogram()
+        self.errors = RollingHistogram((), config['WINDOW'], config['SLOTS'])
+
+    def add(self, timings, queries, status, now):
+        for name, value in timings.items():
+            self.timings[name].add(value, now)
+        self.queries.add(queries, now)
+        if status >= 500:
+            self.errors.add(0, now)
+
+    def snapshot(self, now):
+        timings = {name: histogram.snapshot(now) for name, histogram in self.timings.items()}
+        queries = self.queries.snapshot(now)
+        return {
+            'requests': timings['total']['count'],
+            'errors': self.errors.snapshot(now)['count'],
+            'queries': {key: queries[key] for key in ('sum', 'p50', 'p95', 'p99')},
+            'timings_ms': timings,
+        }
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def add(self, route, method, status, timings, queries):
+        now = time.monotonic()
+        with self._lock:
+            metrics = self._routes.get((route, method))
+            if metrics is None:
+                metrics = self._routes[route, method] = RouteMetrics(get_config())
+            metrics.add(timings, queries, status, now)
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            routes = [{'route': route, 'method': method, **metrics.snapshot(now)}
+                      for (route, method), metrics in sorted(self._routes.items())]
+        return {'window_seconds': get_config()['WINDOW'], 'routes': routes}
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+
+request_metrics = RequestMetrics()
+
+
+def server_timing(timings, queries):
+    return ', '.join([
+        f'db;dur={timings["db"]:.1f};desc="{queries} queries"',
+        f'view;dur={timings["view"]:.1f}',
+        f'render;dur={timings["render"]:.1f}',
+        f'total;dur={timings["total"]:.1f}',
+    ])
+
+
+class RequestMetricsMiddleware:
+    """
+    Record query count, DB, view, render and total time for each request.
+
+    Put it first in ``MIDDLEWARE`` so ``total`` covers the rest of the stack.
+    Turned off (and removed from the stack) by ``REQUEST_METRICS['ENABLED']``.
+    Streaming responses are measured until the response starts, not until
+    the body has been sent.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.config = get_config()
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Django would run a sync hook in a thread for async requests.
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        record = RequestRecord()
+        token = _current.set(record)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, record)
+
+    async def __acall__(self, request):
+        record = RequestRecord()
+        token = _current.set(record)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, record)
+
+    def process_template_response(self, request, response):
+        # Called once the view has returned, right before the response is rendered.
+        record = _current.get()
+        if record is not None:
+            record.view_done = record.render_started = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: setattr(record, 'render_done', time.perf_counter()))
+        return response
+
+    async def aprocess_template_response(self, request, response):
+        return RequestMetricsMiddleware.process_template_response(self, request, response)
+
+    def finish(self, request, response, record):
+        timings = record.timings(time.perf_counter())
+        match = request.resolver_match
+        route = match.route if match else '<unmatched>'
+        request_metrics.add(route, request.method, response.status_code, timings, record.queries)
+
+        if self.config['SERVER_TIMING']:
+            response['Server-Timing'] = server_timing(timings, record.queries)
+        if self.config['LOG'] and logger.isEnabledFor(logging.INFO):
+            logger.info(
+                'method=%s route=%s status=%s queries=%d db_ms=%.1f view_ms=%.1f render_ms=%.1f total_ms=%.1f',
+                request.method, route, response.status_code, record.queries,
+                timings['db'], timings['view'], timings['render'], timings['total'],
+                extra={'metrics': {'route': route, 'status': response.status_code,
+                                   'queries': record.queries, **timings}},
+            )
+        return response
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 19:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['publication_date', 'id'], name='book_pubdate_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title', 'id'], name='book_title_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('available_copies__gt', 0)), fields=['publication_date', 'id'], name='book_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(fields=['member', 'returned'], name='borrow_member_returned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(condition=models.Q(('returned', False)), fields=['due_date'], name='borrow_active_due_idx'),
+        ),
+    ]
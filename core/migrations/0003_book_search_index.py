@@ -0,0 +1,26 @@
+from django.db import migrations
+
+from core import search
+
+
+def create_search_index(apps, schema_editor):
+    search.create_index(schema_editor)
+    backend = search.get_backend(schema_editor.connection)
+    if backend is not None:
+        with schema_editor.connection.cursor() as cursor:
+            backend.index(cursor, '1 = 1', [])
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
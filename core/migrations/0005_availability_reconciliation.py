@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityReconciliation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('incremental', models.BooleanField(default=False)),
+                ('applied', models.BooleanField(default=True)),
+                ('drifted', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'get_latest_by': 'started_at',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 20:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='profile_thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
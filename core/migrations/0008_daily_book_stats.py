@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 20:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_user_profile_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBookStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('borrows', models.PositiveIntegerField(default=0)),
+                ('returns', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.book')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='daily_book_stats_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('book', 'day'), name='daily_book_stats_book_day_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_holds'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='borrow',
+            name='borrow_member_returned_idx',
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(condition=models.Q(('returned', False)), fields=['member'], name='borrow_member_active_idx'),
+        ),
+    ]
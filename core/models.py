@@ -10,6 +10,10 @@ class User(AbstractUser):
 
     role = models.CharField(max_length=20, choices=Role.choices)
     profile_picture = models.ImageField(upload_to='profile_pictures/', null=True, blank=True)
+    # {"<size>": {"<format>": "<storage name>"}}, filled in by core.thumbnails
+    profile_thumbnails = models.JSONField(default=dict, blank=True)
+    # Embedded in access tokens; bumping it revokes every token issued before.
+    token_version = models.PositiveIntegerField(default=0)
 
     def is_member(self):
         return self.role == self.Role.MEMBER
@@ -17,6 +21,9 @@ class User(AbstractUser):
     def is_worker(self):
         return self.role == self.Role.WORKER
 
+    def revoke_tokens(self):
+        self.token_version += 1
+
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
 
@@ -27,6 +34,7 @@ class Author(models.Model):
     biography = models.TextField(blank=True, null=True)
     date_of_birth = models.DateField(blank=True, null=True)
     date_of_death = models.DateField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -34,6 +42,7 @@ class Author(models.Model):
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -42,6 +51,7 @@ class Category(models.Model):
 class SubCategory(models.Model):
     name = models.CharField(max_length=100)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="subcategories")
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} ({self.category.name})"
@@ -57,6 +67,17 @@ class Book(models.Model):
     subcategory = models.ForeignKey(SubCategory, on_delete=models.SET_NULL, null=True, blank=True)
     total_copies = models.PositiveIntegerField(default=1)
     available_copies = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination orderings of /api/books/
+            models.Index(fields=['publication_date', 'id'], name='book_pubdate_id_idx'),
+            models.Index(fields=['title', 'id'], name='book_title_id_idx'),
+            # Books with copies available (`?available=true`)
+            models.Index(fields=['publication_date', 'id'], name='book_available_idx',
+                         condition=models.Q(available_copies__gt=0)),
+        ]
 
     def __str__(self):
         return self.title
@@ -70,5 +91,104 @@ class Borrow(models.Model):
     return_date = models.DateField(null=True, blank=True)
     returned = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # A member's active borrows. Django writes returned=False as ``NOT returned``,
+            # which SQLite only matches against a partial index, not a (member, returned) one.
+            models.Index(fields=['member'], name='borrow_member_active_idx',
+                         condition=models.Q(returned=False)),
+            # Active borrows ordered by due date (overdue checks)
+            models.Index(fields=['due_date'], name='borrow_active_due_idx',
+                         condition=models.Q(returned=False)),
+        ]
+
+    def __str__(self):
+        return f"{self.member.username} borrowed {self.book.title}"
+
+
+class Hold(models.Model):
+    """
+    A member's place in the queue for a book with no copies available.
+
+    Returned copies go to the oldest waiting hold (``core.services``), which
+    becomes ready: the copy is set aside for that member until
+    ``expires_at``, then passed on to the next in line.
+    """
+    class Status(models.TextChoices):
+        WAITING = 'waiting', 'Waiting'
+        READY = 'ready', 'Ready for pickup'
+        FULFILLED = 'fulfilled', 'Fulfilled'
+        CANCELLED = 'cancelled', 'Cancelled'
+        EXPIRED = 'expired', 'Expired'
+
+    ACTIVE = [Status.WAITING, Status.READY]
+
+    member = models.ForeignKey(User, on_delete=models.CASCADE, related_name='holds',
+                               limit_choices_to={'role': User.Role.MEMBER})
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='holds')
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.WAITING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    ready_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['member', 'book'], name='hold_member_book_active_uniq',
+                                    condition=models.Q(status__in=['waiting', 'ready'])),
+        ]
+        indexes = [
+            # Each book's queue in FIFO order; its head is the first entry for the book
+            models.Index(fields=['book', 'id'], name='hold_queue_idx',
+                         condition=models.Q(status='waiting')),
+            # Ready holds past their pickup deadline
+            models.Index(fields=['expires_at'], name='hold_ready_expiry_idx',
+                         condition=models.Q(status='ready')),
+        ]
+
+    def queue_position(self):
+        if self.status != self.Status.WAITING:
+            return None
+        return Hold.objects.filter(book_id=self.book_id, status=self.Status.WAITING, id__lte=self.id).count()
+
+    def __str__(self):
+        return f"{self.member.username} holds {self.book.title} ({self.status})"
+
+
+class AvailabilityReconciliation(models.Model):
+    """
+    One run of ``manage.py reconcile_availability``; incremental runs re-check
+    only books touched since the last applied run started.
+    """
+    started_at = models.DateTimeField()
+    incremental = models.BooleanField(default=False)
+    applied = models.BooleanField(default=True)
+    drifted = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        get_latest_by = 'started_at'
+
+    def __str__(self):
+        return f"Reconciliation at {self.started_at:%Y-%m-%d %H:%M} ({self.drifted} drifted)"
+
+
+class DailyBookStats(models.Model):
+    """
+    Borrows and returns of one book on one day, kept by ``core.stats`` so the
+    dashboards never scan ``Borrow``.
+    """
+    day = models.DateField()
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='daily_stats')
+    borrows = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'day'], name='daily_book_stats_book_day_uniq'),
+        ]
+        indexes = [
+            # Time windows (top-N over the last days, timelines)
+            models.Index(fields=['day'], name='daily_book_stats_day_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.member.username} borrowed {self.book.title}"
\ No newline at end of file
+        return f"{self.book_id} on {self.day}: {self.borrows} borrowed, {self.returns} returned"
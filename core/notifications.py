@@ -0,0 +1,31 @@
+"""
+Member notifications.
+
+``hold_ready`` is sent with ``hold_ids`` once a transaction that set copies
+aside for holds has committed. ``core.signals`` emails each member whose
+hold is ready; other channels can connect their own receivers.
+"""
+import logging
+
+from django.core.mail import send_mail
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+hold_ready = Signal()
+
+
+def email_hold_ready(holds):
+    for hold in holds:
+        if not hold.member.email:
+            continue
+        sent = send_mail(
+            f'"{hold.book.title}" is ready for pickup',
+            f'A copy of "{hold.book.title}" is set aside for you until {hold.expires_at:%Y-%m-%d %H:%M %Z}. '
+            f'Borrow it before then or it goes to the next member in line.',
+            None,
+            [hold.member.email],
+            fail_silently=True,
+        )
+        if not sent:
+            logger.warning('Could not email %s about hold %s', hold.member.email, hold.pk)
@@ -0,0 +1,200 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class PaginationError(Exception):
+    pass
+
+
+def get_page_size(value, default, maximum):
+    if value in (None, ''):
+        return min(default, maximum)
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        raise PaginationError('page_size must be a positive integer.')
+    if page_size < 1:
+        raise PaginationError('page_size must be a positive integer.')
+    return min(page_size, maximum)
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination that seeks on a unique ``(key, id)`` sort order.
+
+    Each page is located with ``key > last_key OR (key = last_key AND id > last_id)``
+    instead of an OFFSET, so deep pages cost the same as the first one.
+    Cursors are opaque url-safe tokens carrying the ordering, the direction
+    and the boundary row's key.
+    """
+    ordering_fields = ()
+    default_ordering = None
+    page_size_setting = None
+    max_page_size_setting = None
+    default_page_size = 20
+    default_max_page_size = 100
+
+    NEXT = 'n'
+    PREVIOUS = 'p'
+
+    def __init__(self, query_params):
+        self.ordering = query_params.get('ordering') or self.default_ordering
+        self.field = self.ordering.lstrip('-')
+        if self.field not in self.ordering_fields:
+            raise PaginationError(
+                f"Invalid ordering. Choose one of: {', '.join(self.ordering_fields)} (prefix with '-' to reverse)."
+            )
+        self.descending = self.ordering.startswith('-')
+        self.page_size = get_page_size(query_params.get('page_size'),
+                                       getattr(settings, self.page_size_setting, self.default_page_size),
+                                       getattr(settings, self.max_page_size_setting, self.default_max_page_size))
+        self.cursor = self._decode_cursor(query_params.get('cursor'))
+
+        self.page = []
+        self.has_next = False
+        self.has_previous = False
+
+    @classmethod
+    def is_requested(cls, query_params):
+        return 'cursor' in query_params or 'page_size' in query_params
+
+    def _decode_cursor(self, token):
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            payload = json.loads(raw)
+            direction = payload['d']
+            key, pk = payload['k']
+            ordering = payload['o']
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise PaginationError('Invalid cursor.')
+
+        # Keys are encoded as strings (dates in ISO format).
+        if (direction not in (self.NEXT, self.PREVIOUS) or not isinstance(key, str) or
+                not isinstance(pk, int) or isinstance(pk, bool)):
+            raise PaginationError('Invalid cursor.')
+        if ordering != self.ordering:
+            raise PaginationError('Cursor does not match the requested ordering.')
+        return {'direction': direction, 'key': key, 'pk': pk}
+
+    def _encode_cursor(self, direction, obj):
+        payload = {
+            'o': self.ordering,
+            'd': direction,
+            'k': [getattr(obj, self.field), obj.pk],
+        }
+        raw = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def _page_queryset(self, queryset):
+        backwards = self.cursor is not None and self.cursor['direction'] == self.PREVIOUS
+        descending = self.descending != backwards
+
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{self.field}', f'{prefix}id')
+
+        if self.cursor is not None:
+            try:
+                key = queryset.model._meta.get_field(self.field).to_python(self.cursor['key'])
+            except (ValidationError, TypeError, ValueError):
+                raise PaginationError('Invalid cursor.')
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{lookup}': key}) |
+                Q(**{self.field: key, f'id__{lookup}': self.cursor['pk']})
+            )
+
+        # Fetch one extra row to find out whether another page follows.
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, rows):
+        backwards = self.cursor is not None and self.cursor['direction'] == self.PREVIOUS
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if backwards:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        self.page = rows
+        return rows
+
+    def paginate_queryset(self, queryset):
+        return self._set_page(list(self._page_queryset(queryset)))
+
+    async def apaginate_queryset(self, queryset):
+        return self._set_page([row async for row in self._page_queryset(queryset)])
+
+    def get_next_cursor(self):
+        if not self.page or not self.has_next:
+            return None
+        return self._encode_cursor(self.NEXT, self.page[-1])
+
+    def get_previous_cursor(self):
+        if not self.page or not self.has_previous:
+            return None
+        return self._encode_cursor(self.PREVIOUS, self.page[0])
+
+    def get_page_info(self):
+        return {
+            'next': self.get_next_cursor(),
+            'previous': self.get_previous_cursor(),
+            'page_size': self.page_size,
+        }
+
+    def get_paginated_data(self, data):
+        return {**self.get_page_info(), 'results': data}
+
+
+class BookKeysetPaginator(KeysetPaginator):
+    ordering_fields = ('publication_date', 'title')
+    default_ordering = 'publication_date'
+    page_size_setting = 'BOOK_LIST_PAGE_SIZE'
+    max_page_size_setting = 'BOOK_LIST_MAX_PAGE_SIZE'
+
+
+class BookSearchPaginator:
+    """
+    Page-number pagination over a bounded list of ranked book ids.
+
+    Search results are capped at ``BOOK_SEARCH_MAX_RESULTS`` ids, so slicing
+    that list stays cheap on every page.
+    """
+
+    def __init__(self, query_params):
+        self.page_size = get_page_size(query_params.get('page_size'),
+                                       settings.BOOK_LIST_PAGE_SIZE, settings.BOOK_LIST_MAX_PAGE_SIZE)
+        try:
+            self.page = int(query_params.get('page') or 1)
+        except ValueError:
+            raise PaginationError('page must be a positive integer.')
+        if self.page < 1:
+            raise PaginationError('page must be a positive integer.')
+        self.count = 0
+
+    def paginate_ids(self, ids):
+        self.count = len(ids)
+        start = (self.page - 1) * self.page_size
+        return ids[start:start + self.page_size]
+
+    def get_page_info(self):
+        return {
+            'count': self.count,
+            'next': self.page + 1 if self.page * self.page_size < self.count else None,
+            'previous': self.page - 1 if self.page > 1 else None,
+            'page_size': self.page_size,
+        }
+
+    def get_paginated_data(self, data):
+        return {**self.get_page_info(), 'results': data}
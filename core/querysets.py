@@ -0,0 +1,110 @@
+from datetime import timedelta
+
+from django.db.models import (BooleanField, Case, Count, DateField, DurationField, ExpressionWrapper, F,
+                              IntegerField, OuterRef, Q, Subquery, Value, When)
+from django.utils import timezone
+
+from .models import (Book, Borrow, Hold)
+from .serializers import BookSerializer, BorrowSerializer
+
+
+def narrow(model, columns):
+    """
+    ``model`` rows loading only ``columns``, joining just the relations they
+    traverse (``author__last_name`` joins ``author``).
+    """
+    relations = {column.rsplit('__', 1)[0] for column in columns if '__' in column}
+    # A relation followed with select_related() can't be deferred itself.
+    columns = {'id', *columns, *(relation.split('__')[0] for relation in relations)}
+    queryset = model.objects.only(*columns)
+    # select_related() without arguments would follow every relation.
+    return queryset.select_related(*relations) if relations else queryset
+
+
+def book_queryset(fields=None, extra=()):
+    """
+    Books with every relation ``BookSerializer`` renders joined in.
+
+    ``SubCategory.__str__`` reads its parent category, so that hop is
+    joined as well; listing N books stays a single query. With ``fields``,
+    only the columns those serializer fields read (plus ``extra``) are loaded.
+    """
+    if fields is not None:
+        return narrow(Book, BookSerializer.columns_for(fields) | set(extra))
+    return Book.objects.select_related('author', 'category', 'subcategory__category')
+
+
+def borrow_queryset(fields=None):
+    """
+    Borrow records with the book ``BorrowSerializer`` renders joined in,
+    narrowed to the columns ``fields`` read when given.
+    """
+    if fields is not None:
+        return narrow(Borrow, BorrowSerializer.columns_for(fields))
+    return Borrow.objects.select_related('book')
+
+
+def overdue_q(today):
+    # Matches the partial index on due_date for active borrows.
+    return Q(returned=False, due_date__lt=today)
+
+
+def with_overdue(borrows, today=None):
+    """
+    Annotate ``is_overdue`` and ``days_overdue`` (a duration, zero unless
+    overdue) in SQL, against one ``today`` captured by the caller.
+    """
+    today = today or timezone.now().date()
+    overdue = overdue_q(today)
+    return borrows.annotate(
+        is_overdue=ExpressionWrapper(overdue, output_field=BooleanField()),
+        days_overdue=Case(
+            When(overdue, then=ExpressionWrapper(Value(today, output_field=DateField()) - F('due_date'),
+                                                 output_field=DurationField())),
+            default=Value(timedelta(0), output_field=DurationField()),
+        ),
+    )
+
+
+def filter_borrows(borrows, query_params, today=None):
+    """
+    Apply the ``returned``, ``active``, ``member`` and ``overdue`` filters of
+    the worker borrow endpoints.
+    """
+    # Filter by returned status
+    returned = query_params.get('returned')
+    if returned == 'true':
+        borrows = borrows.filter(returned=True)
+    elif returned == 'false':
+        borrows = borrows.filter(returned=False)
+
+    # Filter by active status (alias for returned=false)
+    only_active = query_params.get('active')
+    if only_active == 'true':
+        borrows = borrows.filter(returned=False)
+
+    # Filter by member username
+    member_username = query_params.get('member')
+    if member_username:
+        borrows = borrows.filter(member__username=member_username)
+
+    # Filter by overdue
+    overdue = query_params.get('overdue')
+    if overdue == 'true':
+        borrows = borrows.filter(overdue_q(today or timezone.now().date()))
+
+    return borrows
+
+
+def with_queue_position(holds):
+    """
+    Annotate ``position`` (1 for the head of the queue, ``None`` unless
+    waiting), counted along the book's ``hold_queue_idx`` in SQL.
+    """
+    ahead = (Hold.objects.filter(book=OuterRef('book'), status=Hold.Status.WAITING, id__lte=OuterRef('id'))
+             .order_by().values('book').annotate(count=Count('id')).values('count'))
+    return holds.annotate(position=Case(
+        When(status=Hold.Status.WAITING, then=Subquery(ahead)),
+        default=None,
+        output_field=IntegerField(),
+    ))
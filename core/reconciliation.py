@@ -0,0 +1,87 @@
+from django.db import transaction
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .cache import catalog_cache
+from .events import publish_availability
+from .models import (AvailabilityReconciliation, Book, Borrow, Hold)
+
+
+def expected_availability(books):
+    """
+    ``books`` annotated with ``expected_copies``: ``total_copies`` minus the
+    active borrows and the copies set aside for ready holds, computed in the
+    database in one grouped query.
+    """
+    return books.annotate(
+        active_borrows=Count('borrow', filter=Q(borrow__returned=False), distinct=True),
+        ready_holds=Count('holds', filter=Q(holds__status=Hold.Status.READY), distinct=True),
+    ).annotate(
+        expected_copies=Greatest(F('total_copies') - F('active_borrows') - F('ready_holds'), Value(0)),
+    )
+
+
+def touched_since(since):
+    """
+    Books edited, borrowed or returned at or after ``since``.
+
+    Borrow dates are days, so the whole day of ``since`` is re-checked.
+    """
+    day = since.date()
+    borrowed = Borrow.objects.filter(Q(borrow_date__gte=day) | Q(return_date__gte=day)).values('book_id')
+    return Book.objects.filter(Q(updated_at__gte=since) | Q(id__in=borrowed))
+
+
+def find_drift(books=None):
+    """
+    ``(id, title, available_copies, expected_copies)`` for every book in
+    ``books`` (default: all) whose counter disagrees with its borrows.
+    """
+    books = Book.objects.all() if books is None else books
+    return list(
+        expected_availability(books)
+        .exclude(available_copies=F('expected_copies'))
+        .order_by('id')
+        .values_list('id', 'title', 'available_copies', 'expected_copies')
+    )
+
+
+def reconcile_availability(incremental=False, apply=True, batch_size=1000):
+    """
+    Recompute ``Book.available_copies`` from the borrow table and fix drift.
+
+    With ``incremental`` only books touched since the last applied run are
+    checked (all books when there is none). Drifted rows are locked and
+    recomputed before ``bulk_update`` writes them, so a borrow racing the
+    scan is never overwritten. Returns the run and its drift rows.
+    """
+    started_at = timezone.now()
+    since = None
+    if incremental:
+        last = AvailabilityReconciliation.objects.filter(applied=True).order_by('-started_at').first()
+        since = last.started_at if last else None
+    drift = find_drift(touched_since(since) if since else None)
+
+    if apply and drift:
+        with transaction.atomic():
+            ids = [row[0] for row in drift]
+            locked = list(Book.objects.select_for_update().filter(id__in=ids).values_list('id', flat=True))
+            expected = dict(expected_availability(Book.objects.filter(id__in=locked))
+                            .values_list('id', 'expected_copies'))
+            books = Book.objects.filter(id__in=locked).only('id', 'available_copies', 'updated_at')
+            # Stamped after the lock, so it is later than any edit made during the scan.
+            now = timezone.now()
+            changed = []
+            for book in books:
+                if book.available_copies != expected[book.id]:
+                    book.available_copies = expected[book.id]
+                    book.updated_at = now
+                    changed.append(book)
+            Book.objects.bulk_update(changed, ['available_copies', 'updated_at'], batch_size=batch_size)
+            catalog_cache.availability_changed([book.id for book in changed])
+            publish_availability([book.id for book in changed])
+
+    run = AvailabilityReconciliation.objects.create(started_at=started_at, incremental=since is not None,
+                                                    applied=apply, drifted=len(drift))
+    return run, drift
@@ -0,0 +1,117 @@
+"""
+Read-replica routing.
+
+Views that only read (``ReplicaReadsMixin``) send the queries of ``GET``
+requests to one of ``READ_REPLICAS['ALIASES']``, picked per request, through
+``ReplicaRouter``. Writes, authentication and every other view use
+``default``. After a borrow or return the member's own reads stay on
+``default`` for ``STICKY_SECONDS`` (``mark_written``), so they see their
+change however far the replicas lag. The marker lives in the cache
+configured by ``READ_REPLICAS['CACHE_ALIAS']``, shared by every worker.
+
+Reads that fill the catalog cache always use ``default`` (``primary_reads``):
+an entry built from a lagging replica would be stored under the new
+versions and outlive the lag. While the cache is enabled, catalog views
+therefore only send their uncached reads (sparse fieldsets) to replicas.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+DEFAULTS = {
+    'ALIASES': [],
+    'STICKY_SECONDS': 10,
+    'CACHE_ALIAS': 'default',
+}
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'READ_REPLICAS', {})}
+
+
+def _sticky_key(user):
+    return f'replica-sticky:{user.pk}'
+
+
+def mark_written(user):
+    config = get_config()
+    if config['ALIASES'] and config['STICKY_SECONDS']:
+        caches[config['CACHE_ALIAS']].set(_sticky_key(user), True, config['STICKY_SECONDS'])
+
+
+def choose_read_alias(user):
+    """
+    A replica for ``user``'s reads, or ``default`` while they are sticky.
+    """
+    config = get_config()
+    if not config['ALIASES']:
+        return DEFAULT_DB_ALIAS
+    if user.is_authenticated and caches[config['CACHE_ALIAS']].get(_sticky_key(user)):
+        return DEFAULT_DB_ALIAS
+    return random.choice(config['ALIASES'])
+
+
+@contextmanager
+def primary_reads():
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        # An instance read from a replica must still be saved to the primary.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        databases = {DEFAULT_DB_ALIAS, *get_config()['ALIASES']}
+        return obj1._state.db in databases and obj2._state.db in databases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema by replication.
+        return False if db in get_config()['ALIASES'] else None
+
+
+class ReplicaReadsMixin:
+    """
+    Route the reads of safe requests to a replica once the user is known.
+
+    ``self.read_alias`` names the database chosen, for querysets evaluated
+    after the view returns (streaming responses).
+    """
+    read_alias = DEFAULT_DB_ALIAS
+
+    def route_reads(self, request):
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            self.read_alias = choose_read_alias(request.user)
+            if self.read_alias != DEFAULT_DB_ALIAS:
+                self._read_alias_token = _read_alias.set(self.read_alias)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.route_reads(request)
+
+    async def initial_async(self, request, *args, **kwargs):
+        await super().initial_async(request, *args, **kwargs)
+        self.route_reads(request)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_read_alias_token', None)
+        if token is not None:
+            # Sync views share their thread's context with the next request.
+            _read_alias.reset(token)
+            self._read_alias_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,34 @@
+"""
+Aggregated reports for workers.
+
+Grouping and counting happen in the database; only one row per member or
+book comes back, however many borrows are overdue.
+"""
+from django.db.models import Count, F, Min
+
+from .models import Borrow
+from .querysets import overdue_q
+
+OVERDUE_REPORT_LIMIT = 20
+OVERDUE_REPORT_MAX_LIMIT = 500
+
+
+def overdue_report(today, limit):
+    """
+    Overdue borrows as of ``today``: the total, and the ``limit`` members and
+    books with the most, each with its oldest due date and days overdue.
+    """
+    overdue = Borrow.objects.filter(overdue_q(today))
+
+    def groups(key, **names):
+        rows = (overdue.values(key, **names)
+                .annotate(overdue=Count('id'), oldest_due_date=Min('due_date'))
+                .order_by('-overdue', key)[:limit])
+        return [{**row, 'max_days_overdue': (today - row['oldest_due_date']).days} for row in rows]
+
+    return {
+        'as_of': today,
+        'total': overdue.count(),
+        'members': groups('member_id', username=F('member__username')),
+        'books': groups('book_id', title=F('book__title')),
+    }
@@ -0,0 +1,189 @@
+"""
+Full-text search index for the book catalog.
+
+SQLite keeps the index in an FTS5 virtual table (``core_book_fts``) whose
+rowid is the book id. PostgreSQL keeps a weighted ``tsvector`` per book in
+``core_book_search`` with a GIN index. Other databases fall back to
+``icontains`` filters. Both tables are created by migration
+``0003_book_search_index`` and kept up to date by the receivers in
+``core.signals``. Bulk writes that skip signals should call
+``rebuild_index()`` (``manage.py rebuild_search_index``) afterwards.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+SQLITE_CREATE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS core_book_fts USING fts5(
+        title, description, isbn, author,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+SQLITE_DROP = "DROP TABLE IF EXISTS core_book_fts"
+
+POSTGRES_CREATE = """
+    CREATE TABLE IF NOT EXISTS core_book_search (
+        book_id bigint PRIMARY KEY REFERENCES core_book (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+        document tsvector NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS core_book_search_document_idx ON core_book_search USING GIN (document);
+"""
+POSTGRES_DROP = "DROP TABLE IF EXISTS core_book_search"
+
+
+class SQLiteBackend:
+    delete_sql = "DELETE FROM core_book_fts WHERE rowid IN (SELECT b.id FROM core_book b WHERE {where})"
+    index_sql = """
+        INSERT INTO core_book_fts (rowid, title, description, isbn, author)
+        SELECT b.id, b.title, COALESCE(b.description, ''), b.isbn, a.first_name || ' ' || a.last_name
+        FROM core_book b JOIN core_author a ON a.id = b.author_id
+        WHERE {where}
+    """
+    # bm25 column weights: title, description, isbn, author
+    search_sql = """
+        SELECT rowid FROM core_book_fts WHERE core_book_fts MATCH %s
+        ORDER BY bm25(core_book_fts, 10.0, 1.0, 10.0, 5.0), rowid
+        LIMIT %s
+    """
+
+    def index(self, cursor, where, params):
+        cursor.execute(self.delete_sql.format(where=where), params)
+        cursor.execute(self.index_sql.format(where=where), params)
+
+    def remove(self, cursor, ids):
+        cursor.execute(f"DELETE FROM core_book_fts WHERE rowid IN ({', '.join(['%s'] * len(ids))})", ids)
+
+    def clear(self, cursor):
+        cursor.execute("DELETE FROM core_book_fts")
+
+    def match(self, tokens):
+        # Every token must match, as a prefix unless it is a single character (which
+        # would expand to a large share of the vocabulary). Quoting keeps FTS5 syntax
+        # out of user input.
+        return ' '.join(f'"{token}"*' if len(token) > 1 else f'"{token}"' for token in tokens)
+
+
+class PostgresBackend:
+    index_sql = """
+        INSERT INTO core_book_search (book_id, document)
+        SELECT b.id,
+               setweight(to_tsvector('english', b.title), 'A') ||
+               setweight(to_tsvector('simple', b.isbn), 'A') ||
+               setweight(to_tsvector('english', a.first_name || ' ' || a.last_name), 'B') ||
+               setweight(to_tsvector('english', COALESCE(b.description, '')), 'C')
+        FROM core_book b JOIN core_author a ON a.id = b.author_id
+        WHERE {where}
+        ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document
+    """
+    search_sql = """
+        SELECT book_id FROM core_book_search, to_tsquery('english', %s) query
+        WHERE document @@ query
+        ORDER BY ts_rank_cd(document, query) DESC, book_id
+        LIMIT %s
+    """
+
+    def index(self, cursor, where, params):
+        cursor.execute(self.index_sql.format(where=where), params)
+
+    def remove(self, cursor, ids):
+        cursor.execute("DELETE FROM core_book_search WHERE book_id = ANY(%s)", [list(ids)])
+
+    def clear(self, cursor):
+        cursor.execute("TRUNCATE core_book_search")
+
+    def match(self, tokens):
+        return ' & '.join(f'{token}:*' if len(token) > 1 else token for token in tokens)
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'postgresql': PostgresBackend,
+}
+
+
+def get_backend(conn=None):
+    backend = BACKENDS.get((conn or connection).vendor)
+    return backend() if backend else None
+
+
+def create_index(schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+    elif schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_CREATE)
+
+
+def drop_index(schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(SQLITE_DROP)
+    elif schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_DROP)
+
+
+def _index_where(where, params):
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.index(cursor, where, params)
+
+
+def index_books(book_ids):
+    book_ids = list(book_ids)
+    if book_ids:
+        _index_where(f"b.id IN ({', '.join(['%s'] * len(book_ids))})", book_ids)
+
+
+def index_author_books(author_id):
+    _index_where("b.author_id = %s", [author_id])
+
+
+def remove_books(book_ids):
+    backend = get_backend()
+    book_ids = list(book_ids)
+    if backend is None or not book_ids:
+        return
+    with connection.cursor() as cursor:
+        backend.remove(cursor, book_ids)
+
+
+def rebuild_index():
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.clear(cursor)
+        backend.index(cursor, '1 = 1', [])
+
+
+def search_book_ids(query, limit=None):
+    """
+    Ids of the books matching ``query``, best match first.
+
+    Every match is scored and the best ``BOOK_SEARCH_MAX_RESULTS`` are
+    returned. Only that many are kept while sorting, but a query made of very
+    common words still scores each of its matches.
+    """
+    limit = limit or settings.BOOK_SEARCH_MAX_RESULTS
+    tokens = TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return []
+
+    backend = get_backend()
+    if backend is None:
+        from .models import Book
+
+        condition = Q()
+        for token in tokens:
+            condition &= (Q(title__icontains=token) | Q(description__icontains=token) |
+                          Q(isbn__icontains=token) | Q(author__last_name__icontains=token))
+        return list(Book.objects.filter(condition).order_by('title', 'id').values_list('id', flat=True)[:limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(backend.search_sql, [backend.match(tokens), limit])
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,138 @@
+import random
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .cache import (AUTHORS, AVAILABILITY, BOOKS, CATEGORIES, SUBCATEGORIES, catalog_cache)
+from .models import (User, Author, Book, Borrow, Category, SubCategory)
+from .search import rebuild_index
+from .services import LOAN_PERIOD
+from .stats import refresh_stats
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed_library(books=1000, borrows=10000, members=500, authors=None, categories=20,
+                 subcategories_per_category=5, active_ratio=0.03, history_days=3 * 365,
+                 batch_size=5000, seed=None, log=None):
+    """
+    Fill the database with a synthetic library and its borrow history.
+
+    Rows are written with ``bulk_create`` in batches of ``batch_size`` so a
+    million borrows can be seeded without holding them in memory. Roughly
+    ``active_ratio`` of the borrows stay open, and ``available_copies`` is
+    set to match them. Returns a dict with the number of rows created.
+    """
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    authors = authors or max(1, books // 10)
+    today = date.today()
+    # Continue numbering after any earlier run so unique columns never clash:
+    # an earlier run's books have ids from its own ``run`` up to below this one.
+    run = (Book.objects.aggregate(n=Max('id'))['n'] or 0) + 1
+
+    with transaction.atomic():
+        author_objs = Author.objects.bulk_create(
+            [Author(first_name=f'Author{run}-{i}', last_name=f'Surname{i % 997}',
+                    date_of_birth=date(1900, 1, 1) + timedelta(days=rng.randrange(36500)))
+             for i in range(authors)],
+            batch_size=batch_size
+        )
+        category_objs = Category.objects.bulk_create(
+            [Category(name=f'Category {run}-{i}') for i in range(categories)]
+        )
+        subcategory_objs = SubCategory.objects.bulk_create(
+            [SubCategory(name=f'Subcategory {i}-{j}', category=category)
+             for i, category in enumerate(category_objs) for j in range(subcategories_per_category)],
+            batch_size=batch_size
+        )
+        log(f'{len(author_objs)} authors, {len(category_objs)} categories, {len(subcategory_objs)} subcategories')
+
+        book_ids = []
+        copies, totals = {}, {}
+        for batch in _batches(range(books), batch_size):
+            rows = []
+            for i in batch:
+                subcategory = rng.choice(subcategory_objs)
+                total = rng.randint(1, 5)
+                rows.append(Book(
+                    title=f'Book {run}-{i} {rng.choice(("of", "and", "in", "beyond"))} {rng.randrange(10 ** 6)}',
+                    description='Lorem ipsum dolor sit amet. ' * rng.randint(1, 20),
+                    isbn=f'{run + i:013d}',
+                    publication_date=date(1950, 1, 1) + timedelta(days=rng.randrange(27000)),
+                    author=rng.choice(author_objs),
+                    category=subcategory.category,
+                    subcategory=subcategory,
+                    total_copies=total,
+                    available_copies=total,
+                ))
+            for book in Book.objects.bulk_create(rows):
+                book_ids.append(book.id)
+                copies[book.id] = totals[book.id] = book.total_copies
+        log(f'{len(book_ids)} books')
+
+        member_ids = []
+        for batch in _batches(range(members), batch_size):
+            rows = [User(username=f'seed-member-{run}-{i}', email=f'member{run}-{i}@example.com',
+                         password='!', role=User.Role.MEMBER) for i in batch]
+            member_ids += [user.id for user in User.objects.bulk_create(rows)]
+        log(f'{len(member_ids)} members')
+
+        first_borrow_id = (Borrow.objects.aggregate(n=Max('id'))['n'] or 0) + 1
+        created = 0
+        for batch in _batches(range(borrows), batch_size):
+            rows = []
+            for _ in batch:
+                book_id = rng.choice(book_ids)
+                active = copies[book_id] > 0 and rng.random() < active_ratio
+                if active:
+                    copies[book_id] -= 1
+                    due_date = today + timedelta(days=rng.randint(-30, LOAN_PERIOD.days))
+                else:
+                    due_date = today - timedelta(days=rng.randrange(history_days)) + LOAN_PERIOD
+                rows.append(Borrow(
+                    member_id=rng.choice(member_ids),
+                    book_id=book_id,
+                    due_date=due_date,
+                    returned=not active,
+                    return_date=None if active else min(today, due_date - timedelta(days=rng.randint(-10, 13))),
+                ))
+            Borrow.objects.bulk_create(rows)
+            created += len(rows)
+            log(f'{created}/{borrows} borrows')
+
+        # borrow_date is auto_now_add, so backdate the history after inserting it.
+        Borrow.objects.filter(id__gte=first_borrow_id).update(borrow_date=F('due_date') - LOAN_PERIOD)
+
+        now = timezone.now()
+        changed = [Book(id=book_id, available_copies=available, updated_at=now)
+                   for book_id, available in copies.items() if available != totals[book_id]]
+        Book.objects.bulk_update(changed, ['available_copies', 'updated_at'], batch_size=batch_size)
+
+        # bulk_create skips the signals that keep the search index and catalog cache current,
+        # and the services that keep the borrow statistics.
+        rebuild_index()
+        catalog_cache.bump([BOOKS, AUTHORS, CATEGORIES, SUBCATEGORIES, AVAILABILITY])
+        log('search index rebuilt')
+        refresh_stats(batch_size=batch_size)
+        log('borrow statistics rebuilt')
+
+    return {
+        'authors': len(author_objs),
+        'categories': len(category_objs),
+        'subcategories': len(subcategory_objs),
+        'books': len(book_ids),
+        'members': len(member_ids),
+        'borrows': created,
+    }
@@ -3,7 +3,8 @@ from django.contrib.auth.password_validation import validate_password
 
 from rest_framework import serializers
 
-from .models import (User, Borrow, Book, SubCategory, Author, Category)
+from .models import (User, Borrow, Book, Hold, SubCategory, Author, Category)
+from .thumbnails import thumbnail_worker
 
 
 class SignupSerializer(serializers.ModelSerializer):
@@ -32,16 +33,51 @@ class ProfileUpdateSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         password = validated_data.pop('password', None)
+        # Save only what this request changes, never a whole possibly stale row.
+        update_fields = list(validated_data)
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
 
         if password:
             instance.set_password(password)
-
-        instance.save()
+            instance.revoke_tokens()
+            update_fields += ['password', 'token_version']
+
+        # Thumbnails of the old picture are replaced in the background.
+        new_picture = 'profile_picture' in validated_data
+        if new_picture:
+            stale, instance.profile_thumbnails = instance.profile_thumbnails, {}
+            update_fields.append('profile_thumbnails')
+
+        instance.save(update_fields=update_fields)
+        if new_picture:
+            thumbnail_worker.schedule(instance, stale)
         return instance
 
 
+class SparseFieldsMixin:
+    """
+    Let the caller pick a subset of fields with ``fields=[...]``.
+
+    ``field_columns`` maps each serializer field to the model columns it
+    reads (default: the column of the same name), so the queryset can be
+    narrowed to match (``core.querysets.narrow``). ``compact_fields`` is the
+    ``?view=compact`` selection.
+    """
+    field_columns = {}
+    compact_fields = None
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def columns_for(cls, fields):
+        return {column for name in fields for column in cls.field_columns.get(name, [name])}
+
+
 class AuthorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Author
@@ -68,26 +104,68 @@ class AdminBookSerializer(serializers.ModelSerializer):
                   'author', 'category', 'subcategory', 'total_copies', 'available_copies']
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = serializers.StringRelatedField()
     category = serializers.StringRelatedField()
     subcategory = serializers.StringRelatedField()
 
+    field_columns = {
+        'author': ['author__first_name', 'author__last_name'],
+        'category': ['category__name'],
+        # SubCategory.__str__ includes its category's name.
+        'subcategory': ['subcategory__name', 'subcategory__category__name'],
+    }
+    compact_fields = ['id', 'title', 'publication_date', 'author', 'available_copies']
+
     class Meta:
         model = Book
         fields = ['id', 'title', 'description', 'isbn', 'publication_date',
                   'author', 'category', 'subcategory', 'total_copies', 'available_copies']
 
 
-class BorrowSerializer(serializers.ModelSerializer):
+class BorrowSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     book = serializers.StringRelatedField()
     is_overdue = serializers.SerializerMethodField()
+    days_overdue = serializers.SerializerMethodField()
+
+    field_columns = {
+        'book': ['book__title'],
+        # Annotated by core.querysets.with_overdue.
+        'is_overdue': [],
+        'days_overdue': [],
+    }
+    compact_fields = ['id', 'book', 'due_date', 'returned', 'is_overdue']
 
     class Meta:
         model = Borrow
         fields = ['id', 'book', 'borrow_date', 'due_date', 'return_date',
-                  'returned', 'is_overdue']
+                  'returned', 'is_overdue', 'days_overdue']
+
+    # Lists annotate both in SQL (core.querysets.with_overdue); a single
+    # borrow that was just created or returned is checked here.
 
     def get_is_overdue(self, obj):
+        if hasattr(obj, 'is_overdue'):
+            return obj.is_overdue
         return not obj.returned and obj.due_date < timezone.now().date()
 
+    def get_days_overdue(self, obj):
+        if hasattr(obj, 'days_overdue'):
+            return obj.days_overdue.days
+        return max((timezone.now().date() - obj.due_date).days, 0) if not obj.returned else 0
+
+
+class HoldSerializer(serializers.ModelSerializer):
+    book = serializers.StringRelatedField()
+    book_id = serializers.IntegerField(read_only=True)
+    position = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Hold
+        fields = ['id', 'book_id', 'book', 'status', 'position', 'created_at', 'ready_at', 'expires_at']
+
+    def get_position(self, obj):
+        # Lists annotate it (core.querysets.with_queue_position).
+        if hasattr(obj, 'position'):
+            return obj.position
+        return obj.queue_position()
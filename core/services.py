@@ -0,0 +1,374 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .cache import catalog_cache
+from .events import publish_availability
+from .models import (Book, Borrow, Hold)
+from .notifications import hold_ready
+from .stats import record_activity
+
+LOAN_PERIOD = timedelta(days=14)  # 2 weeks
+
+
+class InventoryError(Exception):
+    status_code = 400
+
+
+class BookNotFound(InventoryError):
+    status_code = 404
+
+    def __init__(self):
+        super().__init__('Book not found.')
+
+
+class NoCopiesAvailable(InventoryError):
+    def __init__(self):
+        super().__init__('No copies available.')
+
+
+class BorrowNotFound(InventoryError):
+    status_code = 404
+
+    def __init__(self):
+        super().__init__('Borrow record not found or already returned.')
+
+
+class CopiesAvailable(InventoryError):
+    def __init__(self):
+        super().__init__('A copy is available; borrow it instead.')
+
+
+class AlreadyOnHold(InventoryError):
+    def __init__(self):
+        super().__init__('You already have a hold on this book.')
+
+
+class HoldLimitReached(InventoryError):
+    def __init__(self):
+        super().__init__(f'At most {settings.HOLD_MAX_PER_MEMBER} active holds per member.')
+
+
+class HoldNotFound(InventoryError):
+    status_code = 404
+
+    def __init__(self):
+        super().__init__('Hold not found or no longer active.')
+
+
+# Largest value of a 64-bit primary key; bigger ones overflow in the database driver.
+MAX_ID = 2 ** 63 - 1
+
+
+def _as_id(value):
+    """
+    The ID in ``value``, an integer or a string of digits, or None for
+    anything else (floats are not truncated).
+    """
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 < value <= MAX_ID:
+        return None
+    return value
+
+
+def borrow_book(member, book_id):
+    """
+    Take one copy of a book for ``member`` and open a borrow record.
+
+    The copy is claimed with a conditional ``UPDATE ... SET available_copies =
+    available_copies - 1 WHERE available_copies > 0``, so concurrent borrowers
+    can never drive the counter below zero, and only that column (plus
+    ``updated_at``) is written.
+    """
+    book_id = _as_id(book_id)
+    if book_id is None:
+        raise BookNotFound()
+
+    with transaction.atomic():
+        # A copy set aside for this member's hold is already off the counter.
+        picked_up = Hold.objects.filter(member=member, book_id=book_id, status=Hold.Status.READY).update(
+            status=Hold.Status.FULFILLED
+        )
+        if not picked_up:
+            claimed = Book.objects.filter(id=book_id, available_copies__gt=0).update(
+                available_copies=F('available_copies') - 1,
+                updated_at=timezone.now()
+            )
+            if not claimed:
+                if Book.objects.filter(id=book_id).exists():
+                    raise NoCopiesAvailable()
+                raise BookNotFound()
+
+        today = timezone.now().date()
+        borrow = Borrow.objects.create(
+            member=member,
+            book_id=book_id,
+            due_date=today + LOAN_PERIOD
+        )
+        record_activity(today, borrowed={book_id: 1})
+        if not picked_up:
+            catalog_cache.availability_changed([book_id])
+            publish_availability([book_id])
+    return borrow
+
+
+def return_book(member, borrow_id):
+    """
+    Close an open borrow record of ``member`` and put its copy back.
+
+    Closing the record is itself a conditional update on ``returned=False``,
+    so a borrow returned twice at the same time only releases one copy. The
+    copy goes to the oldest waiting hold on the book, if any.
+    """
+    with transaction.atomic():
+        try:
+            closed = Borrow.objects.filter(id=borrow_id, member=member, returned=False).update(
+                returned=True,
+                return_date=timezone.now().date()
+            )
+        except (TypeError, ValueError):
+            raise BorrowNotFound()
+        if not closed:
+            raise BorrowNotFound()
+
+        borrow = Borrow.objects.get(id=borrow_id)
+        release_copies({borrow.book_id: 1}, timezone.now())
+        record_activity(borrow.return_date, returned={borrow.book_id: 1})
+    return borrow
+
+
+def borrow_books(member, book_ids):
+    """
+    Borrow several books for ``member`` in one transaction.
+
+    All requested books are locked and fetched in a single query, then the
+    new borrows are written with one ``bulk_create`` and the counters with
+    one ``bulk_update``, so the cost does not grow with the batch size.
+    Returns ``(book_id, result)`` pairs in request order, where ``result`` is
+    the new ``Borrow`` or the ``InventoryError`` that item failed with.
+    """
+    ids = [_as_id(book_id) for book_id in book_ids]
+    results = []
+
+    with transaction.atomic():
+        books = (Book.objects.select_for_update()
+                 .only('id', 'title', 'available_copies', 'updated_at')
+                 .in_bulk([book_id for book_id in ids if book_id is not None]))
+        ready = dict(Hold.objects.filter(member=member, book_id__in=books, status=Hold.Status.READY)
+                     .values_list('book_id', 'id'))
+        now = timezone.now()
+        due_date = now.date() + LOAN_PERIOD
+        claimed, picked_up, borrows = {}, [], []
+
+        for book_id in ids:
+            book = books.get(book_id)
+            if book is None:
+                results.append(BookNotFound())
+            elif book_id in ready:
+                picked_up.append(ready.pop(book_id))
+                borrow = Borrow(member=member, book=book, due_date=due_date)
+                borrows.append(borrow)
+                results.append(borrow)
+            elif book.available_copies < 1:
+                results.append(NoCopiesAvailable())
+            else:
+                book.available_copies -= 1
+                book.updated_at = now
+                claimed[book.id] = book
+                borrow = Borrow(member=member, book=book, due_date=due_date)
+                borrows.append(borrow)
+                results.append(borrow)
+
+        if borrows:
+            Borrow.objects.bulk_create(borrows)
+            Book.objects.bulk_update(claimed.values(), ['available_copies', 'updated_at'])
+            Hold.objects.filter(id__in=picked_up).update(status=Hold.Status.FULFILLED)
+            record_activity(now.date(), borrowed=Counter(borrow.book_id for borrow in borrows))
+            catalog_cache.availability_changed(claimed)
+            publish_availability(claimed)
+
+    return list(zip(book_ids, results))
+
+
+def return_books(member, borrow_ids):
+    """
+    Return several open borrows of ``member`` in one transaction.
+
+    The borrows are locked and fetched in one query, closed with one
+    ``UPDATE`` and their copies released with ``release_copies``, whatever
+    the batch size.  Returns ``(borrow_id, result)`` pairs in request order,
+    like ``borrow_books``.
+    """
+    ids = [_as_id(borrow_id) for borrow_id in borrow_ids]
+    results = []
+
+    with transaction.atomic():
+        open_borrows = (Borrow.objects.select_for_update()
+                        .filter(member=member, returned=False)
+                        .only('id', 'book_id')
+                        .in_bulk([borrow_id for borrow_id in ids if borrow_id is not None]))
+        closing, released = {}, Counter()
+
+        for borrow_id in ids:
+            borrow = open_borrows.get(borrow_id)
+            if borrow is None or borrow_id in closing:
+                results.append(BorrowNotFound())
+            else:
+                closing[borrow_id] = borrow
+                released[borrow.book_id] += 1
+                results.append(borrow)
+
+        if closing:
+            now = timezone.now()
+            today = now.date()
+            Borrow.objects.filter(id__in=closing, returned=False).update(returned=True, return_date=today)
+            release_copies(released, now)
+            record_activity(today, returned=released)
+            for borrow in closing.values():
+                borrow.returned = True
+                borrow.return_date = today
+
+    return list(zip(borrow_ids, results))
+
+
+def queue_heads(copies):
+    """
+    ``(hold_id, book_id)`` of the ``count`` oldest waiting holds of each book
+    in ``{book_id: count}``.
+
+    For one book the head of its queue is the first entry of the partial
+    ``hold_queue_idx``, so finding it costs the same however long the queue
+    is. Several books are ranked in one query with a window function.
+    """
+    waiting = Hold.objects.filter(status=Hold.Status.WAITING)
+    if len(copies) == 1:
+        [(book_id, count)] = copies.items()
+        return list(waiting.filter(book_id=book_id).order_by('id').values_list('id', 'book_id')[:count])
+    ranked = waiting.filter(book_id__in=copies).annotate(
+        rank=Window(RowNumber(), partition_by=F('book_id'), order_by=F('id').asc())
+    )
+    wanted = Case(*[When(book_id=book_id, then=Value(count)) for book_id, count in copies.items()],
+                  output_field=models.IntegerField())
+    return list(ranked.filter(rank__lte=wanted).order_by('id').values_list('id', 'book_id'))
+
+
+def assign_to_holds(copies, now):
+    """
+    Set aside ``{book_id: count}`` copies for the oldest waiting holds on each
+    book and return the ``Counter`` of copies nobody is waiting for.
+
+    The heads are claimed with one conditional ``UPDATE`` on their status;
+    if a hold was cancelled meanwhile, the next in line is looked up again.
+    The members are notified (``hold_ready``) once the transaction commits.
+    """
+    left, ready = Counter(copies), []
+    expires_at = now + timedelta(days=settings.HOLD_PICKUP_DAYS)
+    while left:
+        heads = queue_heads(left)
+        if not heads:
+            break
+        ids = [hold_id for hold_id, _ in heads]
+        claimed = Hold.objects.filter(id__in=ids, status=Hold.Status.WAITING).update(
+            status=Hold.Status.READY, ready_at=now, expires_at=expires_at
+        )
+        raced = claimed < len(heads)
+        if raced:
+            heads = list(Hold.objects.filter(id__in=ids, status=Hold.Status.READY, ready_at=now)
+                         .values_list('id', 'book_id'))
+        for hold_id, book_id in heads:
+            ready.append(hold_id)
+            left[book_id] -= 1
+        left = +left
+        if not raced:
+            # Books still in ``left`` have no one else waiting.
+            break
+    if ready:
+        transaction.on_commit(lambda: hold_ready.send(sender=Hold, hold_ids=ready))
+    return left
+
+
+def release_copies(copies, now):
+    """
+    Hand ``{book_id: count}`` copies back: to waiting holds first, the rest
+    onto ``available_copies`` with one relative ``UPDATE``.
+    """
+    left = assign_to_holds(copies, now)
+    if left:
+        Book.objects.filter(id__in=left).update(
+            available_copies=F('available_copies') + Case(
+                *[When(id=book_id, then=Value(count)) for book_id, count in left.items()],
+                default=Value(0),
+                output_field=models.PositiveIntegerField()
+            ),
+            updated_at=now
+        )
+        catalog_cache.availability_changed(left)
+        publish_availability(left)
+
+
+def place_hold(member, book_id):
+    """
+    Queue ``member`` for a book that has no copy available.
+
+    The book row is locked first, so a return can't put a copy on the shelf
+    between the availability check and the insert.
+    """
+    book_id = _as_id(book_id)
+    if book_id is None:
+        raise BookNotFound()
+
+    with transaction.atomic():
+        available = (Book.objects.select_for_update().filter(id=book_id)
+                     .values_list('available_copies', flat=True).first())
+        if available is None:
+            raise BookNotFound()
+        if available > 0:
+            raise CopiesAvailable()
+        if Hold.objects.filter(member=member, status__in=Hold.ACTIVE).count() >= settings.HOLD_MAX_PER_MEMBER:
+            raise HoldLimitReached()
+        try:
+            with transaction.atomic():
+                return Hold.objects.create(member=member, book_id=book_id)
+        except IntegrityError:
+            raise AlreadyOnHold()
+
+
+def cancel_hold(member, hold_id):
+    """
+    Leave the queue. A copy already set aside passes to the next in line.
+    """
+    with transaction.atomic():
+        try:
+            hold = Hold.objects.filter(id=hold_id, member=member, status__in=Hold.ACTIVE).first()
+        except (TypeError, ValueError):
+            raise HoldNotFound()
+        if hold is None or not Hold.objects.filter(id=hold.id, status=hold.status).update(
+                status=Hold.Status.CANCELLED):
+            raise HoldNotFound()
+        if hold.status == Hold.Status.READY:
+            release_copies({hold.book_id: 1}, timezone.now())
+        hold.status = Hold.Status.CANCELLED
+    return hold
+
+
+def expire_holds(now=None):
+    """
+    Expire ready holds past their pickup deadline and pass their copies on.
+    Returns the number expired.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = dict(Hold.objects.select_for_update()
+                       .filter(status=Hold.Status.READY, expires_at__lte=now)
+                       .values_list('id', 'book_id'))
+        if not expired:
+            return 0
+        Hold.objects.filter(id__in=expired).update(status=Hold.Status.EXPIRED)
+        release_copies(Counter(expired.values()), now)
+    return len(expired)
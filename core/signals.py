@@ -0,0 +1,65 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import search
+from .authentication import user_cache
+from .cache import (AUTHORS, BOOKS, CATEGORIES, SUBCATEGORIES, catalog_cache)
+from .metrics import install_query_recorder
+from .models import (User, Author, Book, Category, Hold, SubCategory)
+from .notifications import email_hold_ready, hold_ready
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, raw=False, **kwargs):
+    catalog_cache.bump([f'book:{instance.pk}', BOOKS])
+    if not raw:
+        search.index_books([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    catalog_cache.bump([f'book:{instance.pk}', BOOKS])
+    search.remove_books([instance.pk])
+
+
+@receiver(post_save, sender=Author)
+def author_saved(sender, instance, created=False, raw=False, **kwargs):
+    catalog_cache.bump([f'author:{instance.pk}', AUTHORS])
+    # A new author has no books yet; a renamed one changes every book's author column.
+    if not raw and not created:
+        search.index_author_books(instance.pk)
+
+
+@receiver(post_delete, sender=Author)
+def author_deleted(sender, instance, **kwargs):
+    catalog_cache.bump([f'author:{instance.pk}', AUTHORS])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    catalog_cache.bump([f'category:{instance.pk}', CATEGORIES])
+
+
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+def subcategory_changed(sender, instance, **kwargs):
+    catalog_cache.bump([f'subcategory:{instance.pk}', SUBCATEGORIES])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    user_cache.discard(instance.pk)
+
+
+@receiver(hold_ready)
+def notify_hold_ready(sender, hold_ids, **kwargs):
+    email_hold_ready(Hold.objects.filter(id__in=hold_ids).select_related('member', 'book'))
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    # Count every query towards the request that runs it (core.metrics).
+    install_query_recorder(connection)
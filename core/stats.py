@@ -0,0 +1,162 @@
+"""
+Borrowing statistics served from rollup tables.
+
+``DailyBookStats`` holds one row per book and day with that day's borrows
+and returns. ``core.services`` adds to it in the same transaction as each
+borrow or return, with a single ``INSERT ... ON CONFLICT DO UPDATE`` per
+call, however many books it touches. ``manage.py refresh_borrow_stats``
+rebuilds it from ``Borrow`` (for instance from cron, with
+``BORROW_STATS['INCREMENTAL']`` off). Top-N and timeline queries read only
+the rows of the requested window, so their cost follows the number of
+books borrowed in it, not the size of ``Borrow``. Availability per
+subcategory is aggregated from ``Book`` and kept in the catalog cache.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .cache import AVAILABILITY, BOOKS, CATEGORIES, SUBCATEGORIES, catalog_cache
+from .models import Book, Borrow, DailyBookStats
+
+DEFAULTS = {
+    # Update the rollups on every borrow and return; turn off to rely on the command.
+    'INCREMENTAL': True,
+    'DEFAULT_DAYS': 30,
+    'MAX_DAYS': 366,
+}
+
+BUCKETS = {
+    'day': F('day'),
+    'week': TruncWeek('day'),
+    'month': TruncMonth('day'),
+}
+
+UPSERT_SQL = """
+    INSERT INTO {table} (day, book_id, borrows, returns) VALUES {values}
+    ON CONFLICT (book_id, day) DO UPDATE SET
+        borrows = {table}.borrows + excluded.borrows,
+        returns = {table}.returns + excluded.returns
+"""
+
+
+class StatsError(ValueError):
+    pass
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'BORROW_STATS', {})}
+
+
+def record_activity(day, borrowed=None, returned=None):
+    """
+    Add ``{book_id: count}`` borrows and returns on ``day`` to the rollups.
+    """
+    if not get_config()['INCREMENTAL']:
+        return
+    borrowed, returned = Counter(borrowed or {}), Counter(returned or {})
+    books = sorted(set(borrowed) | set(returned))
+    if not books:
+        return
+    table = connection.ops.quote_name(DailyBookStats._meta.db_table)
+    values = ', '.join(['(%s, %s, %s, %s)'] * len(books))
+    params = [value for book_id in books for value in (day, book_id, borrowed[book_id], returned[book_id])]
+    with connection.cursor() as cursor:
+        cursor.execute(UPSERT_SQL.format(table=table, values=values), params)
+
+
+@transaction.atomic
+def refresh_stats(since=None, batch_size=1_000):
+    """
+    Rebuild the rollup rows from ``since`` (every day when ``None``) from
+    ``Borrow``. Returns the number of rows written.
+    """
+    borrows, returns = Borrow.objects.all(), Borrow.objects.filter(return_date__isnull=False)
+    rows = DailyBookStats.objects.all()
+    if since is not None:
+        borrows, returns = borrows.filter(borrow_date__gte=since), returns.filter(return_date__gte=since)
+        rows = rows.filter(day__gte=since)
+
+    counts = {}
+    for book_id, day, count in borrows.values_list('book_id', 'borrow_date').annotate(count=Count('id')).order_by():
+        counts[book_id, day] = [count, 0]
+    for book_id, day, count in returns.values_list('book_id', 'return_date').annotate(count=Count('id')).order_by():
+        counts.setdefault((book_id, day), [0, 0])[1] = count
+
+    rows.delete()
+    DailyBookStats.objects.bulk_create(
+        [DailyBookStats(book_id=book_id, day=day, borrows=borrowed, returns=returned)
+         for (book_id, day), (borrowed, returned) in counts.items()],
+        batch_size=batch_size,
+    )
+    return len(counts)
+
+
+def get_days(value, today):
+    """
+    The first day of a window of ``value`` days ending ``today``.
+    """
+    config = get_config()
+    if value in (None, ''):
+        days = config['DEFAULT_DAYS']
+    else:
+        try:
+            days = int(value)
+        except (TypeError, ValueError):
+            raise StatsError('days must be a positive integer.')
+        if not 0 < days <= config['MAX_DAYS']:
+            raise StatsError(f"days must be between 1 and {config['MAX_DAYS']}.")
+    return today - timedelta(days=days - 1)
+
+
+def window(since):
+    return DailyBookStats.objects.filter(day__gte=since)
+
+
+def top_books(since, limit):
+    rows = (window(since).values('book_id', title=F('book__title'))
+            .annotate(borrows=Sum('borrows'), returns=Sum('returns'))
+            .order_by('-borrows', 'book_id')[:limit])
+    return list(rows)
+
+
+def top_categories(since, limit):
+    rows = (window(since).filter(book__category__isnull=False)
+            .values(category_id=F('book__category_id'), name=F('book__category__name'))
+            .annotate(borrows=Sum('borrows'), returns=Sum('returns'), books=Count('book_id', distinct=True))
+            .order_by('-borrows', 'category_id')[:limit])
+    return list(rows)
+
+
+def borrow_timeline(since, bucket, book_id=None, category_id=None):
+    if bucket not in BUCKETS:
+        raise StatsError(f"bucket must be one of: {', '.join(BUCKETS)}.")
+    rows = window(since)
+    if book_id is not None:
+        rows = rows.filter(book_id=book_id)
+    if category_id is not None:
+        rows = rows.filter(book__category_id=category_id)
+    rows = (rows.values(period=BUCKETS[bucket])
+            .annotate(borrows=Sum('borrows'), returns=Sum('returns'))
+            .order_by('period'))
+    return list(rows)
+
+
+def subcategory_availability():
+    """
+    Books and copies per subcategory, cached until a book, its availability
+    or a (sub)category changes.
+    """
+    def build():
+        rows = (Book.objects.filter(subcategory__isnull=False)
+                .values('subcategory_id', name=F('subcategory__name'), category_name=F('subcategory__category__name'))
+                .annotate(books=Count('id'), total_copies=Sum('total_copies'),
+                          available_copies=Sum('available_copies'))
+                .order_by('category_name', 'name'))
+        return list(rows)
+
+    return catalog_cache.get_or_set('stats:subcategory-availability',
+                                    [BOOKS, AVAILABILITY, CATEGORIES, SUBCATEGORIES], build)
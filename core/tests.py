@@ -1,3 +1,1366 @@
-from django.test import TestCase
+import base64
+import json
+import shutil
+import tempfile
+import threading
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import AsyncClient, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve
+from django.utils import timezone
+
+from PIL import Image
+from rest_framework.test import APIClient
+
+from library_project.database import database_config, replica_configs
+
+from .authentication import UserRefreshToken, user_cache
+from .benchmarking import APIBenchmark, BorrowConcurrencyBenchmark, SigninBenchmark, database_profile
+from .cache import catalog_cache
+from .checks import check_shared_caches
+from .conditional import book_validators
+from .events import get_backend
+from .importing import BookImporter
+from .metrics import RollingHistogram, request_metrics
+from .models import (User, Author, Book, Borrow, Category, DailyBookStats, Hold, SubCategory)
+from .querysets import book_queryset
+from .reconciliation import find_drift, reconcile_availability
+from .replicas import ReplicaRouter
+from .search import search_book_ids
+from .seeding import seed_library
+from .serializers import BookSerializer, BorrowSerializer
+from .services import (BookNotFound, BorrowNotFound, NoCopiesAvailable, borrow_book, borrow_books, expire_holds,
+                       place_hold, return_book,
+                       return_books)
+from .thumbnails import generate_thumbnails, thumbnail_worker
+
+
+class LibraryTestCase(TestCase):
+
+    def setUp(self):
+        catalog_cache.clear()
+        user_cache.clear()
+        self.client = APIClient()
+        self.member = User.objects.create(username='member', role=User.Role.MEMBER)
+        self.worker = User.objects.create(username='worker', role=User.Role.WORKER)
+        self.author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        self.category = Category.objects.create(name='Fiction')
+
+    def make_books(self, count, start=0, **kwargs):
+        kwargs.setdefault('author', self.author)
+        kwargs.setdefault('category', self.category)
+        return [
+            Book.objects.create(
+                title=f'Book {i:04d}',
+                isbn=f'{i:013d}',
+                publication_date=date(2000, 1, 1) + timedelta(days=i // 3),
+                **kwargs
+            )
+            for i in range(start, start + count)
+        ]
+
+
+class BookKeysetPaginationTests(LibraryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.member)
+        self.books = self.make_books(25)
+
+    def walk(self, params, key='next'):
+        ids, cursor = [], ''
+        while cursor is not None:
+            response = self.client.get('/api/books/', {**params, 'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            ids += [book['id'] for book in response.data['results']]
+            cursor = response.data[key]
+        return ids
+
+    def test_unpaginated_list_is_unchanged(self):
+        response = self.client.get('/api/books/')
+        self.assertEqual(len(response.data), 25)
+
+    def test_walks_every_book_once_in_stable_order(self):
+        expected = [b.id for b in sorted(self.books, key=lambda b: (b.publication_date, b.id))]
+        self.assertEqual(self.walk({'page_size': 4}), expected)
+
+        expected = [b.id for b in sorted(self.books, key=lambda b: (b.title, b.id), reverse=True)]
+        self.assertEqual(self.walk({'page_size': 7, 'ordering': '-title'}), expected)
+
+    def test_previous_cursor_returns_preceding_page(self):
+        first = self.client.get('/api/books/', {'page_size': 5})
+        second = self.client.get('/api/books/', {'page_size': 5, 'cursor': first.data['next']})
+        back = self.client.get('/api/books/', {'page_size': 5, 'cursor': second.data['previous']})
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(back.data['previous'])
+
+    def test_filters_apply_within_pages(self):
+        Book.objects.filter(id__in=[b.id for b in self.books[::2]]).update(available_copies=0)
+        ids = self.walk({'page_size': 3, 'available': 'true'})
+        self.assertEqual(sorted(ids), sorted(b.id for b in self.books[1::2]))
+
+    def test_page_size_is_capped(self):
+        with self.settings(BOOK_LIST_MAX_PAGE_SIZE=10):
+            response = self.client.get('/api/books/', {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_rejects_bad_cursor_and_mismatched_ordering(self):
+        self.assertEqual(self.client.get('/api/books/', {'cursor': 'garbage'}).status_code, 400)
+        cursor = self.client.get('/api/books/', {'page_size': 5}).data['next']
+        response = self.client.get('/api/books/', {'cursor': cursor, 'ordering': 'title'})
+        self.assertEqual(response.status_code, 400)
+
+        for ordering in ('publication_date', 'title'):
+            for key in ([None, 1], [[1], 1], [{'a': 1}, 1], [1, True], ['2000-01-01', True]):
+                raw = json.dumps({'o': ordering, 'd': 'n', 'k': key}).encode()
+                tampered = base64.urlsafe_b64encode(raw).decode().rstrip('=')
+                with self.subTest(ordering=ordering, key=key):
+                    response = self.client.get('/api/books/', {'cursor': tampered, 'ordering': ordering})
+                    self.assertEqual(response.status_code, 400)
+
+
+class QueryCountTests(LibraryTestCase):
+
+    def count_queries(self, path):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_book_list_query_count_is_constant(self):
+        self.client.force_authenticate(self.member)
+        subcategory = SubCategory.objects.create(name='Sci-Fi', category=self.category)
+        self.make_books(2, subcategory=subcategory)
+        few = self.count_queries('/api/books/')
+        self.make_books(20, start=2, subcategory=subcategory)
+        self.assertEqual(self.count_queries('/api/books/'), few)
+
+    def test_borrow_lists_query_count_is_constant(self):
+        books = self.make_books(12)
+        due = date.today() + timedelta(days=14)
+        Borrow.objects.bulk_create(Borrow(member=self.member, book=book, due_date=due) for book in books[:2])
+
+        self.client.force_authenticate(self.member)
+        member_few = self.count_queries('/api/my-borrows/')
+        self.client.force_authenticate(self.worker)
+        worker_few = self.count_queries('/api/all-borrows/')
+
+        Borrow.objects.bulk_create(Borrow(member=self.member, book=book, due_date=due) for book in books[2:])
+
+        self.assertEqual(self.count_queries('/api/all-borrows/'), worker_few)
+        self.client.force_authenticate(self.member)
+        self.assertEqual(self.count_queries('/api/my-borrows/'), member_few)
+
+
+class IndexUsageTests(LibraryTestCase):
+
+    def test_hot_filters_use_their_indexes(self):
+        self.make_books(3, total_copies=1, available_copies=1)
+        cases = [
+            (Book.objects.filter(available_copies__gt=0).order_by('publication_date', 'id')[:50],
+             'book_available_idx'),
+            (Book.objects.order_by('title', 'id')[:50], 'book_title_id_idx'),
+            (Borrow.objects.filter(member=self.member, returned=False), 'borrow_member_active_idx'),
+            (Borrow.objects.filter(returned=False, due_date__lt=date.today()).order_by('due_date')[:100],
+             'borrow_active_due_idx'),
+        ]
+        for queryset, index in cases:
+            with self.subTest(index):
+                self.assertIn(index, queryset.explain())
+
+
+class InventoryServiceTests(LibraryTestCase):
+
+    def test_borrow_and_return_move_the_counter(self):
+        book = self.make_books(1, total_copies=2, available_copies=2)[0]
+        borrow = borrow_book(self.member, book.id)
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 1)
+
+        return_book(self.member, borrow.id)
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 2)
+        with self.assertRaises(BorrowNotFound):
+            return_book(self.member, borrow.id)
+
+    def test_borrow_errors(self):
+        book = self.make_books(1, available_copies=0)[0]
+        with self.assertRaises(NoCopiesAvailable):
+            borrow_book(self.member, book.id)
+        with self.assertRaises(BookNotFound):
+            borrow_book(self.member, 'nope')
+        self.assertFalse(Borrow.objects.exists())
+
+    def test_borrow_only_writes_the_counter(self):
+        book = self.make_books(1)[0]
+        Book.objects.filter(id=book.id).update(title='Edited by a worker')
+        with CaptureQueriesContext(connection) as ctx:
+            borrow_book(self.member, book.id)
+        update = next(q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE'))
+        self.assertNotIn('"title"', update)
+        book.refresh_from_db()
+        self.assertEqual(book.title, 'Edited by a worker')
+
+    def test_views_use_the_service(self):
+        book = self.make_books(1)[0]
+        self.client.force_authenticate(self.member)
+        response = self.client.post('/api/borrow/', {'book': book.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.post('/api/borrow/', {'book': book.id}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/borrow/', {'book': 0}, format='json').status_code, 404)
+        self.assertEqual(self.client.post(f"/api/return/{response.data['id']}/").status_code, 200)
+        self.assertEqual(self.client.post(f"/api/return/{response.data['id']}/").status_code, 404)
+
+
+class AsyncViewTests(LibraryTestCase):
+
+    def test_read_views_dispatch_asynchronously_with_jwt(self):
+        for path in ('/api/books/', '/api/books/1/', '/api/my-borrows/'):
+            self.assertTrue(resolve(path).func.view_class.view_is_async)
+
+        book = self.make_books(1)[0]
+        borrow_book(self.member, book.id)
+        token = str(UserRefreshToken.for_user(self.member).access_token)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get(f'/api/books/{book.id}/').data['available_copies'], 0)
+        self.assertEqual([b['book'] for b in self.client.get('/api/my-borrows/').data], ['Book 0000'])
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer nope')
+        self.assertEqual(self.client.get('/api/books/').status_code, 401)
+
+
+class CachedJWTAuthenticationTests(LibraryTestCase):
+
+    def authenticate(self, user):
+        token = str(UserRefreshToken.for_user(user).access_token)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def get_profile(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/profile/')
+        return response, len(ctx.captured_queries)
+
+    def test_repeat_requests_skip_the_user_lookup(self):
+        self.authenticate(self.member)
+        response, queries = self.get_profile()
+        self.assertEqual((response.status_code, queries), (200, 1))
+        response, queries = self.get_profile()
+        self.assertEqual((response.data['username'], queries), ('member', 0))
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get('/api/books/').status_code, 200)
+        self.assertFalse(any('core_user' in query['sql'] for query in ctx.captured_queries))
+
+    def test_password_change_revokes_older_tokens(self):
+        self.authenticate(self.member)
+        self.get_profile()
+        self.client.put('/api/profile/update/', {'password': 'n3w-Passw0rd!'}, format='multipart')
+
+        response, _ = self.get_profile()
+        self.assertEqual((response.status_code, response.data['code']), (401, 'token_revoked'))
+        self.member.refresh_from_db()
+        self.authenticate(self.member)
+        self.assertEqual(self.get_profile()[0].status_code, 200)
+
+    def test_writes_never_save_a_stale_cached_user(self):
+        self.authenticate(self.member)
+        self.get_profile()
+        # Another worker revokes the member's tokens and deactivates them.
+        User.objects.filter(pk=self.member.pk).update(password='changed', token_version=1, is_active=False)
+
+        response = self.client.put('/api/profile/update/', {'first_name': 'Stale'}, format='multipart')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(User.objects.filter(pk=self.member.pk).values_list('password', 'token_version', 'is_active',
+                                                                            'first_name').get(),
+                         ('changed', 1, False, ''))
+
+    def test_role_change_rejects_tokens_with_the_old_role(self):
+        self.authenticate(self.member)
+        User.objects.filter(pk=self.member.pk).update(role=User.Role.WORKER)
+        self.assertEqual(self.get_profile()[0].status_code, 401)
+
+
+class FastPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    iterations = 1
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher',
+                                     'core.tests.FastPBKDF2PasswordHasher'],
+                   LOGIN_THROTTLE={'MAX_FAILURES': 3, 'MAX_IP_FAILURES': 10, 'WINDOW': 60})
+class SigninTests(LibraryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.member.password = make_password('s3cret-Pass', hasher='pbkdf2_sha256')
+        self.member.save()
+
+    def signin(self, password, username='member'):
+        return self.client.post('/api/member/signin/', {'username': username, 'password': password}, format='json')
+
+    def test_legacy_hash_is_upgraded_on_sign_in(self):
+        self.assertEqual(self.signin('s3cret-Pass').status_code, 200)
+        self.member.refresh_from_db()
+        self.assertTrue(self.member.password.startswith('md5$'))
+        self.assertEqual(self.signin('s3cret-Pass').status_code, 200)
+
+    def test_repeated_failures_are_refused_before_hashing(self):
+        for _ in range(3):
+            self.assertEqual(self.signin('wrong').status_code, 401)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.signin('s3cret-Pass')
+        self.assertEqual((response.status_code, response['Retry-After']), (429, '60'))
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        # Other accounts are unaffected, and a success clears the user's counter.
+        self.worker.password = make_password('w0rker-Pass')
+        self.worker.save()
+        self.assertEqual(self.client.post('/api/admin/signin/', {'username': 'worker', 'password': 'w0rker-Pass'},
+                                          format='json').status_code, 200)
+
+    def test_benchmark_reports_each_case(self):
+        results = SigninBenchmark(requests=2, hashers=['django.contrib.auth.hashers.MD5PasswordHasher'],
+                                  legacy='core.tests.FastPBKDF2PasswordHasher').run()
+        self.assertEqual([(row['label'], row['statuses']) for row in results], [
+            ('sign-in (md5)', {'200': 2}),
+            ('sign-in (pbkdf2_sha256 -> md5 rehash)', {'200': 2}),
+            ('sign-in refused by throttle', {'429': 2}),
+        ])
+
+
+class ProfileThumbnailTests(LibraryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = self.settings(MEDIA_ROOT=media_root,
+                                 PROFILE_THUMBNAILS={'SIZES': (32, 128), 'FORMATS': ('webp', 'jpeg'), 'SYNC': True})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # A real token, so each request loads the user instead of reusing self.member.
+        token = str(UserRefreshToken.for_user(self.member).access_token)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def upload(self, size=(600, 300), mode='RGBA'):
+        buffer = BytesIO()
+        Image.new(mode, size, 'red').save(buffer, 'PNG')
+        picture = SimpleUploadedFile('me.png', buffer.getvalue(), content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put('/api/profile/update/', {'profile_picture': picture}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        return self.client.get('/api/profile/').data
+
+    def test_upload_produces_resized_thumbnails(self):
+        profile = self.upload()
+        self.assertTrue(profile['profile_picture'].endswith('.png'))
+        self.assertEqual(set(profile['thumbnails']), {'32', '128'})
+
+        thumbnails = User.objects.get(pk=self.member.pk).profile_thumbnails
+        for size, fmt, expected in (('32', 'webp', (32, 16)), ('128', 'jpeg', (128, 64))):
+            self.assertTrue(profile['thumbnails'][size][fmt].startswith('http://testserver/media/'))
+            with default_storage.open(thumbnails[size][fmt]) as f:
+                self.assertEqual(Image.open(f).size, expected)
+
+    def test_new_picture_replaces_old_thumbnails(self):
+        self.upload()
+        old = User.objects.get(pk=self.member.pk).profile_thumbnails
+        self.upload(size=(100, 200), mode='L')
+        self.assertFalse(any(default_storage.exists(old[size][fmt]) for size in old for fmt in old[size]))
+
+        # A result for a picture that has since been replaced is thrown away.
+        user = User.objects.get(pk=self.member.pk)
+        current = user.profile_thumbnails
+        stale_name = 'profile_pictures/gone.png'
+        default_storage.save(stale_name, default_storage.open(user.profile_picture.name))
+        generate_thumbnails(user.pk, stale_name)
+        self.assertEqual(User.objects.get(pk=user.pk).profile_thumbnails, current)
+
+
+class BulkBorrowTests(LibraryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.member)
+
+    def bulk_borrow(self, book_ids):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/borrow/bulk/', {'books': book_ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'], len(ctx.captured_queries)
+
+    def test_reports_each_item_in_request_order(self):
+        book, empty = self.make_books(2)
+        Book.objects.filter(id=empty.id).update(available_copies=0)
+
+        results, _ = self.bulk_borrow([book.id, empty.id, 0, book.id])
+        self.assertEqual([r['book'] for r in results], [book.id, empty.id, 0, book.id])
+        self.assertEqual([r['borrowed'] for r in results], [True, False, False, False])
+        self.assertEqual(results[1]['error'], 'No copies available.')
+        self.assertEqual(results[2]['error'], 'Book not found.')
+        self.assertEqual(results[0]['borrow']['book'], book.title)
+
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 0)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        books = self.make_books(22)
+        _, few = self.bulk_borrow([b.id for b in books[:2]])
+        _, many = self.bulk_borrow([b.id for b in books[2:]])
+        self.assertEqual(few, many)
+        self.assertEqual(Borrow.objects.filter(returned=False).count(), 22)
+
+        ids = list(Borrow.objects.values_list('id', flat=True))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post('/api/return/bulk/', {'borrows': ids[:2]}, format='json')
+        few = len(ctx.captured_queries)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/return/bulk/', {'borrows': ids[2:] + ids[:1]}, format='json')
+        self.assertEqual(len(ctx.captured_queries), few)
+        self.assertEqual([r['returned'] for r in response.data['results']], [True] * 20 + [False])
+        self.assertEqual(sum(Book.objects.values_list('available_copies', flat=True)), 22)
+
+    def test_non_integer_ids_are_not_truncated(self):
+        other, book = self.make_books(2)
+        borrow = borrow_book(self.member, book.id)
+        bad = [borrow.id + 0.5, str(borrow.id + 0.5), True, [borrow.id], 2 ** 64]
+        response = self.client.post('/api/return/bulk/', {'borrows': bad}, format='json')
+        self.assertEqual([r['returned'] for r in response.data['results']], [False] * len(bad))
+        self.assertFalse(Borrow.objects.get(id=borrow.id).returned)
+        results, _ = self.bulk_borrow([other.id + 0.5, str(other.id)])
+        self.assertEqual([r['borrowed'] for r in results], [False, True])
+
+    def test_rejects_bad_payloads(self):
+        self.assertEqual(self.client.post('/api/borrow/bulk/', {'books': []}, format='json').status_code, 400)
+        with self.settings(BULK_BORROW_MAX_ITEMS=2):
+            response = self.client.post('/api/borrow/bulk/', {'books': [1, 2, 3]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(self.worker)
+        self.assertEqual(self.client.post('/api/borrow/bulk/', {'books': [1]}, format='json').status_code, 403)
+
+
+class HoldTests(LibraryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.book = self.make_books(1)[0]
+        self.borrow = borrow_book(self.member, self.book.id)
+        self.waiting = [User.objects.create(username=f'reader{i}', email=f'reader{i}@example.com',
+                                            role=User.Role.MEMBER) for i in range(3)]
+
+    def hold(self, member, book=None):
+        self.client.force_authenticate(member)
+        return self.client.post('/api/holds/', {'book': (book or self.book).id}, format='json')
+
+    def test_returned_copy_goes_to_the_head_of_the_queue(self):
+        for member in self.waiting:
+            self.assertEqual(self.hold(member).status_code, 201)
+        self.assertEqual(self.hold(self.waiting[0]).data['error'], 'You already have a hold on this book.')
+
+        self.client.force_authenticate(self.member)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(f'/api/return/{self.borrow.id}/').status_code, 200)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+        self.assertEqual([message.to for message in mail.outbox], [['reader0@example.com']])
+
+        self.client.force_authenticate(self.waiting[1])
+        self.assertEqual(self.client.post('/api/borrow/', {'book': self.book.id}, format='json').status_code, 400)
+        self.assertEqual([(h['status'], h['position']) for h in self.client.get('/api/holds/').data],
+                         [('waiting', 1)])
+
+        self.client.force_authenticate(self.waiting[0])
+        self.assertEqual(self.client.post('/api/borrow/', {'book': self.book.id}, format='json').status_code, 201)
+        self.assertEqual(Hold.objects.get(member=self.waiting[0]).status, Hold.Status.FULFILLED)
+        self.assertEqual(find_drift(), [])
+
+    def test_placing_a_hold_is_validated(self):
+        spare = self.make_books(1, start=1)[0]
+        self.assertEqual(self.hold(self.waiting[0], spare).status_code, 400)
+        self.client.force_authenticate(self.waiting[0])
+        self.assertEqual(self.client.post('/api/holds/', {'book': 999}, format='json').status_code, 404)
+        self.assertEqual(self.hold(self.worker).status_code, 403)
+        with self.settings(HOLD_MAX_PER_MEMBER=0):
+            self.assertEqual(self.hold(self.waiting[0]).status_code, 400)
+
+    def test_cancelled_and_expired_holds_pass_the_copy_on(self):
+        first, second = [place_hold(member, self.book.id) for member in self.waiting[:2]]
+        return_book(self.member, self.borrow.id)
+
+        self.client.force_authenticate(self.waiting[0])
+        self.assertEqual(self.client.post(f'/api/holds/{first.id}/cancel/').status_code, 200)
+        self.assertEqual(self.client.post(f'/api/holds/{first.id}/cancel/').status_code, 404)
+        second.refresh_from_db()
+        self.assertEqual(second.status, Hold.Status.READY)
+
+        self.assertEqual(expire_holds(second.expires_at + timedelta(seconds=1)), 1)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+        self.assertEqual(find_drift(), [])
+
+    def test_head_lookup_does_not_grow_with_the_queue(self):
+        other = self.make_books(1, start=1)[0]
+        other_borrow = borrow_book(self.member, other.id)
+        place_hold(self.waiting[0], self.book.id)
+        for member in self.waiting:
+            place_hold(member, other.id)
+
+        with CaptureQueriesContext(connection) as short_queue:
+            return_book(self.member, self.borrow.id)
+        with CaptureQueriesContext(connection) as long_queue:
+            return_book(self.member, other_borrow.id)
+        self.assertEqual(len(short_queue), len(long_queue))
+
+        # Bulk returns rank every book's queue in one query.
+        borrows = [borrow_book(self.waiting[0], book.id) for book in (self.book, other)]
+        place_hold(self.waiting[2], self.book.id)
+        return_books(self.waiting[0], [borrow.id for borrow in borrows])
+        ready = Hold.objects.filter(status=Hold.Status.READY).values_list('member__username', 'book_id')
+        self.assertEqual(sorted(ready), [('reader1', other.id), ('reader2', self.book.id)])
+        self.assertEqual(find_drift(), [])
+
+
+class BookBatchTests(LibraryTestCase):
+
+    def test_returns_books_in_request_order_with_not_found_markers(self):
+        books = self.make_books(3)
+        self.client.force_authenticate(self.member)
+        ids = f'{books[2].id},999,{books[0].id},{books[2].id}'
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/books/', {'ids': ids})
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual([r.get('title', r.get('error')) for r in response.data['results']],
+                         ['Book 0002', 'Book not found.', 'Book 0000'])
+
+        # Book 0000 is projected from the cache; only Book 0001 is read, narrowed to its title.
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/books/', {'ids': f'{books[0].id},{books[1].id}', 'fields': 'title'})
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(response.data['results'], [{'title': 'Book 0000'}, {'title': 'Book 0001'}])
+
+        for ids in ('1,x', '99999999999999999999999', '0', '-1'):
+            self.assertEqual(self.client.get('/api/books/', {'ids': ids}).status_code, 400)
+        with self.settings(BOOK_BATCH_MAX_IDS=2):
+            self.assertEqual(self.client.get('/api/books/', {'ids': '1,2,3'}).status_code, 400)
+
+
+class AvailabilityEventTests(LibraryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.book, self.other = self.make_books(2)
+        self.client.force_authenticate(self.member)
+
+    def poll(self, **params):
+        response = self.client.get('/api/books/availability/events/', {'books': self.book.id, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_long_poll_returns_changes_after_since(self):
+        start = self.poll()
+        self.assertEqual(start['snapshot'], [{'book': self.book.id, 'available_copies': 1}])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            borrow_book(self.member, self.other.id)
+            borrow_book(self.member, self.book.id)
+        changed = self.poll(since=start['last_event_id'])
+        self.assertEqual([(e['book'], e['available_copies']) for e in changed['events']], [(self.book.id, 0)])
+        self.assertEqual(changed['last_event_id'], start['last_event_id'] + 2)
+
+        with self.settings(AVAILABILITY_EVENTS={'LONG_POLL_TIMEOUT': 0.01}):
+            idle = self.poll(since=changed['last_event_id'])
+        self.assertEqual((idle['events'], idle['last_event_id']), ([], changed['last_event_id']))
+        # An id from another process or a restart starts over from a snapshot.
+        self.assertIn('snapshot', self.poll(since=10 ** 9))
+
+    def test_rejects_bad_parameters(self):
+        path = '/api/books/availability/events/'
+        self.assertEqual(self.client.get(path).status_code, 400)
+        self.assertEqual(self.client.get(path, {'books': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(path, {'books': self.book.id, 'transport': 'sse'}).status_code, 400)
+
+    async def test_streams_server_sent_events_under_asgi(self):
+        token = await sync_to_async(lambda: str(UserRefreshToken.for_user(self.member).access_token))()
+        response = await AsyncClient().get('/api/books/availability/events/',
+                                           {'books': f'{self.book.id},{self.other.id}'},
+                                           headers={'authorization': f'Bearer {token}'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 1000\n\n')
+        self.assertIn(b'event: snapshot', await anext(stream))
+
+        get_backend().publish([(self.other.id, 7), (self.book.id + self.other.id, 1)])
+        event = (await anext(stream)).decode()
+        self.assertIn('event: availability', event)
+        self.assertEqual(json.loads(event.split('data: ')[1])['available_copies'], 7)
+        await stream.aclose()
+
+
+class BorrowExportTests(LibraryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        books = self.make_books(3)
+        for book in books:
+            borrow_book(self.member, book.id)
+        Borrow.objects.filter(book=books[0]).update(due_date=date.today() - timedelta(days=1))
+        return_book(self.member, Borrow.objects.get(book=books[2]).id)
+        self.client.force_authenticate(self.worker)
+
+    def export(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/all-borrows/export/', params)
+            body = b''.join(response.streaming_content).decode()
+        return response, body, len(ctx.captured_queries)
+
+    def test_csv_export_streams_every_borrow(self):
+        response, body, queries = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = body.splitlines()
+        self.assertEqual(lines[0], 'id,member,book_id,book,borrow_date,due_date,return_date,returned,is_overdue')
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(queries, 1)
+
+    def test_ndjson_export_applies_the_list_filters(self):
+        response, body, _ = self.export(output='ndjson', overdue='true', member=self.member.username)
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([(r['book'], r['is_overdue']) for r in records], [('Book 0000', True)])
+        self.assertEqual(len(self.export(output='ndjson', returned='true')[1].splitlines()), 1)
+
+    def test_export_is_for_workers_only(self):
+        self.assertEqual(self.client.get('/api/all-borrows/export/', {'output': 'xml'}).status_code, 400)
+        self.client.force_authenticate(self.member)
+        self.assertEqual(self.client.get('/api/all-borrows/export/').status_code, 403)
+
+
+class OverdueTests(LibraryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create(username='other', role=User.Role.MEMBER)
+        books = self.make_books(3, total_copies=2, available_copies=2)
+        today = date.today()
+        Borrow.objects.bulk_create([
+            Borrow(member=self.member, book=books[0], due_date=today - timedelta(days=5)),
+            Borrow(member=self.member, book=books[1], due_date=today - timedelta(days=2)),
+            Borrow(member=self.other, book=books[0], due_date=today - timedelta(days=1)),
+            Borrow(member=self.other, book=books[2], due_date=today + timedelta(days=3)),
+            Borrow(member=self.other, book=books[2], due_date=today - timedelta(days=9), returned=True),
+        ])
+        self.client.force_authenticate(self.worker)
+
+    def test_lists_compute_overdue_in_sql(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/all-borrows/', {'member': 'member'}).data
+        self.assertIn('CASE WHEN', ctx.captured_queries[-1]['sql'])
+        self.assertEqual(sorted((b['is_overdue'], b['days_overdue']) for b in data), [(True, 2), (True, 5)])
+
+        self.client.force_authenticate(self.other)
+        data = self.client.get('/api/my-borrows/').data
+        self.assertEqual(sorted((b['is_overdue'], b['days_overdue']) for b in data),
+                         [(False, 0), (False, 0), (True, 1)])
+        self.assertEqual(len(self.client.get('/api/my-borrows/', {'overdue': 'true'}).data), 1)
+
+    def test_overdue_report_aggregates_per_member_and_book(self):
+        with CaptureQueriesContext(connection) as ctx:
+            report = self.client.get('/api/all-borrows/overdue/').data
+        self.assertEqual(len(ctx.captured_queries), 3)
+        self.assertEqual(report['total'], 3)
+        self.assertEqual([(m['username'], m['overdue'], m['max_days_overdue']) for m in report['members']],
+                         [('member', 2, 5), ('other', 1, 1)])
+        self.assertEqual([(b['title'], b['overdue']) for b in report['books']], [('Book 0000', 2), ('Book 0001', 1)])
+
+        self.assertEqual(len(self.client.get('/api/all-borrows/overdue/', {'limit': 1}).data['books']), 1)
+        self.assertEqual(self.client.get('/api/all-borrows/overdue/', {'limit': 'x'}).status_code, 400)
+        self.client.force_authenticate(self.member)
+        self.assertEqual(self.client.get('/api/all-borrows/overdue/').status_code, 403)
+
+
+class BorrowStatsTests(LibraryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        poetry = Category.objects.create(name='Poetry')
+        self.subcategory = SubCategory.objects.create(name='Sonnets', category=poetry)
+        self.books = self.make_books(2, total_copies=3, available_copies=3)
+        self.books += self.make_books(1, start=2, category=poetry, subcategory=self.subcategory,
+                                      total_copies=4, available_copies=4)
+        borrow_book(self.member, self.books[0].id)
+        borrow_books(self.member, [self.books[0].id, self.books[2].id, self.books[2].id])
+        borrow = borrow_book(self.member, self.books[1].id)
+        return_books(self.member, [borrow.id])
+        self.client.force_authenticate(self.worker)
+
+    def rollups(self):
+        return sorted(DailyBookStats.objects.values_list('book_id', 'borrows', 'returns'))
+
+    def test_services_keep_the_rollups_and_refresh_rebuilds_them(self):
+        today_rows = [(self.books[0].id, 2, 0), (self.books[1].id, 1, 1), (self.books[2].id, 2, 0)]
+        self.assertEqual(self.rollups(), today_rows)
+        DailyBookStats.objects.all().delete()
+        call_command('refresh_borrow_stats', days=7, stdout=StringIO())
+        self.assertEqual(self.rollups(), today_rows)
+
+    def test_dashboards_read_only_the_rollups(self):
+        with CaptureQueriesContext(connection) as ctx:
+            top = self.client.get('/api/stats/books/top/', {'limit': 2}).data
+        self.assertNotIn('core_borrow"', ' '.join(q['sql'] for q in ctx.captured_queries))
+        self.assertEqual([(r['book_id'], r['borrows']) for r in top['results']],
+                         [(self.books[0].id, 2), (self.books[2].id, 2)])
+
+        categories = self.client.get('/api/stats/categories/top/').data['results']
+        self.assertEqual([(c['name'], c['borrows'], c['books']) for c in categories],
+                         [('Fiction', 3, 2), ('Poetry', 2, 1)])
+
+        timeline = self.client.get('/api/stats/borrows/', {'bucket': 'month', 'category': self.category.id}).data
+        self.assertEqual([(r['borrows'], r['returns']) for r in timeline['results']], [(3, 1)])
+        self.assertEqual(self.client.get('/api/stats/borrows/', {'bucket': 'year'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/stats/books/top/', {'days': 0}).status_code, 400)
+
+        availability = self.client.get('/api/stats/subcategories/availability/').data
+        self.assertEqual([(a['name'], a['total_copies'], a['available_copies']) for a in availability],
+                         [('Sonnets', 4, 2)])
+        borrow_book(self.member, self.books[2].id)
+        availability = self.client.get('/api/stats/subcategories/availability/').data
+        self.assertEqual(availability[0]['available_copies'], 1)
+
+        self.client.force_authenticate(self.member)
+        self.assertEqual(self.client.get('/api/stats/books/top/').status_code, 403)
+
+
+class AvailabilityReconciliationTests(LibraryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.books = self.make_books(3, total_copies=2, available_copies=2)
+        borrow_book(self.member, self.books[0].id)
+
+    def drift(self, book, available):
+        Book.objects.filter(id=book.id).update(available_copies=available)
+
+    def test_full_run_reports_and_fixes_drift(self):
+        self.drift(self.books[0], 2)
+        self.drift(self.books[1], 0)
+
+        with CaptureQueriesContext(connection) as ctx:
+            drift = find_drift()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual([(row[0], row[2], row[3]) for row in drift],
+                         [(self.books[0].id, 2, 1), (self.books[1].id, 0, 2)])
+
+        run, _ = reconcile_availability(apply=False)
+        self.assertEqual((run.drifted, len(find_drift())), (2, 2))
+
+        out = StringIO()
+        call_command('reconcile_availability', stdout=out)
+        self.assertIn('Fixed 2 drifted books', out.getvalue())
+        self.assertEqual(find_drift(), [])
+        self.assertEqual(Book.objects.get(id=self.books[0].id).available_copies, 1)
+
+    def test_repair_never_moves_updated_at_back(self):
+        self.drift(self.books[1], 0)
+
+        edits = []
+
+        def drift_then_edit(books=None):
+            drift = find_drift(books)
+            # A worker edits the book while the scan runs.
+            edits.append(timezone.now())
+            Book.objects.filter(id=self.books[1].id).update(title='Edited', updated_at=edits[0])
+            return drift
+
+        with mock.patch('core.reconciliation.find_drift', side_effect=drift_then_edit):
+            reconcile_availability()
+        book = Book.objects.get(id=self.books[1].id)
+        self.assertEqual(book.available_copies, 2)
+        self.assertGreater(book.updated_at, edits[0])
+
+    def test_incremental_run_only_checks_touched_books(self):
+        reconcile_availability()
+        Book.objects.filter(id=self.books[2].id).update(available_copies=0,
+                                                         updated_at=timezone.now() - timedelta(days=1))
+        borrow_book(self.member, self.books[1].id)
+        self.drift(self.books[1], 2)
+
+        run, drift = reconcile_availability(incremental=True)
+        self.assertTrue(run.incremental)
+        self.assertEqual([row[0] for row in drift], [self.books[1].id])
+
+        run, drift = reconcile_availability()
+        self.assertEqual([row[0] for row in drift], [self.books[2].id])
+
+
+class BookImportTests(LibraryTestCase):
+    header = 'title,isbn,publication_date,author,category,subcategory,total_copies\n'
+
+    def import_csv(self, text, **kwargs):
+        importer = BookImporter(batch_size=3, **kwargs)
+        return importer.run(StringIO(self.header + text), 'csv'), importer.errors
+
+    def test_import_resolves_relations_and_skips_known_isbns(self):
+        self.make_books(1)
+        stats, errors = self.import_csv(
+            'The Dispossessed,0000000000000,1974-05-01,Ursula Le Guin,Fiction,,1\n'
+            'Kindred,9780807083697,1979-06-01,Octavia Butler,Fiction,Classics,2\n'
+            'Dawn,9780446603775,1987-05-01,Octavia Butler,Science fiction,Classics,3\n'
+            'Dawn (again),9780446603775,1987-05-01,Octavia Butler,,,1\n'
+            'No date,9780000000001,someday,Somebody,,,1\n'
+        )
+        self.assertEqual({key: stats[key] for key in ('rows', 'created', 'duplicates', 'invalid')},
+                         {'rows': 5, 'created': 2, 'duplicates': 2, 'invalid': 1})
+        self.assertEqual(errors, [(6, 'publication_date must be YYYY-MM-DD')])
+
+        kindred = Book.objects.get(isbn='9780807083697')
+        self.assertEqual((str(kindred.author), kindred.category.name, str(kindred.subcategory)),
+                         ('Octavia Butler', 'Fiction', 'Classics (Fiction)'))
+        self.assertEqual(Author.objects.filter(last_name='Butler').count(), 1)
+        self.assertEqual(SubCategory.objects.filter(name='Classics').count(), 2)
+        self.assertEqual(Book.objects.get(isbn='9780446603775').title, 'Dawn')
+        self.assertEqual(search_book_ids('kindred'), [kindred.id])
+
+    def test_jsonl_update_in_worker_processes(self):
+        self.make_books(1)
+        lines = [json.dumps({'title': 'Renamed', 'isbn': '0000000000000', 'publication_date': '2000-01-01',
+                             'author_first_name': 'Ursula', 'author_last_name': 'Le Guin', 'total_copies': 9}),
+                 '{not json']
+        importer = BookImporter(workers=2, update=True)
+        stats = importer.run(StringIO('\n'.join(lines)), 'jsonl')
+        self.assertEqual((stats['updated'], stats['invalid']), (1, 1))
+        book = Book.objects.get(isbn='0000000000000')
+        self.assertEqual((book.title, book.author_id, book.total_copies), ('Renamed', self.author.id, 1))
+
+    def test_committed_chunks_are_visible_when_the_run_fails(self):
+        self.client.force_authenticate(self.member)
+        self.assertEqual(self.client.get('/api/books/').data, [])
+        with self.assertRaises(RuntimeError):
+            self.import_csv('Kindred,9780807083697,1979-06-01,Octavia Butler,Fiction,,2\n',
+                            log=mock.Mock(side_effect=RuntimeError('disk full')))
+        self.assertEqual([book['title'] for book in self.client.get('/api/books/').data], ['Kindred'])
+
+    def test_isbns_added_concurrently_are_not_counted_as_created(self):
+        bulk_create = Book.objects.bulk_create
+
+        def racing_bulk_create(books, **kwargs):
+            Book.objects.create(title='Kindred', isbn='9780807083697', publication_date=date(1979, 6, 1),
+                                author=self.author)
+            return bulk_create(books, **kwargs)
+
+        with mock.patch.object(Book.objects, 'bulk_create', side_effect=racing_bulk_create):
+            stats, _ = self.import_csv('Kindred,9780807083697,1979-06-01,Octavia Butler,Fiction,,2\n'
+                                       'Dawn,9780446603775,1987-05-01,Octavia Butler,Fiction,,3\n')
+        self.assertEqual((stats['created'], stats['duplicates']), (1, 1))
+
+    def test_update_advances_updated_at_and_etag(self):
+        book = self.make_books(1)[0]
+        etag, last_modified = book_validators(book)
+        Book.objects.filter(pk=book.pk).update(updated_at=book.updated_at - timedelta(hours=1))
+        self.import_csv('Renamed,0000000000000,2000-01-01,Ursula Le Guin,Fiction,,1\n', update=True)
+        renamed = book_queryset().get(pk=book.pk)
+        self.assertEqual(renamed.title, 'Renamed')
+        self.assertGreater(renamed.updated_at, book.updated_at)
+        self.assertNotEqual(book_validators(renamed), (etag, last_modified))
+
+
+class BookSearchTests(LibraryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.member)
+        self.dune = Book.objects.create(title='Dune', isbn='9780441013593', publication_date=date(1965, 8, 1),
+                                        author=self.author, description='Desert planet politics.')
+        self.mention = Book.objects.create(title='Essays', isbn='9780000000001', publication_date=date(1990, 1, 1),
+                                           author=self.author, description='On reading Dune as a teenager.')
+
+    def search(self, query, **params):
+        response = self.client.get('/api/books/', {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [book['id'] for book in response.data['results']]
+
+    def test_ranks_title_matches_first_and_matches_prefixes(self):
+        self.assertEqual(self.search('dune'), [self.dune.id, self.mention.id])
+        self.assertEqual(self.search('plan'), [self.dune.id])
+        self.assertEqual(self.search('9780441013593'), [self.dune.id])
+        self.assertEqual(self.search('"dune*('), [self.dune.id, self.mention.id])
+
+    def test_ranks_every_match_before_limiting(self):
+        for i in range(5):
+            Book.objects.create(title=f'Notes {i}', isbn=f'97800000001{i:02d}', publication_date=date(2000, 1, 1),
+                                author=self.author, description='A chapter on Arrakis.')
+        arrakis = Book.objects.create(title='Arrakis', isbn='9780000000200', publication_date=date(2000, 1, 1),
+                                      author=self.author)
+        self.assertEqual(search_book_ids('arrakis', limit=1), [arrakis.id])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.dune.title = 'Children of Dune'
+        self.dune.save()
+        self.assertEqual(self.search('children'), [self.dune.id])
+
+        self.author.last_name = 'Herbert'
+        self.author.save()
+        self.assertEqual(sorted(search_book_ids('herbert')), sorted([self.dune.id, self.mention.id]))
+
+        self.mention.delete()
+        self.assertEqual(self.search('dune'), [self.dune.id])
+
+    def test_filters_and_pagination(self):
+        Book.objects.filter(id=self.dune.id).update(available_copies=0)
+        self.assertEqual(self.search('dune', available='true'), [self.mention.id])
+
+        response = self.client.get('/api/books/', {'search': 'dune', 'page_size': 1, 'page': 2})
+        self.assertEqual([b['id'] for b in response.data['results']], [self.mention.id])
+        self.assertEqual((response.data['count'], response.data['previous'], response.data['next']), (2, 1, None))
+
+
+class CatalogCacheTests(LibraryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.book = self.make_books(1, total_copies=3, available_copies=3)[0]
+
+    def get(self, path, user=None):
+        self.client.force_authenticate(user or self.member)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(ctx.captured_queries)
+
+    def test_detail_and_list_are_served_from_cache(self):
+        data, queries = self.get(f'/api/books/{self.book.id}/')
+        self.assertEqual(queries, 1)
+        self.assertEqual(self.get(f'/api/books/{self.book.id}/'), (data, 0))
+
+        data, queries = self.get('/api/books/?page_size=10')
+        self.assertGreater(queries, 0)
+        self.assertEqual(self.get('/api/books/?page_size=10'), (data, 0))
+
+        self.get('/api/authors/', self.worker)
+        self.assertEqual(self.get('/api/authors/', self.worker)[1], 0)
+
+    def test_borrow_refreshes_only_the_affected_book(self):
+        other = self.make_books(1, start=1)[0]
+        self.get('/api/books/')
+        self.get(f'/api/books/{other.id}/')
+
+        borrow_book(self.member, self.book.id)
+
+        # The list of ids is still valid; only the borrowed book's payload is rebuilt.
+        data, queries = self.get('/api/books/')
+        self.assertEqual(queries, 1)
+        self.assertEqual({b['id']: b['available_copies'] for b in data}, {self.book.id: 2, other.id: 1})
+        self.assertEqual(self.get(f'/api/books/{other.id}/')[1], 0)
+
+    def test_model_changes_invalidate_dependent_entries(self):
+        subcategory = SubCategory.objects.create(name='Space opera', category=self.category)
+        Book.objects.filter(id=self.book.id).update(subcategory=subcategory)
+        catalog_cache.bump([f'book:{self.book.id}'])
+
+        self.get(f'/api/books/{self.book.id}/')
+        self.category.name = 'Speculative'
+        self.category.save()
+        data, _ = self.get(f'/api/books/{self.book.id}/')
+        self.assertEqual((data['category'], data['subcategory']), ('Speculative', 'Space opera (Speculative)'))
+
+        self.author.first_name = 'U. K.'
+        self.author.save()
+        self.assertEqual(self.get(f'/api/books/{self.book.id}/')[0]['author'], 'U. K. Le Guin')
+
+        self.get('/api/books/')
+        self.make_books(1, start=5)
+        self.assertEqual(len(self.get('/api/books/')[0]), 2)
+
+        self.get('/api/categories', self.worker)
+        Category.objects.create(name='Poetry')
+        self.assertEqual(len(self.get('/api/categories', self.worker)[0]), 2)
+
+    def test_change_while_building_is_not_stored(self):
+        def validators_after_change(book):
+            # Another worker's borrow commits after the book was read but before it is stored.
+            writer = threading.Thread(target=catalog_cache.availability_changed, args=([book.id],))
+            writer.start()
+            writer.join()
+            return book_validators(book)
+
+        with mock.patch('core.views.book_validators', side_effect=validators_after_change):
+            self.get(f'/api/books/{self.book.id}/')
+            self.get('/api/books/')
+        self.assertEqual(self.get(f'/api/books/{self.book.id}/')[1], 1)
+        self.assertEqual(self.get(f'/api/books/{self.book.id}/')[1], 0)
+
+    def test_disabled_cache_always_queries(self):
+        with self.settings(CATALOG_CACHE={'ENABLED': False}):
+            self.get(f'/api/books/{self.book.id}/')
+            self.assertEqual(self.get(f'/api/books/{self.book.id}/')[1], 1)
+
+
+class ConditionalRequestTests(LibraryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.book = self.make_books(1, total_copies=2, available_copies=2)[0]
+        self.client.force_authenticate(self.member)
+
+    def test_unchanged_book_returns_not_modified(self):
+        response = self.client.get(f'/api/books/{self.book.id}/')
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/books/{self.book.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        response = self.client.get(f'/api/books/{self.book.id}/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        borrow_book(self.member, self.book.id)
+        response = self.client.get(f'/api/books/{self.book.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unchanged_list_returns_not_modified_without_queries(self):
+        etag = self.client.get('/api/books/?page_size=10')['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/books/?page_size=10', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertNotEqual(self.client.get('/api/books/?page_size=5')['ETag'], etag)
+
+        self.author.last_name = 'Le Guin-Kroeber'
+        self.author.save()
+        response = self.client.get('/api/books/?page_size=10', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['author'], 'Ursula Le Guin-Kroeber')
+
+    def test_process_local_version_cache_is_flagged(self):
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                  'shared': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                             'LOCATION': tempfile.gettempdir()}}
+        with self.settings(DEBUG=False, CACHES=shared):
+            self.assertEqual([e.id for e in check_shared_caches(None)], ['core.W001'])
+            with self.settings(CATALOG_CACHE={'ALIAS': 'shared'}):
+                self.assertEqual(check_shared_caches(None), [])
+        with self.settings(DEBUG=True):
+            self.assertEqual(check_shared_caches(None), [])
+
+
+class SparseFieldsetTests(LibraryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.book = self.make_books(1, description='A long description.')[0]
+
+    def get(self, path):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.data, [query['sql'] for query in ctx.captured_queries]
+
+    def test_fields_narrow_the_response_and_the_query(self):
+        self.client.force_authenticate(self.member)
+        data, queries = self.get('/api/books/?fields=title,id&page_size=5')
+        self.assertEqual(data['results'], [{'id': self.book.id, 'title': 'Book 0000'}])
+        self.assertNotIn('description', queries[-1])
+        self.assertNotIn('core_author', queries[-1])
+
+        data, queries = self.get('/api/books/?view=compact')
+        self.assertEqual(list(data[0]), BookSerializer.compact_fields)
+        self.assertNotIn('description', ''.join(queries))
+
+        # Cached full payloads are projected instead of queried.
+        self.get(f'/api/books/{self.book.id}/')
+        self.assertEqual(self.get(f'/api/books/{self.book.id}/?fields=isbn'), ({'isbn': '0000000000000'}, []))
+
+        response = self.client.get('/api/books/?fields=title,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.data['error'])
+
+    def test_borrow_lists_accept_fields(self):
+        borrow_book(self.member, self.book.id)
+        self.client.force_authenticate(self.member)
+        data, queries = self.get('/api/my-borrows/?view=compact')
+        self.assertEqual(data[0]['book'], 'Book 0000')
+        self.assertEqual(list(data[0]), BorrowSerializer.compact_fields)
+        self.assertNotIn('borrow_date', queries[-1])
+
+        self.client.force_authenticate(self.worker)
+        data, _ = self.get('/api/all-borrows/?fields=is_overdue&active=true')
+        self.assertEqual(data, [{'is_overdue': False}])
+
+
+class RequestMetricsTests(LibraryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        request_metrics.clear()
+        self.book = self.make_books(1)[0]
+
+    def server_timing(self, response):
+        return dict(part.strip().split(';', 1) for part in response['Server-Timing'].split(','))
+
+    def test_server_timing_counts_the_request_queries(self):
+        # A real token, so the async view's own user lookup runs in a worker thread.
+        token = str(UserRefreshToken.for_user(self.member).access_token)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/books/{self.book.id}/')
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'db', 'view', 'render', 'total'})
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', timing['db'])
+
+        self.client.force_authenticate(self.member)
+        with self.assertLogs('core.metrics', 'INFO') as logs:
+            self.client.get('/api/my-borrows/')
+        self.assertIn('route=api/my-borrows/ status=200', logs.output[0])
+
+    def test_metrics_endpoint_reports_rolling_route_histograms(self):
+        self.client.force_authenticate(self.member)
+        for _ in range(3):
+            self.client.get(f'/api/books/{self.book.id}/')
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+        self.client.force_authenticate(self.worker)
+        routes = {(r['route'], r['method']): r for r in self.client.get('/api/metrics/').data['routes']}
+        detail = routes['api/books/<int:pk>/', 'GET']
+        self.assertEqual(detail['requests'], 3)
+        self.assertEqual(sum(detail['timings_ms']['total']['buckets'].values()), 3)
+        self.assertEqual(detail['errors'], 0)
+
+        # Slots older than the window drop out.
+        histogram = RollingHistogram((10, 100), window=60, slots=3)
+        histogram.add(5, now=0)
+        histogram.add(50, now=59)
+        self.assertEqual(histogram.snapshot(now=59)['buckets'], {'10': 1, '100': 1, '+Inf': 0})
+        self.assertEqual(histogram.snapshot(now=79)['count'], 1)
+
+    @override_settings(REQUEST_METRICS={'ENABLED': False})
+    def test_can_be_switched_off(self):
+        self.client.force_authenticate(self.member)
+        self.assertNotIn('Server-Timing', self.client.get('/api/books/'))
+
+
+class InventoryConcurrencyTests(TransactionTestCase):
+    threads = 16
+    copies = 5
+
+    def run_concurrently(self, target, args_list):
+        barrier = threading.Barrier(len(args_list))
+        results = []
+
+        def worker(*args):
+            try:
+                barrier.wait()
+                results.append(target(*args))
+            except Exception as e:
+                results.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=args) for args in args_list]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_counter_never_oversells_or_drifts(self):
+        author = Author.objects.create(first_name='Octavia', last_name='Butler')
+        book = Book.objects.create(title='Kindred', isbn='9780807083697', publication_date=date(1979, 6, 1),
+                                   author=author, total_copies=self.copies, available_copies=self.copies)
+        members = [User.objects.create(username=f'member{i}', role=User.Role.MEMBER) for i in range(self.threads)]
+
+        results = self.run_concurrently(borrow_book, [(member, book.id) for member in members])
+        borrows = [r for r in results if isinstance(r, Borrow)]
+        book.refresh_from_db()
+        self.assertEqual(len(borrows), self.copies)
+        self.assertEqual(book.available_copies, 0)
+        self.assertEqual(Borrow.objects.filter(book=book, returned=False).count(), self.copies)
+
+        # Every borrow is returned twice at once; each copy comes back exactly once.
+        args = [(borrow.member, borrow.id) for borrow in borrows] * 2
+        results = self.run_concurrently(return_book, args)
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, self.copies)
+        self.assertEqual(sum(isinstance(r, Borrow) for r in results), self.copies)
+        self.assertFalse(Borrow.objects.filter(book=book, returned=False).exists())
+
+
+class DatabaseConfigTests(TransactionTestCase):
+
+    def test_environment_selects_and_tunes_the_backend(self):
+        base_dir = Path('/srv/library')
+        sqlite = database_config(base_dir, {})
+        self.assertEqual(sqlite['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertIn('PRAGMA journal_mode=WAL', sqlite['OPTIONS']['init_command'])
+        self.assertEqual((sqlite['NAME'], sqlite['CONN_MAX_AGE']), (base_dir / 'db.sqlite3', 60))
+        untuned = database_config(base_dir, {'DATABASE_SQLITE_TUNED': '0', 'DATABASE_CONN_MAX_AGE': '0'})
+        self.assertNotIn('transaction_mode', untuned['OPTIONS'])
+        self.assertEqual(untuned['CONN_MAX_AGE'], 0)
+
+        pooled = database_config(base_dir, {'DATABASE_ENGINE': 'postgresql', 'DATABASE_POOL': '1',
+                                            'DATABASE_POOL_MAX_SIZE': '20', 'DATABASE_STATEMENT_TIMEOUT': '5000'})
+        self.assertEqual(pooled['OPTIONS']['pool']['max_size'], 20)
+        self.assertEqual(pooled['OPTIONS']['options'], '-c statement_timeout=5000')
+        self.assertEqual((pooled['CONN_MAX_AGE'], pooled['CONN_HEALTH_CHECKS']), (0, True))
+        with self.assertRaises(ValueError):
+            database_config(base_dir, {'DATABASE_ENGINE': 'oracle'})
+
+        replicas = replica_configs(sqlite, {'DATABASE_REPLICAS': '/srv/a.sqlite3, /srv/b.sqlite3'})
+        self.assertEqual([(alias, config['NAME']) for alias, config in replicas.items()],
+                         [('replica1', '/srv/a.sqlite3'), ('replica2', '/srv/b.sqlite3')])
+        self.assertEqual(replicas['replica1']['TEST'], {'MIRROR': 'default'})
+        replicas = replica_configs(pooled, {'DATABASE_REPLICAS': 'db-read:6432'})
+        self.assertEqual((replicas['replica1']['HOST'], replicas['replica1']['PORT']), ('db-read', '6432'))
+
+    def test_concurrent_borrows_run_in_wal_mode_without_lock_errors(self):
+        self.assertEqual(database_profile()['journal_mode'], 'wal')
+        results = BorrowConcurrencyBenchmark(threads=(4,), seconds=0.3, books=2).run()
+        self.assertEqual(results[0]['failed'], 0)
+        self.assertGreater(results[0]['cycles'], 0)
+        self.assertFalse(Book.objects.exists())
+
+
+@override_settings(READ_REPLICAS={'ALIASES': ['replica'], 'STICKY_SECONDS': 10})
+class ReadReplicaTests(TransactionTestCase):
+    """
+    A second connection to the test database stands in for the replica.
+    """
+    # Resolved once setUpClass has added the alias.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        connections.settings['replica'] = {**connections['default'].settings_dict, 'TEST': {'MIRROR': 'default'}}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        catalog_cache.clear()
+        user_cache.clear()
+        self.client = APIClient()
+        self.member = User.objects.create(username='member', role=User.Role.MEMBER)
+        self.worker = User.objects.create(username='worker', role=User.Role.WORKER)
+        author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        self.book = Book.objects.create(title='The Dispossessed', isbn='9780061054884',
+                                        publication_date=date(1974, 5, 1), author=author)
+
+    def get(self, user, url):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(replica)
+
+    def test_lists_read_from_the_replica_until_the_member_writes(self):
+        response, replica_queries = self.get(self.member, '/api/my-borrows/')
+        self.assertEqual((response.data, replica_queries > 0), ([], True))
+
+        self.client.post('/api/borrow/', {'book': self.book.id}, format='json')
+        response, replica_queries = self.get(self.member, '/api/my-borrows/')
+        self.assertEqual((len(response.data), replica_queries), (1, 0))
+
+        # Others are not sticky.
+        response, replica_queries = self.get(self.worker, '/api/all-borrows/')
+        self.assertEqual(len(response.data), 1)
+        self.assertGreater(replica_queries, 0)
+        response = self.client.get('/api/all-borrows/export/?output=ndjson')
+        with CaptureQueriesContext(connections['replica']) as replica:
+            self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 1)
+        self.assertGreater(len(replica), 0)
+
+    def test_catalog_cache_is_filled_from_the_primary(self):
+        # Sparse fieldsets of uncached books aren't stored, so they can use the replica.
+        _, replica_queries = self.get(self.member, f'/api/books/?ids={self.book.id}&fields=id,title')
+        self.assertGreater(replica_queries, 0)
+        _, replica_queries = self.get(self.member, '/api/books/')
+        self.assertEqual(replica_queries, 0)
+        with self.settings(CATALOG_CACHE={'ENABLED': False}):
+            _, replica_queries = self.get(self.member, f'/api/books/{self.book.id}/')
+        self.assertGreater(replica_queries, 0)
+
+    def test_router_writes_and_migrates_on_default_only(self):
+        router = ReplicaRouter()
+        book = Book.objects.using('replica').get()
+        self.assertEqual(router.db_for_write(Book, instance=book), 'default')
+        self.assertTrue(router.allow_relation(book, self.member))
+        self.assertIs(router.allow_migrate('replica', 'core'), False)
+        self.assertIsNone(router.allow_migrate('default', 'core'))
+
+
+class BenchmarkSuiteTests(TestCase):
+
+    def test_seed_library_keeps_counters_consistent(self):
+        created = seed_library(books=50, borrows=400, members=10, seed=7)
+        self.assertEqual(created['borrows'], 400)
+        for book in Book.objects.all():
+            active = Borrow.objects.filter(book=book, returned=False).count()
+            self.assertEqual(book.available_copies, book.total_copies - active)
+
+    def test_seed_library_runs_again_after_large_ids(self):
+        seed_library(books=3, borrows=0, members=1, seed=7)
+        Book.objects.create(id=100_000, title='Imported', isbn='9780441478125', publication_date=date(1969, 1, 1),
+                            author=Author.objects.first())
+        seed_library(books=3, borrows=0, members=1, seed=7)
+        self.assertEqual(Book.objects.count(), 7)
+
+    def test_every_route_is_benchmarked_and_succeeds(self):
+        seed_library(books=20, borrows=100, members=5, seed=7)
+        books_before = Book.objects.count()
+        benchmark = APIBenchmark(requests=2, warmup=0)
+        self.assertEqual(benchmark.missing_routes(), [])
+
+        with self.settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            results = benchmark.run()
+
+        for row in results:
+            self.assertEqual(row['requests'], 2)
+            self.assertTrue(all(code.startswith('2') for code in row['statuses']), row)
+        # Every write made by the run is rolled back.
+        self.assertEqual(Book.objects.count(), books_before)
+
+
+class IndexBenchmarkTests(TransactionTestCase):
+
+    def test_benchmark_indexes_runs_and_restores_the_indexes(self):
+        out = StringIO()
+        call_command('benchmark_indexes', books=20, borrows=200, members=5, repeat=1, stdout=out)
+        self.assertIn('speedup', out.getvalue())
+        with connection.cursor() as cursor:
+            names = {index for table in ('core_book', 'core_borrow')
+                     for index in connection.introspection.get_constraints(cursor, table)}
+        self.assertLessEqual({'book_available_idx', 'borrow_active_due_idx', 'borrow_member_active_idx'}, names)
+
+
+class ThumbnailPoolTests(TransactionTestCase):
+
+    def test_pool_generates_thumbnails_after_commit(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        buffer = BytesIO()
+        Image.new('RGB', (300, 200), 'blue').save(buffer, 'JPEG')
+
+        with self.settings(MEDIA_ROOT=media_root, PROFILE_THUMBNAILS={'SIZES': (30,), 'FORMATS': ('webp',)}):
+            user = User.objects.create(username='painter', role=User.Role.MEMBER)
+            user.profile_picture.save('painter.jpg', SimpleUploadedFile('painter.jpg', buffer.getvalue()))
+            future = thumbnail_worker.submit(user.pk, user.profile_picture.name)
+            self.assertIsNot(future.result(timeout=30), None)
+
+            user.refresh_from_db()
+            with default_storage.open(user.profile_thumbnails['30']['webp']) as f:
+                self.assertEqual(Image.open(f).size, (30, 20))
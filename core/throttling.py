@@ -0,0 +1,66 @@
+"""
+Failed sign-in counting.
+
+Each failure increments a counter for the username and one for the client
+IP in the cache configured by ``LOGIN_THROTTLE['ALIAS']``. The counters
+expire ``WINDOW`` seconds after the first failure. While either is at its
+limit, sign-in is refused before ``authenticate()`` runs, so a burst of bad
+logins costs cache lookups instead of password hashes.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'MAX_FAILURES': 5,
+    'MAX_IP_FAILURES': 50,
+    'WINDOW': 15 * 60,
+}
+
+
+class LoginThrottle:
+    prefix = 'login-failures'
+
+    @property
+    def config(self):
+        return {**DEFAULTS, **getattr(settings, 'LOGIN_THROTTLE', {})}
+
+    @property
+    def backend(self):
+        return caches[self.config['ALIAS']]
+
+    def _keys(self, username, ip):
+        # Usernames are user input; hash them into a safe, bounded key.
+        digest = hashlib.md5((username or '').lower().encode()).hexdigest()
+        return f'{self.prefix}:user:{digest}', f'{self.prefix}:ip:{ip}'
+
+    def get_client_ip(self, request):
+        return request.META.get('REMOTE_ADDR') or 'unknown'
+
+    def is_blocked(self, username, ip):
+        user_key, ip_key = self._keys(username, ip)
+        counts = self.backend.get_many([user_key, ip_key])
+        config = self.config
+        return (counts.get(user_key, 0) >= config['MAX_FAILURES'] or
+                counts.get(ip_key, 0) >= config['MAX_IP_FAILURES'])
+
+    def record_failure(self, username, ip):
+        for key in self._keys(username, ip):
+            # add() starts the window; incr() never extends it.
+            self.backend.add(key, 0, self.config['WINDOW'])
+            try:
+                self.backend.incr(key)
+            except ValueError:
+                self.backend.set(key, 1, self.config['WINDOW'])
+
+    def reset(self, username):
+        self.backend.delete(self._keys(username, None)[0])
+
+    @property
+    def retry_after(self):
+        return self.config['WINDOW']
+
+
+login_throttle = LoginThrottle()
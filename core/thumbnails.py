@@ -0,0 +1,134 @@
+"""
+Profile picture thumbnails.
+
+Saving a new profile picture only stores the uploaded file. Once the
+transaction commits, ``thumbnail_worker.schedule()`` hands it to a small
+thread pool, which decodes it off the request thread and writes one file
+per configured size and format (``PROFILE_THUMBNAILS``). The storage names
+are recorded in ``User.profile_thumbnails`` unless the user has uploaded
+another picture in the meantime, in which case the files are discarded.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .authentication import user_cache
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'SIZES': (64, 256, 512),
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 80,
+    'WORKERS': 2,
+    # Run inline instead of in the pool (tests, management commands).
+    'SYNC': False,
+}
+
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+
+def render_thumbnails(source, sizes, formats, quality):
+    """
+    Encoded thumbnails of the image file ``source``, as ``{(size, format): bytes}``.
+    """
+    image = Image.open(source)
+    # Let the JPEG decoder downscale while decoding; no need for every pixel.
+    image.draft('RGB', (max(sizes), max(sizes)))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    rendered = {}
+    # Largest first, so each smaller size is reduced from the previous one.
+    for size in sorted(sizes, reverse=True):
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        for fmt in formats:
+            frame = image.convert('RGB') if fmt == 'jpeg' and image.mode != 'RGB' else image
+            buffer = BytesIO()
+            frame.save(buffer, fmt.upper(), quality=quality)
+            rendered[size, fmt] = buffer.getvalue()
+    return rendered
+
+
+def generate_thumbnails(user_id, name, stale=None):
+    """
+    Write thumbnails for the picture stored as ``name`` and record them on
+    the user. ``stale`` thumbnails of the previous picture are deleted.
+    """
+    config = {**DEFAULTS, **getattr(settings, 'PROFILE_THUMBNAILS', {})}
+    for path in names_of(stale or {}):
+        default_storage.delete(path)
+
+    with default_storage.open(name, 'rb') as source:
+        rendered = render_thumbnails(source, config['SIZES'], config['FORMATS'], config['QUALITY'])
+
+    stem = os.path.splitext(os.path.basename(name))[0]
+    thumbnails = {}
+    for (size, fmt), content in rendered.items():
+        path = f'profile_pictures/thumbnails/{stem}-{size}.{EXTENSIONS[fmt]}'
+        thumbnails.setdefault(str(size), {})[fmt] = default_storage.save(path, ContentFile(content))
+
+    if User.objects.filter(pk=user_id, profile_picture=name).update(profile_thumbnails=thumbnails):
+        # update() sends no post_save, so drop the cached user here.
+        user_cache.discard(user_id)
+    else:
+        for path in names_of(thumbnails):
+            default_storage.delete(path)
+    return thumbnails
+
+
+def names_of(thumbnails):
+    return [path for formats in thumbnails.values() for path in formats.values()]
+
+
+class ThumbnailWorker:
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def config(self):
+        return {**DEFAULTS, **getattr(settings, 'PROFILE_THUMBNAILS', {})}
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.config['WORKERS'], thread_name_prefix='thumbnails')
+            return self._executor
+
+    def schedule(self, user, stale=None):
+        """
+        Generate thumbnails for ``user.profile_picture`` after the current
+        transaction commits.
+        """
+        user_id, name = user.pk, user.profile_picture.name
+        transaction.on_commit(lambda: self.submit(user_id, name, stale))
+
+    def submit(self, user_id, name, stale=None):
+        if self.config['SYNC']:
+            return generate_thumbnails(user_id, name, stale)
+        return self.executor.submit(self._run, user_id, name, stale)
+
+    def _run(self, user_id, name, stale):
+        try:
+            return generate_thumbnails(user_id, name, stale)
+        except Exception:
+            logger.exception('Could not generate thumbnails for %s', name)
+        finally:
+            # Pool threads outlive the task; don't leave their connection open.
+            connection.close()
+
+
+thumbnail_worker = ThumbnailWorker()
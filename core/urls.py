@@ -6,7 +6,11 @@ from .views import (WorkerSignupAPIView, MemberSignupAPIView,
                     CategoryCreateAPIView, CategoryUpdateAPIView, CategoryDeleteAPIView,
                     SubCategoryCreateAPIView, SubCategoryUpdateAPIView, SubCategoryDeleteAPIView,
                     BookCreateAPIView, BookUpdateAPIView, BookDeleteAPIView, AuthorListAPIView, CategoryListAPIView,
-                    SubCategoryListAPIView)
+                    SubCategoryListAPIView, BulkBorrowBookAPIView, BulkReturnBookAPIView,
+                    WorkerBorrowExportAPIView, WorkerOverdueReportAPIView, RequestMetricsAPIView,
+                    TopBooksStatsAPIView, TopCategoriesStatsAPIView, BorrowTimelineStatsAPIView,
+                    SubCategoryAvailabilityAPIView, HoldListCreateAPIView, HoldCancelAPIView,
+                    BookAvailabilityEventsAPIView)
 
 urlpatterns = [
     path('member/signup/', MemberSignupAPIView.as_view(), name='member-signup'),
@@ -39,10 +43,25 @@ urlpatterns = [
 
     path('books/', BookListAPIView.as_view(), name='book-list'),
     path('books/<int:pk>/', BookDetailAPIView.as_view(), name='book-detail'),
+    path('books/availability/events/', BookAvailabilityEventsAPIView.as_view(), name='book-availability-events'),
 
     path('borrow/', BorrowBookAPIView.as_view(), name='borrow-book'),
     path('return/<int:pk>/', ReturnBookAPIView.as_view(), name='return-book'),
+    path('borrow/bulk/', BulkBorrowBookAPIView.as_view(), name='bulk-borrow-book'),
+    path('return/bulk/', BulkReturnBookAPIView.as_view(), name='bulk-return-book'),
+    path('holds/', HoldListCreateAPIView.as_view(), name='holds'),
+    path('holds/<int:pk>/cancel/', HoldCancelAPIView.as_view(), name='cancel-hold'),
     path('my-borrows/', MemberBorrowListAPIView.as_view(), name='member-borrows'),
     path('all-borrows/', WorkerBorrowListAPIView.as_view(), name='worker-borrows'),
+    path('all-borrows/export/', WorkerBorrowExportAPIView.as_view(), name='worker-borrows-export'),
+    path('all-borrows/overdue/', WorkerOverdueReportAPIView.as_view(), name='worker-overdue-report'),
+
+    path('stats/books/top/', TopBooksStatsAPIView.as_view(), name='stats-top-books'),
+    path('stats/categories/top/', TopCategoriesStatsAPIView.as_view(), name='stats-top-categories'),
+    path('stats/borrows/', BorrowTimelineStatsAPIView.as_view(), name='stats-borrow-timeline'),
+    path('stats/subcategories/availability/', SubCategoryAvailabilityAPIView.as_view(),
+         name='stats-subcategory-availability'),
+
+    path('metrics/', RequestMetricsAPIView.as_view(), name='request-metrics'),
 
 ]
\ No newline at end of file
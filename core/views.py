@@ -1,22 +1,46 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-from datetime import timedelta
-
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser
 
 from .serializers import (SignupSerializer, SigninSerializer, BorrowSerializer,
                           ProfileUpdateSerializer, BookSerializer, AuthorSerializer,
-                          AdminBookSerializer, CategorySerializer, SubCategorySerializer)
-from .models import (User, Borrow, Book, Author, Category, SubCategory)
+                          AdminBookSerializer, CategorySerializer, HoldSerializer, SubCategorySerializer)
+from .async_views import AsyncAPIView
+from .authentication import UserRefreshToken
+from .cache import (AUTHORS, AVAILABILITY, BOOKS, CATALOG, CATEGORIES, SUBCATEGORIES, catalog_cache)
+from .conditional import book_validators, not_modified, set_validators, versions_etag
+from .events import get_backend, get_config as get_events_config, snapshot
+from .exports import EXPORT_FORMATS, stream_borrows
+from .fieldsets import FieldsetError, project, requested_fields
+from .metrics import request_metrics
+from .models import (User, Borrow, Book, Author, Category, Hold, SubCategory)
+from .pagination import BookKeysetPaginator, BookSearchPaginator, PaginationError, get_page_size
+from .querysets import (book_queryset, borrow_queryset, filter_borrows, overdue_q, with_overdue,
+                        with_queue_position)
+from .replicas import ReplicaReadsMixin, mark_written
+from .reports import OVERDUE_REPORT_LIMIT, OVERDUE_REPORT_MAX_LIMIT, overdue_report
+from .search import search_book_ids
+from .services import (MAX_ID, InventoryError, borrow_book, borrow_books, cancel_hold, place_hold, return_book,
+                       return_books)
+from .stats import (StatsError, borrow_timeline, get_days, subcategory_availability, top_books,
+                    top_categories)
+from .throttling import login_throttle
 
 # class SignupAPIView(APIView):
 #     def post(self, request):
@@ -74,54 +98,49 @@ class WorkerSignupAPIView(APIView):
 #         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def signin_response(request, role, error):
+    serializer = SigninSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+
+    # Refuse throttled clients before any password hashing happens.
+    username = serializer.validated_data['username']
+    ip = login_throttle.get_client_ip(request)
+    if login_throttle.is_blocked(username, ip):
+        return Response({"error": "Too many failed sign-in attempts. Try again later."}, status=429,
+                        headers={'Retry-After': str(login_throttle.retry_after)})
+
+    # authenticate() rehashes the password with the preferred hasher if needed.
+    user = authenticate(username=username, password=serializer.validated_data['password'])
+    if user is None:
+        login_throttle.record_failure(username, ip)
+    elif user.role == role:
+        login_throttle.reset(username)
+        refresh = UserRefreshToken.for_user(user)
+        return Response({
+            "access": str(refresh.access_token),
+            "refresh": str(refresh),
+            "user": {
+                "username": user.username,
+                "email": user.email,
+                "role": user.role
+            }
+        }, status=200)
+    return Response({"error": error}, status=401)
+
+
 class MemberSigninAPIView(APIView):
 
-    @swagger_auto_schema(request_body=SigninSerializer)
+    @swagger_auto_schema(request_body=SigninSerializer, responses={429: "Too many failed sign-in attempts"})
     def post(self, request):
-        serializer = SigninSerializer(data=request.data)
-        if serializer.is_valid():
-            user = authenticate(
-                username=serializer.validated_data['username'],
-                password=serializer.validated_data['password']
-            )
-            if user and user.role == User.Role.MEMBER:
-                refresh = RefreshToken.for_user(user)
-                return Response({
-                    "access": str(refresh.access_token),
-                    "refresh": str(refresh),
-                    "user": {
-                        "username": user.username,
-                        "email": user.email,
-                        "role": user.role
-                    }
-                }, status=200)
-            return Response({"error": "Invalid credentials or not a member"}, status=401)
-        return Response(serializer.errors, status=400)
+        return signin_response(request, User.Role.MEMBER, "Invalid credentials or not a member")
 
 
 class WorkerSigninAPIView(APIView):
 
-    @swagger_auto_schema(request_body=SigninSerializer)
+    @swagger_auto_schema(request_body=SigninSerializer, responses={429: "Too many failed sign-in attempts"})
     def post(self, request):
-        serializer = SigninSerializer(data=request.data)
-        if serializer.is_valid():
-            user = authenticate(
-                username=serializer.validated_data['username'],
-                password=serializer.validated_data['password']
-            )
-            if user and user.role == User.Role.WORKER:
-                refresh = RefreshToken.for_user(user)
-                return Response({
-                    "access": str(refresh.access_token),
-                    "refresh": str(refresh),
-                    "user": {
-                        "username": user.username,
-                        "email": user.email,
-                        "role": user.role
-                    }
-                }, status=200)
-            return Response({"error": "Invalid credentials or not a worker"}, status=401)
-        return Response(serializer.errors, status=400)
+        return signin_response(request, User.Role.WORKER, "Invalid credentials or not a worker")
 
 
 class UserProfileAPIView(APIView):
@@ -135,6 +154,11 @@ class UserProfileAPIView(APIView):
             "first_name": user.first_name,
             "last_name": user.last_name,
             "role": user.role,
+            "profile_picture": request.build_absolute_uri(user.profile_picture.url) if user.profile_picture else None,
+            "thumbnails": {
+                size: {fmt: request.build_absolute_uri(default_storage.url(name)) for fmt, name in formats.items()}
+                for size, formats in user.profile_thumbnails.items()
+            },
         }, status=status.HTTP_200_OK)
 
 
@@ -205,15 +229,16 @@ class AuthorDeleteAPIView(APIView):
             return Response({'error': 'Author not found'}, status=404)
 
 
-class AuthorListAPIView(APIView):
+class AuthorListAPIView(ReplicaReadsMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         if request.user.role != request.user.Role.WORKER:
             return Response({'error': 'Only workers can delete authors.'}, status=403)
-        authors = Author.objects.all()
-        serializer = AuthorSerializer(authors, many=True)
-        return Response(serializer.data, status=200)
+        data = catalog_cache.get_or_set(
+            'authors', [AUTHORS], lambda: list(AuthorSerializer(Author.objects.all(), many=True).data)
+        )
+        return Response(data, status=200)
 
 
 # ------------------------
@@ -266,15 +291,16 @@ class CategoryDeleteAPIView(APIView):
             return Response({'error': 'Category not found'}, status=404)
 
 
-class CategoryListAPIView(APIView):
+class CategoryListAPIView(ReplicaReadsMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         if request.user.role != request.user.Role.WORKER:
             return Response({'error': 'Only workers can delete authors.'}, status=403)
-        categories = Category.objects.all()
-        serializer = CategorySerializer(categories, many=True)
-        return Response(serializer.data, status=200)
+        data = catalog_cache.get_or_set(
+            'categories', [CATEGORIES], lambda: list(CategorySerializer(Category.objects.all(), many=True).data)
+        )
+        return Response(data, status=200)
 
 # ------------------------
 # CRUD Views for SubCategory
@@ -326,15 +352,17 @@ class SubCategoryDeleteAPIView(APIView):
             return Response({'error': 'SubCategory not found'}, status=404)
 
 
-class SubCategoryListAPIView(APIView):
+class SubCategoryListAPIView(ReplicaReadsMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         if request.user.role != request.user.Role.WORKER:
             return Response({'error': 'Only workers can delete authors.'}, status=403)
-        sub_categories = SubCategory.objects.all()
-        serializer = SubCategorySerializer(sub_categories, many=True)
-        return Response(serializer.data, status=200)
+        data = catalog_cache.get_or_set(
+            'subcategories', [SUBCATEGORIES],
+            lambda: list(SubCategorySerializer(SubCategory.objects.all(), many=True).data)
+        )
+        return Response(data, status=200)
 
 
 # ------------------------
@@ -386,11 +414,152 @@ class BookDeleteAPIView(APIView):
             return Response({'error': 'Book not found'}, status=404)
 
 
-class BookListAPIView(APIView):
+def build_book_entries(books, guard):
+    payloads = BookSerializer(books, many=True).data
+    entries = []
+    for book, payload in zip(books, payloads):
+        etag, last_modified = book_validators(book)
+        entries.append({'payload': payload, 'etag': etag, 'last_modified': last_modified})
+    catalog_cache.set_books(books, entries, guard)
+    return entries
+
+
+async def get_book_entries(ids):
+    """
+    Serialized books for ``ids`` with their validators, in order, served from
+    the catalog cache where possible.
+    """
+    entries = catalog_cache.get_books(ids)
+    missing = [pk for pk in ids if pk not in entries]
+    if missing:
+        guard = catalog_cache.get_versions(CATALOG)
+        with catalog_cache.filling():
+            books = [book async for book in book_queryset().filter(id__in=missing)]
+        entries.update(zip((book.id for book in books), build_book_entries(books, guard)))
+    return [entries[pk] for pk in ids if pk in entries]
+
+
+async def get_book_payloads(ids, fields=None):
+    """
+    Serialized books for ``ids``, in order. A sparse fieldset projects the
+    cached full payloads and reads only its own columns for the rest, which
+    are not cached.
+    """
+    payloads = await get_book_payload_map(ids, fields)
+    return [payloads[pk] for pk in ids if pk in payloads]
+
+
+async def get_book_payload_map(ids, fields=None):
+    """
+    ``{id: payload}`` for those of ``ids`` that exist; the books missing
+    from the cache are read with one ``id__in`` query.
+    """
+    if fields is None:
+        return {entry['payload']['id']: entry['payload'] for entry in await get_book_entries(ids)}
+    payloads = {pk: project(entry['payload'], fields) for pk, entry in catalog_cache.get_books(ids).items()}
+    missing = [pk for pk in ids if pk not in payloads]
+    if missing:
+        books = [book async for book in book_queryset(fields).filter(id__in=missing)]
+        payloads.update(zip((book.id for book in books), BookSerializer(books, many=True, fields=fields).data))
+    return payloads
+
+
+def parse_id_list(value):
+    """
+    Unique integer IDs from a comma-separated string, in first-seen order.
+
+    Raises ``ValueError`` for anything but IDs between 1 and ``MAX_ID``.
+    """
+    ids = [int(part) for part in value.split(',') if part.strip()]
+    if any(not 0 < pk <= MAX_ID for pk in ids):
+        raise ValueError('IDs must be between 1 and MAX_ID.')
+    return list(dict.fromkeys(ids))
+
+
+FIELDSET_PARAMETERS = [
+    openapi.Parameter('fields', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description='Comma-separated fields to return, e.g. `id,title`'),
+    openapi.Parameter('view', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['full', 'compact'],
+                      description='`compact` leaves out heavy fields such as descriptions'),
+]
+
+
+class BookListAPIView(ReplicaReadsMixin, AsyncAPIView):
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
-        books = Book.objects.all()
+    @swagger_auto_schema(
+        operation_summary="List books",
+        operation_description="Returns every matching book, or a single keyset page when "
+                              "`cursor` or `page_size` is given. With `search`, returns ranked "
+                              "full-text matches on title, description, ISBN and author, paged by `page`. "
+                              "With `ids`, returns those books in request order, with "
+                              "`{\"id\", \"error\"}` in place of any that don't exist.",
+        manual_parameters=[
+            openapi.Parameter('ids', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Comma-separated book IDs to fetch in one request; other filters '
+                                          'are ignored'),
+            openapi.Parameter('search', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('page', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description='Page number of search results'),
+            openapi.Parameter('category', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('author', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('available', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN),
+            openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Opaque token from a previous `next`/`previous`; empty for the first page'),
+            openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+            openapi.Parameter('ordering', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              enum=['publication_date', '-publication_date', 'title', '-title']),
+            *FIELDSET_PARAMETERS,
+        ]
+    )
+    async def get(self, request):
+        try:
+            fields = requested_fields(BookSerializer, request.query_params)
+        except FieldsetError as e:
+            return Response({'error': str(e)}, status=400)
+
+        if 'ids' in request.query_params:
+            return await self.get_batch(request, fields)
+
+        name = catalog_cache.list_name('books', request.query_params)
+
+        # Any change to a listed book bumps one of these versions, so the ETag
+        # can be checked without querying the database.
+        versions = catalog_cache.get_versions(CATALOG)
+        etag = versions_etag(name, versions)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        cached = catalog_cache.get(name)
+        if cached is not None:
+            payloads = await get_book_payloads(cached['ids'], fields)
+            return set_validators(Response(self.render(cached['page'], payloads), status=200), etag)
+
+        deps = [BOOKS, AUTHORS, CATEGORIES]
+        if request.query_params.get('available') == 'true':
+            deps.append(AVAILABILITY)
+
+        try:
+            with catalog_cache.filling():
+                books, page = await self.get_books(request, fields)
+        except PaginationError as e:
+            return Response({'error': str(e)}, status=400)
+
+        if fields is None:
+            payloads = [entry['payload'] for entry in build_book_entries(books, versions)]
+        else:
+            # Narrowed rows can't rebuild the full cached payloads; serialize them as is.
+            payloads = BookSerializer(books, many=True, fields=fields).data
+        catalog_cache.set(name, {'ids': [book.id for book in books], 'page': page}, deps, versions)
+        return set_validators(Response(self.render(page, payloads), status=200), etag)
+
+    async def get_books(self, request, fields=None):
+        keyset = None
+        if BookKeysetPaginator.is_requested(request.query_params):
+            keyset = BookKeysetPaginator(request.query_params)
+        # The keyset cursor is built from the ordering column, so keep it loaded.
+        books = book_queryset(fields, extra=[keyset.field] if keyset else [])
 
         # Optional filters
         category_name = request.query_params.get('category')
@@ -406,21 +575,159 @@ class BookListAPIView(APIView):
         if available:
             books = books.filter(available_copies__gt=0) # gt > / gte >= / lt < / lte <=
 
-        serialized = BookSerializer(books, many=True)
-        return Response(serialized.data, status=200)
+        search = request.query_params.get('search')
+        if search:
+            paginator = BookSearchPaginator(request.query_params)
+            # Raw cursor SQL has no async path; run it in the thread sync views use.
+            ranked = await sync_to_async(search_book_ids)(search)
+            if category_name or author_name or available:
+                # Keep the rank order, dropping matches the filters exclude.
+                allowed = {book_id async for book_id in books.filter(id__in=ranked).values_list('id', flat=True)}
+                ranked = [book_id for book_id in ranked if book_id in allowed]
+            page_ids = paginator.paginate_ids(ranked)
+            found = await book_queryset(fields).ain_bulk(page_ids)
+            return [found[book_id] for book_id in page_ids if book_id in found], paginator.get_page_info()
+
+        if keyset is not None:
+            return await keyset.apaginate_queryset(books), keyset.get_page_info()
+
+        return [book async for book in books], None
+
+    def render(self, page, results):
+        return results if page is None else {**page, 'results': results}
+
+    async def get_batch(self, request, fields=None):
+        """
+        Many detail lookups in one request: cached payloads, plus one
+        ``id__in`` query for the rest.
+        """
+        try:
+            ids = parse_id_list(request.query_params['ids'])
+        except ValueError:
+            return Response({'error': '`ids` must be comma-separated book IDs.'}, status=400)
+        if not 0 < len(ids) <= settings.BOOK_BATCH_MAX_IDS:
+            return Response({'error': f'Request between 1 and {settings.BOOK_BATCH_MAX_IDS} IDs.'}, status=400)
+
+        payloads = await get_book_payload_map(ids, fields)
+        results = [payloads.get(pk, {'id': pk, 'error': 'Book not found.'}) for pk in ids]
+        return Response({'results': results}, status=200)
 
 
-class BookDetailAPIView(APIView):
+class BookDetailAPIView(ReplicaReadsMixin, AsyncAPIView):
     permission_classes = [IsAuthenticated]
 
-    def get(self, request, pk):
+    @swagger_auto_schema(manual_parameters=FIELDSET_PARAMETERS)
+    async def get(self, request, pk):
         try:
-            book = Book.objects.get(id=pk)
-        except Book.DoesNotExist:
+            fields = requested_fields(BookSerializer, request.query_params)
+        except FieldsetError as e:
+            return Response({'error': str(e)}, status=400)
+
+        # A single row: fetch and cache it in full, then project it.
+        entries = await get_book_entries([pk])
+        if not entries:
             return Response({'error': 'Book not found.'}, status=404)
 
-        serialized = BookSerializer(book)
-        return Response(serialized.data, status=200)
+        entry = entries[0]
+        response = not_modified(request, entry['etag'], entry['last_modified'])
+        if response is not None:
+            return response
+        return set_validators(Response(project(entry['payload'], fields), status=200),
+                              entry['etag'], entry['last_modified'])
+
+
+def sse_message(data, event, event_id):
+    return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+async def availability_stream(backend, book_ids, last_id, config):
+    """
+    Server-sent events for ``book_ids``: a ``snapshot`` of their counters
+    unless resuming from ``last_id``, then one ``availability`` event per
+    change, until ``STREAM_SECONDS`` have passed.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + config['STREAM_SECONDS']
+    yield f"retry: {config['RETRY_MS']}\n\n"
+    events = None if last_id is None else backend.since(last_id, book_ids)
+    while True:
+        if events is None:
+            # Read the sequence first; a change racing the snapshot is sent again, never lost.
+            last_id = backend.last_id()
+            yield sse_message(await sync_to_async(snapshot)(book_ids), 'snapshot', last_id)
+        elif not events:
+            yield ': keep-alive\n\n'
+        for event in events or []:
+            last_id = event['id']
+            yield sse_message(event, 'availability', last_id)
+
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return
+        events = await backend.wait(last_id, book_ids, min(config['HEARTBEAT'], remaining))
+
+
+class BookAvailabilityEventsAPIView(AsyncAPIView):
+    """
+    Pushes ``available_copies`` changes of the ``books`` given (see
+    ``core.events``) instead of clients polling the detail endpoint.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def perform_content_negotiation(self, request, force=False):
+        # EventSource asks for text/event-stream, which the stream answers without a renderer.
+        return super().perform_content_negotiation(request, force=True)
+
+    @swagger_auto_schema(
+        operation_summary="Availability changes",
+        operation_description="Under ASGI, a `text/event-stream`: a `snapshot` event with the current "
+                              "`available_copies` of each book, then an `availability` event per change. "
+                              "Reconnect with `Last-Event-ID` to resume. Under WSGI (or with `transport=poll`), "
+                              "a long poll: returns the changes after `since` as soon as there are any, or "
+                              "an empty list after `AVAILABILITY_EVENTS['LONG_POLL_TIMEOUT']` seconds. "
+                              "Without `since`, or when it is too old, returns a `snapshot` at once.",
+        manual_parameters=[
+            openapi.Parameter('books', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                              description='Comma-separated book IDs to watch'),
+            openapi.Parameter('since', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description='`last_event_id` of the previous response'),
+            openapi.Parameter('transport', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['sse', 'poll']),
+        ]
+    )
+    async def get(self, request):
+        config = get_events_config()
+        try:
+            book_ids = parse_id_list(request.query_params.get('books', ''))
+            last_id = request.headers.get('Last-Event-ID') or request.query_params.get('since')
+            last_id = int(last_id) if last_id else None
+        except ValueError:
+            return Response({'error': '`books` must be comma-separated book IDs and `since` an event ID.'},
+                            status=400)
+        if not book_ids or len(book_ids) > config['MAX_BOOKS']:
+            return Response({'error': f"Watch between 1 and {config['MAX_BOOKS']} books."}, status=400)
+
+        asgi = isinstance(request._request, ASGIRequest)
+        transport = request.query_params.get('transport') or ('sse' if asgi else 'poll')
+        if transport not in ('sse', 'poll'):
+            return Response({'error': 'Invalid transport. Choose one of: sse, poll.'}, status=400)
+        if transport == 'sse' and not asgi:
+            # A stream would hold a WSGI worker for its whole lifetime.
+            return Response({'error': 'Event streams need an ASGI server; use transport=poll.'}, status=400)
+
+        backend, watched = get_backend(), set(book_ids)
+        if transport == 'sse':
+            response = StreamingHttpResponse(availability_stream(backend, watched, last_id, config),
+                                             content_type='text/event-stream')
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            return response
+
+        events = None if last_id is None else await backend.wait(last_id, watched, config['LONG_POLL_TIMEOUT'])
+        if events is None:
+            last_id = backend.last_id()
+            return Response({'last_event_id': last_id, 'snapshot': await sync_to_async(snapshot)(book_ids),
+                             'events': []}, status=200)
+        return Response({'last_event_id': events[-1]['id'] if events else last_id, 'events': events}, status=200)
 
 
 class BorrowBookAPIView(APIView):
@@ -448,22 +755,12 @@ class BorrowBookAPIView(APIView):
         if not user.role == user.Role.MEMBER:
             return Response({'error': 'Only members can borrow books.'}, status=403)
 
-        book_id = request.data.get('book')
         try:
-            book = Book.objects.get(id=book_id)
-            if book.available_copies < 1:
-                return Response({'error': 'No copies available.'}, status=400)
-        except Book.DoesNotExist:
-            return Response({'error': 'Book not found.'}, status=404)
-
-        due_date = timezone.now().date() + timedelta(days=14)  # 2 weeks
-        borrow = Borrow.objects.create(
-            member=user,
-            book=book,
-            due_date=due_date
-        )
-        book.available_copies -= 1
-        book.save()
+            borrow = borrow_book(user, request.data.get('book'))
+        except InventoryError as e:
+            return Response({'error': str(e)}, status=e.status_code)
+        # Read this member's own borrows from the primary until the replicas catch up.
+        mark_written(user)
 
         serializer = BorrowSerializer(borrow)
         return Response(serializer.data, status=201)
@@ -509,29 +806,177 @@ class ReturnBookAPIView(APIView):
     )
     def post(self, request, pk):  # pk = Borrow ID
         try:
-            borrow = Borrow.objects.get(id=pk, member=request.user, returned=False)
-        except Borrow.DoesNotExist:
-            return Response({'error': 'Borrow record not found or already returned.'}, status=404)
+            return_book(request.user, pk)
+        except InventoryError as e:
+            return Response({'error': str(e)}, status=e.status_code)
+        mark_written(request.user)
 
-        borrow.return_date = timezone.now().date()
-        borrow.returned = True
-        borrow.save()
+        return Response({'message': 'Book returned successfully.'}, status=200)
 
-        book = borrow.book
-        book.available_copies += 1
-        book.save()
 
-        return Response({'message': 'Book returned successfully.'}, status=200)
+def get_bulk_ids(data, key):
+    ids = data.get(key)
+    if not isinstance(ids, list) or not ids:
+        return None, Response({'error': f'`{key}` must be a non-empty list of IDs.'}, status=400)
+    if len(ids) > settings.BULK_BORROW_MAX_ITEMS:
+        return None, Response({'error': f'At most {settings.BULK_BORROW_MAX_ITEMS} items per request.'}, status=400)
+    return ids, None
 
 
-class MemberBorrowListAPIView(APIView):
+class BulkBorrowBookAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['books'],
+            properties={
+                'books': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER),
+                                        description='IDs of the books to borrow')
+            }
+        ),
+        operation_summary="Borrow several books",
+        operation_description="Borrows every listed book in one request and reports the outcome per book.",
+        responses={
+            200: "Per-book results",
+            400: "Invalid request",
+            403: "Only members can borrow books"
+        }
+    )
+    def post(self, request):
+        user = request.user
+        if not user.role == user.Role.MEMBER:
+            return Response({'error': 'Only members can borrow books.'}, status=403)
+
+        book_ids, error = get_bulk_ids(request.data, 'books')
+        if error:
+            return error
+
+        results = []
+        for book_id, result in borrow_books(user, book_ids):
+            if isinstance(result, InventoryError):
+                results.append({'book': book_id, 'borrowed': False, 'error': str(result)})
+            else:
+                results.append({'book': book_id, 'borrowed': True, 'borrow': BorrowSerializer(result).data})
+        if any(result['borrowed'] for result in results):
+            mark_written(user)
+        return Response({'results': results}, status=200)
+
+
+class BulkReturnBookAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['borrows'],
+            properties={
+                'borrows': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER),
+                                          description='IDs of the borrow records to return')
+            }
+        ),
+        operation_summary="Return several borrowed books",
+        operation_description="Returns every listed borrow in one request and reports the outcome per borrow.",
+        responses={200: "Per-borrow results", 400: "Invalid request"}
+    )
+    def post(self, request):
+        borrow_ids, error = get_bulk_ids(request.data, 'borrows')
+        if error:
+            return error
+
+        results = []
+        for borrow_id, result in return_books(request.user, borrow_ids):
+            if isinstance(result, InventoryError):
+                results.append({'borrow': borrow_id, 'returned': False, 'error': str(result)})
+            else:
+                results.append({'borrow': borrow_id, 'returned': True})
+        if any(result['returned'] for result in results):
+            mark_written(request.user)
+        return Response({'results': results}, status=200)
+
+
+class HoldListCreateAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_summary="My holds",
+        operation_description="The member's waiting and ready holds, oldest first, with their place in each queue.",
+        responses={200: HoldSerializer(many=True)}
+    )
     def get(self, request):
+        user = request.user
+        if user.role != user.Role.MEMBER:
+            return Response({'error': 'Only members can view holds.'}, status=403)
+
+        holds = (with_queue_position(Hold.objects.filter(member=user, status__in=Hold.ACTIVE))
+                 .select_related('book').order_by('id'))
+        return Response(HoldSerializer(holds, many=True).data, status=200)
+
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['book'],
+            properties={
+                'book': openapi.Schema(type=openapi.TYPE_INTEGER, description='ID of the book to hold')
+            }
+        ),
+        operation_summary="Place a hold",
+        operation_description="Joins the queue for a book with no copies available. The next returned copy "
+                              "goes to the oldest hold and the member is notified; it is kept for "
+                              "`HOLD_PICKUP_DAYS` days, then passed on.",
+        responses={
+            201: HoldSerializer,
+            400: "A copy is available, already on hold, or too many holds",
+            403: "Only members can place holds",
+            404: "Book not found"
+        }
+    )
+    def post(self, request):
+        user = request.user
+        if user.role != user.Role.MEMBER:
+            return Response({'error': 'Only members can place holds.'}, status=403)
+
+        try:
+            hold = place_hold(user, request.data.get('book'))
+        except InventoryError as e:
+            return Response({'error': str(e)}, status=e.status_code)
+
+        return Response(HoldSerializer(hold).data, status=201)
+
+
+class HoldCancelAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_summary="Cancel a hold",
+        operation_description="Leaves the queue. A copy already set aside passes to the next member in line.",
+        responses={200: openapi.Response("Success"), 404: "Not Found"},
+        request_body=None
+    )
+    def post(self, request, pk):
+        try:
+            cancel_hold(request.user, pk)
+        except InventoryError as e:
+            return Response({'error': str(e)}, status=e.status_code)
+
+        return Response({'message': 'Hold cancelled.'}, status=200)
+
+
+class MemberBorrowListAPIView(ReplicaReadsMixin, AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(manual_parameters=FIELDSET_PARAMETERS)
+    async def get(self, request):
         if request.user.role != request.user.Role.MEMBER:
             return Response({'error': 'Only members can view this.'}, status=403)
 
-        borrows = Borrow.objects.filter(member=request.user)
+        try:
+            fields = requested_fields(BorrowSerializer, request.query_params)
+        except FieldsetError as e:
+            return Response({'error': str(e)}, status=400)
+
+        today = timezone.now().date()
+        borrows = with_overdue(borrow_queryset(fields), today).filter(member=request.user)
 
         # Optional filters
         returned = request.query_params.get('returned')
@@ -542,44 +987,187 @@ class MemberBorrowListAPIView(APIView):
 
         overdue = request.query_params.get('overdue')
         if overdue == 'true':
-            borrows = borrows.filter(returned=False, due_date__lt=timezone.now().date())
+            borrows = borrows.filter(overdue_q(today))
 
-        serializer = BorrowSerializer(borrows, many=True)
+        serializer = BorrowSerializer([borrow async for borrow in borrows], many=True, fields=fields)
         return Response(serializer.data, status=200)
 
 
-class WorkerBorrowListAPIView(APIView):
+class WorkerBorrowListAPIView(ReplicaReadsMixin, APIView):
     permission_classes = [IsAuthenticated]
 
+    @swagger_auto_schema(manual_parameters=FIELDSET_PARAMETERS)
     def get(self, request):
         user = request.user
         if user.role != user.Role.WORKER:
             return Response({'error': 'Only workers can view borrow records.'}, status=403)
 
-        borrows = Borrow.objects.all()
+        try:
+            fields = requested_fields(BorrowSerializer, request.query_params)
+        except FieldsetError as e:
+            return Response({'error': str(e)}, status=400)
 
-        # Filter by returned status
-        returned = request.query_params.get('returned')
-        if returned == 'true':
-            borrows = borrows.filter(returned=True)
-        elif returned == 'false':
-            borrows = borrows.filter(returned=False)
+        today = timezone.now().date()
+        borrows = filter_borrows(with_overdue(borrow_queryset(fields), today), request.query_params, today)
+        serializer = BorrowSerializer(borrows, many=True, fields=fields)
+        return Response(serializer.data, status=200)
 
-        # Filter by active status (alias for returned=false)
-        only_active = request.query_params.get('active')
-        if only_active == 'true':
-            borrows = borrows.filter(returned=False)
 
-        # Filter by member username
-        member_username = request.query_params.get('member')
-        if member_username:
-            borrows = borrows.filter(member__username=member_username)
+class WorkerBorrowExportAPIView(ReplicaReadsMixin, APIView):
+    permission_classes = [IsAuthenticated]
 
-        # Filter by overdue
-        overdue = request.query_params.get('overdue')
-        if overdue == 'true':
-            borrows = borrows.filter(returned=False, due_date__lt=timezone.now().date())
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('output', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(EXPORT_FORMATS),
+                              description='csv (default) or ndjson'),
+            openapi.Parameter('returned', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['true', 'false']),
+            openapi.Parameter('active', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['true']),
+            openapi.Parameter('member', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Member username'),
+            openapi.Parameter('overdue', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['true']),
+        ]
+    )
+    def get(self, request):
+        user = request.user
+        if user.role != user.Role.WORKER:
+            return Response({'error': 'Only workers can export borrow records.'}, status=403)
 
-        serializer = BorrowSerializer(borrows, many=True)
-        return Response(serializer.data, status=200)
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
+            return Response({'error': f"Invalid output. Choose one of: {', '.join(EXPORT_FORMATS)}."}, status=400)
+
+        # Streamed after the view returns, so the replica is picked explicitly.
+        borrows = filter_borrows(Borrow.objects.using(self.read_alias), request.query_params)
+        return stream_borrows(borrows, output)
+
+
+class WorkerOverdueReportAPIView(ReplicaReadsMixin, APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_summary="Overdue report",
+        operation_description="Number of overdue borrows, plus the members and books with the most "
+                              "overdue borrows, each with a count, oldest due date and days overdue.",
+        manual_parameters=[
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description=f'Members and books to list (default {OVERDUE_REPORT_LIMIT}, '
+                                          f'at most {OVERDUE_REPORT_MAX_LIMIT})'),
+        ]
+    )
+    def get(self, request):
+        user = request.user
+        if user.role != user.Role.WORKER:
+            return Response({'error': 'Only workers can view the overdue report.'}, status=403)
+
+        try:
+            limit = get_page_size(request.query_params.get('limit'), OVERDUE_REPORT_LIMIT, OVERDUE_REPORT_MAX_LIMIT)
+        except PaginationError:
+            return Response({'error': 'limit must be a positive integer.'}, status=400)
 
+        return Response(overdue_report(timezone.now().date(), limit), status=200)
+
+
+STATS_LIMIT = 10
+STATS_MAX_LIMIT = 100
+
+STATS_PARAMETERS = [
+    openapi.Parameter('days', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                      description='Window ending today (default 30 days)'),
+    openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                      description=f'Rows to return (default {STATS_LIMIT}, at most {STATS_MAX_LIMIT})'),
+]
+
+
+class WorkerStatsAPIView(ReplicaReadsMixin, APIView):
+    """
+    Worker-only dashboards served from the ``core.stats`` rollups.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        if user.role != user.Role.WORKER:
+            return Response({'error': 'Only workers can view statistics.'}, status=403)
+
+        today = timezone.now().date()
+        try:
+            since = get_days(request.query_params.get('days'), today)
+            limit = get_page_size(request.query_params.get('limit'), STATS_LIMIT, STATS_MAX_LIMIT)
+            results = self.get_results(request, since, limit)
+        except StatsError as e:
+            return Response({'error': str(e)}, status=400)
+        except PaginationError:
+            return Response({'error': 'limit must be a positive integer.'}, status=400)
+        return Response({'since': since, 'until': today, 'results': results}, status=200)
+
+
+class TopBooksStatsAPIView(WorkerStatsAPIView):
+
+    @swagger_auto_schema(operation_summary="Most borrowed books", manual_parameters=STATS_PARAMETERS)
+    def get(self, request):
+        return super().get(request)
+
+    def get_results(self, request, since, limit):
+        return top_books(since, limit)
+
+
+class TopCategoriesStatsAPIView(WorkerStatsAPIView):
+
+    @swagger_auto_schema(operation_summary="Busiest categories", manual_parameters=STATS_PARAMETERS)
+    def get(self, request):
+        return super().get(request)
+
+    def get_results(self, request, since, limit):
+        return top_categories(since, limit)
+
+
+class BorrowTimelineStatsAPIView(WorkerStatsAPIView):
+
+    @swagger_auto_schema(
+        operation_summary="Borrows and returns over time",
+        manual_parameters=[
+            *STATS_PARAMETERS[:1],
+            openapi.Parameter('bucket', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              enum=['day', 'week', 'month']),
+            openapi.Parameter('book', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+            openapi.Parameter('category', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        ]
+    )
+    def get(self, request):
+        return super().get(request)
+
+    def get_results(self, request, since, limit):
+        params = request.query_params
+        try:
+            book_id, category_id = [int(params[key]) if params.get(key) else None for key in ('book', 'category')]
+        except ValueError:
+            raise StatsError('book and category must be ids.')
+        # At most one row per day of the window; limit does not apply.
+        return borrow_timeline(since, params.get('bucket', 'day'), book_id, category_id)
+
+
+class SubCategoryAvailabilityAPIView(ReplicaReadsMixin, APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(operation_summary="Books and available copies per subcategory")
+    def get(self, request):
+        user = request.user
+        if user.role != user.Role.WORKER:
+            return Response({'error': 'Only workers can view statistics.'}, status=403)
+        return Response(subcategory_availability(), status=200)
+
+
+class RequestMetricsAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_summary="Request metrics",
+        operation_description="Per-route request counts, errors, queries per request and histograms of "
+                              "total, view, render and DB time (ms) over the last `REQUEST_METRICS['WINDOW']` "
+                              "seconds, for the worker process that answers.",
+    )
+    def get(self, request):
+        user = request.user
+        if user.role != user.Role.WORKER:
+            return Response({'error': 'Only workers can view metrics.'}, status=403)
+        return Response(request_metrics.snapshot(), status=200)
@@ -0,0 +1,143 @@
+"""
+``DATABASES`` built from the environment.
+
+``DATABASE_ENGINE`` picks the backend: ``sqlite`` (default) or ``postgresql``.
+
+Both engines read:
+
+- ``DATABASE_CONN_MAX_AGE``: seconds to keep a connection between requests.
+  The default is 60; use 0 to close it after every request.
+- ``DATABASE_CONN_HEALTH_CHECKS``: check a reused connection before a request
+  uses it. The default is 1.
+
+SQLite reads:
+
+- ``DATABASE_NAME``: the database file path; the default is ``db.sqlite3``.
+- ``DATABASE_BUSY_TIMEOUT``: seconds a writer waits for the lock before
+  failing with "database is locked". The default is 20.
+- ``DATABASE_SQLITE_MMAP_SIZE``: bytes of the file to memory-map. The
+  default is 256 MiB.
+- ``DATABASE_SQLITE_TUNED``: set it to 0 to keep SQLite's defaults, which are
+  the rollback journal and deferred transactions. The concurrency benchmark
+  uses this to compare against the tuned setup.
+
+When tuned, every connection switches to WAL, so readers never block the
+writer. It also sets ``synchronous=NORMAL``, which is durable at each WAL
+checkpoint and safe from corruption. Transactions start with ``BEGIN
+IMMEDIATE``, so concurrent borrows wait on the busy timeout. A deferred
+transaction that tries to upgrade its read lock fails at once.
+
+PostgreSQL reads ``DATABASE_NAME``, ``DATABASE_USER``, ``DATABASE_PASSWORD``,
+``DATABASE_HOST`` and ``DATABASE_PORT``, plus:
+
+- ``DATABASE_POOL``: set it to 1 to use psycopg's connection pool, which
+  needs ``psycopg[pool]``. ``CONN_MAX_AGE`` is then 0, because the pool keeps
+  the connections.
+- ``DATABASE_POOL_MIN_SIZE`` and ``DATABASE_POOL_MAX_SIZE``: the pool size.
+- ``DATABASE_POOL_TIMEOUT``: seconds a request waits for a free connection.
+- ``DATABASE_STATEMENT_TIMEOUT``: the statement timeout, in milliseconds.
+
+``DATABASE_REPLICAS`` adds read replicas, comma-separated: SQLite file paths,
+or PostgreSQL ``host`` / ``host:port`` values. They become ``replica1``,
+``replica2`` and so on, configured like ``default`` otherwise, and
+``core.replicas`` routes catalog and list reads to them. Tests use
+``default`` in their place.
+"""
+import os
+
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size={mmap_size}',
+]
+
+
+def env_int(env, name, default):
+    value = env.get(name)
+    return default if value in (None, '') else int(value)
+
+
+def env_bool(env, name, default):
+    value = env.get(name)
+    return default if value in (None, '') else value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def sqlite_config(env, base_dir):
+    config = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env.get('DATABASE_NAME') or base_dir / 'db.sqlite3',
+        'OPTIONS': {},
+        # A file (not in-memory) test database lets the concurrency tests open several connections.
+        'TEST': {
+            'NAME': base_dir / 'test_db.sqlite3',
+        },
+    }
+    if env_bool(env, 'DATABASE_SQLITE_TUNED', True):
+        mmap_size = env_int(env, 'DATABASE_SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+        config['OPTIONS'] = {
+            'timeout': env_int(env, 'DATABASE_BUSY_TIMEOUT', 20),
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(SQLITE_PRAGMAS).format(mmap_size=mmap_size),
+        }
+    else:
+        # journal_mode is stored in the file; switch back from an earlier WAL run.
+        config['OPTIONS'] = {'init_command': 'PRAGMA journal_mode=DELETE'}
+    return config
+
+
+def postgres_config(env):
+    config = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': env.get('DATABASE_NAME', 'library'),
+        'USER': env.get('DATABASE_USER', ''),
+        'PASSWORD': env.get('DATABASE_PASSWORD', ''),
+        'HOST': env.get('DATABASE_HOST', ''),
+        'PORT': env.get('DATABASE_PORT', ''),
+        'OPTIONS': {},
+    }
+    if env_bool(env, 'DATABASE_POOL', False):
+        config['OPTIONS']['pool'] = {
+            'min_size': env_int(env, 'DATABASE_POOL_MIN_SIZE', 2),
+            'max_size': env_int(env, 'DATABASE_POOL_MAX_SIZE', 10),
+            'timeout': env_int(env, 'DATABASE_POOL_TIMEOUT', 10),
+        }
+    statement_timeout = env_int(env, 'DATABASE_STATEMENT_TIMEOUT', 0)
+    if statement_timeout:
+        config['OPTIONS']['options'] = f'-c statement_timeout={statement_timeout}'
+    return config
+
+
+def database_config(base_dir, env=None):
+    env = os.environ if env is None else env
+    engine = env.get('DATABASE_ENGINE', 'sqlite').lower()
+    if engine in ('sqlite', 'sqlite3'):
+        config = sqlite_config(env, base_dir)
+    elif engine in ('postgres', 'postgresql'):
+        config = postgres_config(env)
+    else:
+        raise ValueError(f'Unsupported DATABASE_ENGINE {engine!r}; use sqlite or postgresql.')
+
+    # Pooled connections are returned to the pool after each request instead.
+    pooled = 'pool' in config['OPTIONS']
+    config['CONN_MAX_AGE'] = 0 if pooled else env_int(env, 'DATABASE_CONN_MAX_AGE', 60)
+    config['CONN_HEALTH_CHECKS'] = env_bool(env, 'DATABASE_CONN_HEALTH_CHECKS', True)
+    return config
+
+
+def replica_configs(default, env=None):
+    """
+    ``{alias: settings}`` for the replicas in ``DATABASE_REPLICAS``.
+    """
+    env = os.environ if env is None else env
+    replicas = {}
+    for number, location in enumerate(filter(None, env.get('DATABASE_REPLICAS', '').split(',')), 1):
+        location = location.strip()
+        config = {**default, 'OPTIONS': dict(default['OPTIONS']), 'TEST': {'MIRROR': 'default'}}
+        if config['ENGINE'] == 'django.db.backends.sqlite3':
+            config['NAME'] = location
+        else:
+            config['HOST'], _, port = location.partition(':')
+            config['PORT'] = port or config['PORT']
+        replicas[f'replica{number}'] = config
+    return replicas
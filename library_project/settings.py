@@ -11,8 +11,11 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import importlib.util
 import os
 
+from .database import database_config, replica_configs
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -52,6 +55,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,11 +69,86 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
 }
 
+# Keyset pagination for /api/books/ (used when `cursor` or `page_size` is passed)
+BOOK_LIST_PAGE_SIZE = 50
+BOOK_LIST_MAX_PAGE_SIZE = 200
+
+# Most ranked matches a `?search=` on /api/books/ can page through
+BOOK_SEARCH_MAX_RESULTS = 1000
+
+# Largest number of IDs accepted by /api/books/?ids=
+BOOK_BATCH_MAX_IDS = 200
+
+# Largest number of books/borrows accepted by /api/borrow/bulk/ and /api/return/bulk/
+BULK_BORROW_MAX_ITEMS = 50
+
+# Holds (/api/holds/): days a returned copy stays set aside for the member at the head of
+# the queue (see `manage.py expire_holds`), and active holds allowed per member
+HOLD_PICKUP_DAYS = 3
+HOLD_MAX_PER_MEMBER = 10
+
+# Rows fetched per database round trip by /api/all-borrows/export/
+BORROW_EXPORT_CHUNK_SIZE = 2000
+
+# Serialized catalog payloads (see core/cache.py). Point the cache alias at a shared
+# backend such as Redis or Memcached so every worker sees the same versions; list ETags
+# are built from them too. Check core.W001 warns about a process-local one when DEBUG is off.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+CATALOG_CACHE = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    'LRU_SIZE': 1024,
+}
+
+# Users authenticated from a JWT are kept in-process for TTL seconds (see
+# core/authentication.py); a change made by another worker is seen after at most TTL.
+JWT_USER_CACHE = {
+    'TTL': 60,
+    'MAX_SIZE': 10_000,
+}
+
+# Borrow statistics (see core/stats.py): per book and day rollups updated with every
+# borrow and return when INCREMENTAL is on; otherwise rebuilt by
+# `manage.py refresh_borrow_stats`. /api/stats/ windows default to DEFAULT_DAYS.
+BORROW_STATS = {
+    'INCREMENTAL': True,
+    'DEFAULT_DAYS': 30,
+    'MAX_DAYS': 366,
+}
+
+# Availability change events at /api/books/availability/events/ (see core/events.py). The
+# in-process backend only sees its own process's changes; point BACKEND at a shared one when
+# running several workers.
+AVAILABILITY_EVENTS = {
+    'BACKEND': 'core.events.InProcessBackend',
+    'BUFFER_SIZE': 10_000,
+    'MAX_BOOKS': 100,
+    'LONG_POLL_TIMEOUT': 25,
+    'HEARTBEAT': 15,
+    'STREAM_SECONDS': 300,
+}
+
+# Per-request query count and DB/view/render/total timings (see core/metrics.py), sent
+# as a Server-Timing header, logged on the core.metrics logger and kept as rolling
+# per-route histograms over the last WINDOW seconds at /api/metrics/.
+REQUEST_METRICS = {
+    'ENABLED': True,
+    'SERVER_TIMING': True,
+    'LOG': True,
+    'WINDOW': 300,
+}
+
 
 ROOT_URLCONF = 'library_project.urls'
 
@@ -94,11 +173,24 @@ WSGI_APPLICATION = 'library_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Configured from DATABASE_* environment variables (see library_project/database.py):
+# SQLite in WAL mode with a busy timeout by default, or PostgreSQL with optional pooling.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
+}
+# Read replicas from DATABASE_REPLICAS, as replica1, replica2, ...
+DATABASES.update(replica_configs(DATABASES['default']))
+
+# Safe requests to catalog and list views read from a replica in ALIASES (see
+# core/replicas.py); after a borrow or return, the member reads from default for
+# STICKY_SECONDS. The marker is kept in the CACHE_ALIAS cache. Catalog cache misses are
+# filled from default, so with CATALOG_CACHE enabled only uncached catalog reads (sparse
+# fieldsets) reach the replicas.
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+READ_REPLICAS = {
+    'ALIASES': [alias for alias in DATABASES if alias != 'default'],
+    'STICKY_SECONDS': 10,
+    'CACHE_ALIAS': 'default',
 }
 
 
@@ -120,6 +212,29 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# The first hasher hashes new passwords. Hashes made by the others (e.g. the
+# PBKDF2 hashes of existing accounts) still verify and are rehashed with the
+# first one on the next successful sign-in. Argon2 is preferred when
+# argon2-cffi is installed, scrypt (standard library) otherwise.
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+if importlib.util.find_spec('argon2') is not None:
+    PASSWORD_HASHERS.insert(0, 'django.contrib.auth.hashers.Argon2PasswordHasher')
+
+# Failed sign-ins are counted per username and per client IP in this cache alias;
+# once either count reaches its limit, sign-in answers 429 without checking the
+# password until WINDOW seconds after the first failure.
+LOGIN_THROTTLE = {
+    'ALIAS': 'default',
+    'MAX_FAILURES': 5,
+    'MAX_IP_FAILURES': 50,
+    'WINDOW': 15 * 60,
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -143,6 +258,19 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Stream every upload to a temporary file instead of holding small ones in memory;
+# the storage then moves it into MEDIA_ROOT without another copy.
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
+
+# Profile picture thumbnails, generated off the request thread (see core/thumbnails.py).
+# Each size is the longest edge in pixels; one file is written per size and format.
+PROFILE_THUMBNAILS = {
+    'SIZES': (64, 256, 512),
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 80,
+    'WORKERS': 2,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -153,7 +281,7 @@ AUTH_USER_MODEL = 'core.User'
 
 CORS_ORIGIN_ALLOW_ALL = False
 CORS_ORIGIN_WHITELIST = (
-    "https://front.danacup.com"
+    "https://front.danacup.com",
 )
 
 # CORS_ORIGIN_ALLOW_ALL = True